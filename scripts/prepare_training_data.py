@@ -1,11 +1,21 @@
 import os
+import sys
 import json
 import shutil
+import wave
+import argparse
 from pathlib import Path
 import re
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server', 'src', 'services'))
+
 class TrainingDataPreparator:
-    def __init__(self):
+    def __init__(self, shards_dir=None):
+        # Read clips and transcriptions from a packed dataset (pack_dataset.py) instead of wav/ + metadata/
+        self.dataset = None
+        if shards_dir:
+            from audio_shards import ShardedDataset
+            self.dataset = ShardedDataset(shards_dir)
         self.base_dir = Path('../test_data')
         self.training_dir = self.base_dir / 'training'
         self.wav_dir = self.base_dir / 'wav'
@@ -35,23 +45,35 @@ class TrainingDataPreparator:
         transcriptions = []
         vocabulary = set()
 
+        for text in self.actual_texts():
+            # Clean and normalize text
+            text = text.strip().upper()
+            transcriptions.append(f"<s> {text} </s>")
+            # Add words to vocabulary
+            words = re.findall(r'\w+', text.upper())
+            vocabulary.update(words)
+
+        return transcriptions, vocabulary
+
+    def actual_texts(self):
+        """actualText of every clip that has one"""
+        if self.dataset is not None:
+            # The shard indexes already hold the text: no per-clip files to open
+            for _, _, text in self.dataset:
+                if text:
+                    yield text
+            return
+
         # Read all metadata files
         for metadata_file in self.metadata_dir.glob('*.json'):
             try:
                 with open(metadata_file) as f:
                     data = json.load(f)
                     if data.get('actualText'):
-                        # Clean and normalize text
-                        text = data['actualText'].strip().upper()
-                        transcriptions.append(f"<s> {text} </s>")
-                        # Add words to vocabulary
-                        words = re.findall(r'\w+', text.upper())
-                        vocabulary.update(words)
+                        yield data['actualText']
             except Exception as e:
                 print(f"Error processing {metadata_file}: {e}")
 
-        return transcriptions, vocabulary
-
     def create_dictionary(self, vocabulary):
         """Create pronunciation dictionary"""
         dict_file = self.dict_dir / 'dictionary.dict'
@@ -99,10 +121,20 @@ class TrainingDataPreparator:
         """Copy and prepare audio files"""
         fileids = []
         
-        for wav_file in self.wav_dir.glob('*.wav'):
-            # Copy wav file to training directory
-            shutil.copy2(wav_file, self.wav_train_dir)
-            fileids.append(wav_file.stem)
+        if self.dataset is not None:
+            # SphinxTrain reads one WAV per utterance, so write them out of the shards
+            for clip_id, pcm, _ in self.dataset:
+                with wave.open(str(self.wav_train_dir / f"{clip_id}.wav"), 'wb') as wf:
+                    wf.setnchannels(1)
+                    wf.setsampwidth(2)
+                    wf.setframerate(self.dataset.sample_rate)
+                    wf.writeframes(pcm.tobytes())
+                fileids.append(clip_id)
+        else:
+            for wav_file in self.wav_dir.glob('*.wav'):
+                # Copy wav file to training directory
+                shutil.copy2(wav_file, self.wav_train_dir)
+                fileids.append(wav_file.stem)
 
         # Write fileids file
         with open(self.etc_dir / 'training.fileids', 'w') as f:
@@ -137,5 +169,9 @@ class TrainingDataPreparator:
         print(f"\nTraining data is ready in: {self.training_dir}")
 
 if __name__ == "__main__":
-    preparator = TrainingDataPreparator()
+    parser = argparse.ArgumentParser(description="Prepare SphinxTrain data from test_data")
+    parser.add_argument("--shards", help="packed dataset directory to read instead of test_data/wav and metadata")
+    args = parser.parse_args()
+
+    preparator = TrainingDataPreparator(args.shards)
     preparator.prepare() 
\ No newline at end of file
@@ -1,60 +1,40 @@
 import os
-import urllib.request
-from pathlib import Path
-import shutil
-
-def setup_models():
-    # Get the pocketsphinx model directory
-    base_model_path = Path(r"C:\Users\vamsikrishna.k\AppData\Local\Programs\Python\Python313\Lib\site-packages\pocketsphinx\model")
-    
-    # Create directories if they don't exist
-    base_model_path.mkdir(parents=True, exist_ok=True)
-    
-    # Updated URLs for model files with correct dictionary URL
-    model_urls = {
-        'acoustic_model': 'https://raw.githubusercontent.com/cmusphinx/pocketsphinx/master/model/en-us/en-us-phone.lm.bin',
-        'language_model': 'https://raw.githubusercontent.com/cmusphinx/pocketsphinx/master/model/en-us/en-us.lm.bin',
-        'dictionary': 'https://raw.githubusercontent.com/cmusphinx/pocketsphinx/master/model/en-us/cmudict-en-us.dict'
-    }
-    
-    print("Downloading and setting up model files...")
-    
-    try:
-        # Create en-us directory
-        en_us_dir = base_model_path
-        en_us_dir.mkdir(exist_ok=True)
-        
-        # Download files
-        for model_type, url in model_urls.items():
-            print(f"\nDownloading {model_type}...")
-            filename = url.split('/')[-1]
-            
-            # Special handling for dictionary file - place it directly in model directory
-            if model_type == 'dictionary':
-                file_path = base_model_path / filename
-            else:
-                file_path = en_us_dir / filename
-            
-            try:
-                urllib.request.urlretrieve(url, file_path)
-                print(f"Successfully downloaded: {filename} to {file_path}")
-            except Exception as e:
-                print(f"Error downloading {filename}: {e}")
-                continue
-        
-        print("\nModel setup completed!")
-        print(f"Models installed in: {base_model_path}")
-        
-        # List downloaded files
-        print("\nDownloaded files:")
-        for file in base_model_path.glob('*'):
-            print(f"- {file.name}")
-            
-    except Exception as e:
-        print(f"Error during setup: {e}")
+import sys
+import argparse
+
+# Shares the downloader, lock file and manifest with server/src/python/setup_models.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server', 'src', 'services'))
+from model_provisioning import LOCK_PATH, fetch_artifacts, install_dir, read_lock, resolve, update_manifest
+
+ARTIFACT = "pocketsphinx:en-us"
+
+def setup_models(mirror=None):
+    # Installed into the pocketsphinx package's own model directory
+    # (POCKETSPHINX_MODEL_DIR overrides it), wherever Python is installed
+    entry = read_lock(LOCK_PATH)["artifacts"].get(ARTIFACT) or resolve(ARTIFACT, mirror)
+
+    print(f"Downloading and setting up model files into {install_dir(ARTIFACT)}...")
+    installed, errors = fetch_artifacts({ARTIFACT: entry}, mirror)
+
+    if errors:
+        print(f"Error during setup: {errors[ARTIFACT]}")
         return False
-    
+
+    update_manifest(artifacts=installed)
+    print("\nModel setup completed!")
+    print(f"Models installed in: {install_dir(ARTIFACT)}")
+
+    # List downloaded files
+    print("\nDownloaded files:")
+    for file in installed[ARTIFACT]['files']:
+        print(f"- {file['path']}")
+
     return True
 
 if __name__ == "__main__":
-    setup_models() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Download the PocketSphinx en-us model files")
+    parser.add_argument("--mirror", default=os.getenv("MODEL_MIRROR"),
+                        help="mirror URL or local directory to fetch from (env MODEL_MIRROR)")
+    args = parser.parse_args()
+
+    sys.exit(0 if setup_models(args.mirror) else 1)
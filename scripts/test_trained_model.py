@@ -4,14 +4,21 @@ from pocketsphinx import Decoder, get_model_path, Pocketsphinx
 import wave
 import json
 import sys
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server', 'src', 'services'))
 
 class ModelTester:
-    def __init__(self):
+    def __init__(self, shards_dir=None):
+        # Read clips and expected text from a packed dataset (pack_dataset.py) instead of wav/ + metadata/
+        self.shards_dir = shards_dir
         self.base_dir = Path('../test_data')
         self.training_dir = self.base_dir / 'training'
         
         # Update paths to match the actual file locations
-        model_base = Path(r"C:\Users\vamsikrishna.k\AppData\Local\Programs\Python\Python313\Lib\site-packages\pocketsphinx\model")
+        # Where setup_models.py installs the model files
+        from model_provisioning import pocketsphinx_model_dir
+        model_base = Path(pocketsphinx_model_dir())
         self.config = {
             'hmm': str(model_base / 'en-us'),
             'lm': str(model_base / 'en-us.lm.bin'),
@@ -118,10 +125,64 @@ class ModelTester:
                 'error': str(e)
             }
 
+    def test_clip(self, clip_id, pcm, expected_text=None):
+        """Test one clip from a packed dataset (16 kHz mono int16 samples)"""
+        print(f"\nProcessing: {clip_id}")
+        
+        try:
+            decoder = self.setup_decoder()
+            decoder.start_utt()
+            # Same 1024-frame chunks as test_wav_file
+            for start in range(0, len(pcm), 1024):
+                decoder.process_raw(pcm[start:start + 1024].tobytes(), False, False)
+            decoder.end_utt()
+            hypothesis = decoder.hyp()
+            recognized_text = hypothesis.hypstr if hypothesis else ""
+            print(f"Recognition successful: {recognized_text}" if hypothesis else "No recognition result")
+
+            accuracy = self.calculate_accuracy(recognized_text, expected_text) if expected_text else None
+
+            return {
+                'wav_file': clip_id,
+                'recognized_text': recognized_text,
+                'expected_text': expected_text,
+                'accuracy': accuracy
+            }
+        except Exception as e:
+            print(f"Error processing {clip_id}: {e}")
+            return {
+                'wav_file': clip_id,
+                'error': str(e)
+            }
+
+    def report(self, result, expected_text):
+        if 'error' in result:
+            print(f"Error: {result['error']}")
+        else:
+            print(f"Recognized: {result['recognized_text']}")
+            if expected_text:
+                print(f"Expected: {expected_text}")
+                print(f"Accuracy: {result['accuracy']:.2f}%")
+
+    def run_shard_tests(self):
+        """Test every clip of the packed dataset, in the order it is stored"""
+        from audio_shards import ShardedDataset
+
+        dataset = ShardedDataset(self.shards_dir)
+        print(f"Found {len(dataset)} clips to test in {self.shards_dir}")
+        for clip_id, pcm, expected_text in dataset:
+            result = self.test_clip(clip_id, pcm, expected_text)
+            self.test_results.append(result)
+            self.report(result, expected_text)
+
     def run_tests(self):
         """Test all WAV files in the test directory"""
         print("Starting model testing...")
         
+        if self.shards_dir:
+            self.run_shard_tests()
+            return
+        
         wav_dir = self.base_dir / 'wav'
         metadata_dir = self.base_dir / 'metadata'
         
@@ -152,14 +213,7 @@ class ModelTester:
 
             result = self.test_wav_file(wav_file, expected_text)
             self.test_results.append(result)
-            
-            if 'error' in result:
-                print(f"Error: {result['error']}")
-            else:
-                print(f"Recognized: {result['recognized_text']}")
-                if expected_text:
-                    print(f"Expected: {expected_text}")
-                    print(f"Accuracy: {result['accuracy']:.2f}%")
+            self.report(result, expected_text)
 
     def save_results(self):
         """Save test results to a file"""
@@ -192,6 +246,10 @@ class ModelTester:
         print(f"Average accuracy: {summary['average_accuracy']:.2f}%")
 
 if __name__ == "__main__":
-    tester = ModelTester()
+    parser = argparse.ArgumentParser(description="Test the PocketSphinx model on test_data")
+    parser.add_argument("--shards", help="packed dataset directory to read instead of test_data/wav and metadata")
+    args = parser.parse_args()
+
+    tester = ModelTester(args.shards)
     tester.run_tests()
     tester.save_results() 
\ No newline at end of file
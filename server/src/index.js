@@ -4,6 +4,7 @@ const path = require('path');
 const fs = require('fs');
 const config = require('./config');
 const { spawn } = require('child_process');
+const zygoteClient = require('./services/zygoteClient');
 
 const app = express();
 
@@ -42,6 +43,7 @@ const voskRouter = require('./routes/vosk');
 const whisperTrainingRouter = require('./routes/whisperTraining');
 const whisperSinhalaRouter = require('./routes/whisperSinhala');  // New
 const whisperTamilRouter = require('./routes/whisperTamil');      // New
+const metricsRouter = require('./routes/metrics');
 
 // Mount route handlers
 
@@ -51,6 +53,7 @@ app.use('/api/vosk', voskRouter);
 app.use('/api/whisper-training', whisperTrainingRouter);
 app.use('/api/whisper-sinhala', whisperSinhalaRouter);  // New
 app.use('/api/whisper-tamil', whisperTamilRouter);      // New
+app.use('/api/metrics', metricsRouter);
 
 // Error handling middleware must be after route handlers
 app.use((req, res, next) => {
@@ -62,7 +65,17 @@ app.use((err, req, res, next) => {
     res.status(500).json({ error: 'Internal Server Error' });
 });
 
-function preloadModels() {
+async function preloadModels() {
+    if (zygoteClient.isEnabled()) {
+        // Keep the models resident in the zygote instead of warming a throwaway process
+        try {
+            await zygoteClient.start();
+            return;
+        } catch (error) {
+            console.error('Zygote unavailable, spawning a process per request:', error.message);
+        }
+    }
+
     return new Promise((resolve, reject) => {
         const modelLoader = spawn('python', [
             path.join(__dirname, 'services/model_loader.py')
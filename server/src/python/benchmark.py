@@ -0,0 +1,878 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SERVICES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'services'))
+sys.path.append(SERVICES_DIR)
+
+# Entry points whose import cost matters for a per-request process launch
+ENTRY_MODULES = [
+    "whisperService",
+    "whisperSinhalaService",
+    "whisperTamilService",
+    "whisperTrainingService",
+    "voskService",
+]
+HEAVY_MODULES = ["torch", "whisper", "transformers", "librosa"]
+
+
+def _time_subprocess(args, runs, env=None):
+    """Median wall time in ms of running `args` in a fresh interpreter"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(args, cwd=SERVICES_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 1)
+
+
+def bench_imports(args):
+    """Import time of each entry point and of the heavy libraries it used to pull in eagerly"""
+    results = {"baseline": _time_subprocess([sys.executable, "-c", "pass"], args.runs)}
+    for name in ENTRY_MODULES + HEAVY_MODULES:
+        results[name] = _time_subprocess([sys.executable, "-c", f"import {name}"], args.runs)
+    # Error path of a CLI entry point: should return without touching torch
+    results["whisperService (missing file)"] = _time_subprocess(
+        [sys.executable, "whisperService.py", os.path.join(SERVICES_DIR, "missing.wav")], args.runs
+    )
+    return results
+
+
+def bench_zygote(args):
+    """Round trip of a request served by a worker forked from the zygote vs a cold process"""
+    from zygote import request
+
+    socket_path = args.socket
+    env = {**os.environ, "ZYGOTE_PRELOAD": args.preload}
+    zygote = subprocess.Popen(
+        [sys.executable, "zygote.py", socket_path],
+        cwd=SERVICES_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    try:
+        status = json.loads(zygote.stdout.readline())
+        payload = {"engine": "whisper", "audio": args.audio, "options": {"language": args.language}}
+
+        forked = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            request(payload, socket_path)
+            forked.append((time.perf_counter() - start) * 1000)
+
+        cold = _time_subprocess(
+            [sys.executable, "whisperService.py", args.audio, args.language], args.runs
+        )
+        return {
+            "preloadMs": status.get("preloadMs"),
+            "zygoteMs": round(statistics.median(forked), 1),
+            "coldProcessMs": cold,
+        }
+    finally:
+        zygote.terminate()
+        zygote.wait()
+
+
+def _start_workers(count, engine, models, shared):
+    env = {**os.environ, "VOICE_SEARCH_SHARED_WEIGHTS": "1" if shared else "0"}
+    code = (
+        "import gc, sys, torch\n"
+        "from engines import preload\n"
+        f"preload({engine!r}, {list(models)!r})\n"
+        "# Touch every weight, as inference would, so mapped pages are resident\n"
+        "for obj in gc.get_objects():\n"
+        "    if isinstance(obj, torch.nn.Module):\n"
+        "        [p.sum() for p in obj.parameters(recurse=False)]\n"
+        "print('ready', flush=True)\n"
+        "sys.stdin.read()\n"
+    )
+    workers = [
+        subprocess.Popen(
+            [sys.executable, "-c", code], cwd=SERVICES_DIR, env=env,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        for _ in range(count)
+    ]
+    for worker in workers:
+        worker.stdout.readline()
+    return workers
+
+
+def bench_memory(args):
+    """RSS/PSS per worker with private weights vs memory-mapped shared weights"""
+    from shared_weights import memory_usage
+
+    models = [args.model] if args.model else []
+    results = {}
+    for shared in (False, True):
+        if shared:
+            # The first shared load writes the mapped copy; don't measure that one
+            for worker in _start_workers(1, args.engine, models, shared=True):
+                worker.communicate()
+        workers = _start_workers(args.workers, args.engine, models, shared)
+        try:
+            usage = [memory_usage(worker.pid) for worker in workers]
+        finally:
+            for worker in workers:
+                worker.communicate()
+        results["shared" if shared else "private"] = {
+            "workers": usage,
+            "totalRssMb": round(sum(u.get("Rss", 0) for u in usage), 1),
+            "totalPssMb": round(sum(u.get("Pss", 0) for u in usage), 1),
+        }
+    return results
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level Levenshtein distance divided by the reference length"""
+    ref, hyp = reference.lower().split(), hypothesis.lower().split()
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / max(len(ref), 1)
+
+
+def _threshold_sweep(steps):
+    """Thresholds from accepting every fast answer (first) to always escalating (last)"""
+    for i in range(steps + 1):
+        strictness = i / steps
+        yield {
+            "min_avg_logprob": -3.0 + 3.0 * strictness,
+            "max_no_speech_prob": 1.0 - strictness,
+            "min_word_confidence": strictness,
+        }
+
+
+def bench_cascade(args):
+    """
+    Latency/WER trade-off of the cascade over a manifest of labelled clips
+    (JSON lines: {"audio": path, "text": reference, "language": "si"}).
+    Every tier runs once per clip; the cascade is then replayed for each
+    threshold setting, so the curve costs one pass over the data.
+    """
+    from cascade import TIERS
+    from confidence import is_confident
+    from engines import recognize
+
+    with open(args.manifest, encoding="utf-8") as f:
+        clips = [json.loads(line) for line in f if line.strip()]
+
+    runs = []
+    for clip in clips:
+        tiers = [recognize(engine, clip["audio"], **options) for engine, options in TIERS[clip["language"]]]
+        runs.append((clip, tiers))
+
+    curve = []
+    for thresholds in _threshold_sweep(args.steps):
+        latency, errors, escalated = [], [], 0
+        for clip, tiers in runs:
+            elapsed = 0
+            for tier, result in enumerate(tiers):
+                elapsed += result.get("processingTime") or 0
+                if tier == len(tiers) - 1 or is_confident(result, thresholds):
+                    break
+            escalated += tier > 0
+            latency.append(elapsed)
+            errors.append(word_error_rate(clip["text"], result.get("text") or ""))
+        curve.append({
+            "thresholds": {k: round(v, 2) for k, v in thresholds.items()},
+            "medianMs": round(statistics.median(latency), 1),
+            "meanMs": round(statistics.mean(latency), 1),
+            "wer": round(statistics.mean(errors), 4),
+            "escalationRate": round(escalated / len(runs), 3),
+        })
+    return {"clips": len(runs), "curve": curve}
+
+
+def bench_speculative(args):
+    """Greedy decoding of the target model alone vs drafted by a smaller model"""
+    import whisper
+    from speculative import SpeculativeWhisper
+    from whisperService import load_model
+
+    target = load_model(args.model)
+    speculative = SpeculativeWhisper(target, load_model(args.draft), args.draft_tokens)
+    results = {"clips": [], "identical": True}
+    for audio_path in args.audio:
+        audio = whisper.load_audio(audio_path)
+        timings = {}
+        texts = {}
+        for name, model in (("greedy", target), ("speculative", speculative)):
+            samples = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                transcription = model.transcribe(audio, language=args.language, temperature=0.0, fp16=False)
+                samples.append((time.perf_counter() - start) * 1000)
+            timings[name] = round(statistics.median(samples), 1)
+            texts[name] = [segment["tokens"] for segment in transcription["segments"]]
+        identical = texts["greedy"] == texts["speculative"]
+        results["identical"] &= identical
+        results["clips"].append({"audio": audio_path, "identical": identical, **timings})
+    return results
+
+
+def bench_romanization(args):
+    """Native + romanization passes of whisperService with and without the request-scoped decode cache"""
+    import whisper
+    from decode_cache import CachingWhisper
+    from whisperService import get_romanization_prompt, load_model
+
+    model = load_model(args.model)
+
+    def two_passes(m, audio):
+        m.transcribe(audio, language=args.language, task="transcribe", fp16=False)
+        return m.transcribe(
+            audio, language="en", task="transcribe", fp16=False,
+            initial_prompt=get_romanization_prompt(args.language), suppress_tokens=[]
+        )
+
+    results = []
+    for audio_path in args.audio:
+        audio = whisper.load_audio(audio_path)
+        timings = {}
+        for name, wrap in (("uncached", lambda m: m), ("cached", CachingWhisper)):
+            samples = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                two_passes(wrap(model), audio)
+                samples.append((time.perf_counter() - start) * 1000)
+            timings[name] = round(statistics.median(samples), 1)
+        results.append({"audio": audio_path, **timings})
+    return results
+
+
+def bench_onnx(args):
+    """Parity and latency of the ONNX Runtime backend against PyTorch eager on fixture audio"""
+    import torch
+    import whisper
+    from onnx_whisper import load_onnx_model
+    from whisperService import load_model
+
+    model = load_model(args.model)
+    onnx_model = load_onnx_model(args.model, lambda: model)
+    results = {"model": args.model, "clips": [], "identical": True}
+    for audio_path in args.audio:
+        audio = whisper.load_audio(audio_path)
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), model.dims.n_mels).unsqueeze(0)
+
+        # Encoder output and first-step logits, compared directly
+        with torch.no_grad():
+            features = model.encoder(mel)
+            onnx_features = onnx_model.encoder(mel)
+            tokens = torch.tensor([list(whisper.tokenizer.get_tokenizer(model.is_multilingual).sot_sequence)])
+            logits = model.logits(tokens, features)
+            onnx_logits = onnx_model.logits(tokens, features)
+
+        clip = {
+            "audio": audio_path,
+            "encoderMaxAbsDiff": float((features - onnx_features).abs().max()),
+            "logitsMaxAbsDiff": float((logits - onnx_logits).abs().max()),
+        }
+        tokens = {}
+        for name, m in (("pytorch", model), ("onnx", onnx_model)):
+            samples = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                transcription = m.transcribe(audio, language=args.language, temperature=0.0, fp16=False)
+                samples.append((time.perf_counter() - start) * 1000)
+            clip[f"{name}Ms"] = round(statistics.median(samples), 1)
+            tokens[name] = [segment["tokens"] for segment in transcription["segments"]]
+        clip["identical"] = tokens["pytorch"] == tokens["onnx"]
+        results["identical"] &= clip["identical"]
+        results["clips"].append(clip)
+    return results
+
+
+def _sample_result(words):
+    """A whisper-style result with word timings, the shape the engines send back"""
+    timings = {
+        "segments": [[i * 5.0, i * 5.0 + 4.8, "segment text " * 8] for i in range(max(1, words // 20))],
+        "words": [[f"word{i}", round(i * 0.25, 2), round(i * 0.25 + 0.2, 2), 0.912] for i in range(words)],
+    }
+    return {
+        "text": " ".join(word[0] for word in timings["words"]),
+        "romanized": "",
+        "error": None,
+        "processingTime": 1234,
+        "stageTimes": {"model_loading": 12, "decode": 40, "encoder": 300, "decoder": 500},
+        "confidence": {"avgLogprob": -0.2143, "noSpeechProb": 0.0123},
+        "model": "whisper-medium",
+        "timings": timings,
+    }
+
+
+def bench_protocol(args):
+    """Serialization + parsing cost per request: JSON lines vs framed JSON vs framed msgpack"""
+    import base64
+    import io
+    from wire import CODEC_JSON, CODEC_MSGPACK, encode_frame, read_frame
+
+    with open(args.audio, "rb") as f:
+        audio = f.read()
+    result = _sample_result(args.words)
+    path_request = {"engine": "whisper", "audio": args.audio, "options": {"language": "si"}, "threads": 4, "cores": [0, 1, 2, 3]}
+
+    def by_path():
+        return path_request
+
+    def as_base64():
+        # JSON can't hold bytes; encoding (Node) and decoding (zygote) are part of its cost
+        return {**path_request, "audio": base64.b64encode(audio).decode("ascii"), "audioEncoding": "base64"}
+
+    def as_bytes():
+        return {**path_request, "audio": audio}
+
+    def lines(make_request):
+        request_bytes = (json.dumps(make_request()) + "\n").encode("utf-8")
+        request = json.loads(request_bytes.decode("utf-8"))
+        if request.get("audioEncoding"):
+            base64.b64decode(request["audio"])
+        response_bytes = (json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8")
+        json.loads(response_bytes.decode("utf-8"))
+        return len(request_bytes), len(response_bytes)
+
+    def framed(codec):
+        def round_trip(make_request):
+            request_bytes = encode_frame(make_request(), codec)
+            request = read_frame(io.BytesIO(request_bytes))[0]
+            if request.get("audioEncoding"):
+                base64.b64decode(request["audio"])
+            response_bytes = encode_frame(result, codec)
+            read_frame(io.BytesIO(response_bytes))
+            return len(request_bytes), len(response_bytes)
+        return round_trip
+
+    cases = [
+        ("jsonLines (path)", lines, by_path),
+        ("json (path)", framed(CODEC_JSON), by_path),
+        ("msgpack (path)", framed(CODEC_MSGPACK), by_path),
+        ("jsonLines (audio base64)", lines, as_base64),
+        ("json (audio base64)", framed(CODEC_JSON), as_base64),
+        ("msgpack (audio bytes)", framed(CODEC_MSGPACK), as_bytes),
+    ]
+    results = {"words": args.words, "audioBytes": len(audio)}
+    for name, round_trip, make_request in cases:
+        samples = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            request_size, response_size = round_trip(make_request)
+            samples.append((time.perf_counter() - start) * 1_000_000)
+        results[name] = {
+            "roundTripUs": round(statistics.median(samples), 1),
+            "requestBytes": request_size,
+            "responseBytes": response_size,
+        }
+    return results
+
+def _stub_backend(name, latency_s, text="stub transcript", error=None):
+    """Stands in for a recognizer (e.g. the Google API) with a fixed latency and answer"""
+    def recognize_stub(audio, language="en-US"):
+        time.sleep(latency_s)
+        return {"text": "" if error else text, "error": error, "processingTime": int(latency_s * 1000), "backend": name}
+    return recognize_stub
+
+
+def bench_hybrid(args):
+    """Local engine vs a stubbed Google API vs racing both, for several remote latencies"""
+    from audio_input import load_audio
+    from speech_recognition_service import recognize_hybrid, recognize_local
+
+    results = []
+    for audio_path in args.audio:
+        audio = load_audio(audio_path)
+        recognize_local(audio, args.language)  # warm up the resident model
+
+        start = time.perf_counter()
+        local = recognize_local(audio, args.language)
+        clip = {"audio": audio_path, "localMs": round((time.perf_counter() - start) * 1000, 1), "localError": local.get("error")}
+        for latency in args.remote_latency:
+            for failing in (False, True):
+                backends = {
+                    "google": _stub_backend("google", latency, error="stub failure" if failing else None),
+                    "local": recognize_local,
+                }
+                start = time.perf_counter()
+                result = recognize_hybrid(audio, args.language, deadline=args.deadline, backends=backends)
+                clip[f"remote {latency}s{' failing' if failing else ''}"] = {
+                    "hybridMs": round((time.perf_counter() - start) * 1000, 1),
+                    "winner": result.get("backend"),
+                    "error": result.get("error"),
+                }
+        results.append(clip)
+    return results
+
+
+def bench_vosk(args):
+    """Per-request model load vs the resident Vosk engine, and throughput across threads"""
+    from vosk import Model
+    import voskService
+
+    model_path = voskService.get_model_path()
+    results = {"model": model_path, "files": len(args.audio)}
+
+    start = time.perf_counter()
+    for _ in args.audio:
+        Model(model_path)  # what every request used to pay
+    results["modelLoadMsPerRequest"] = round((time.perf_counter() - start) * 1000 / len(args.audio), 1)
+
+    voskService.recognize_speech(args.audio[0])  # load the model and a recognizer
+    for workers in args.workers:
+        start = time.perf_counter()
+        outputs = voskService.recognize_many(args.audio, max_workers=workers)
+        elapsed = time.perf_counter() - start
+        results[f"workers={workers}"] = {
+            "totalMs": round(elapsed * 1000, 1),
+            "filesPerSecond": round(len(args.audio) / elapsed, 2),
+            "errors": sum(1 for output in outputs if output.get("error")),
+        }
+    results["pooledRecognizers"] = {
+        f"{rate} Hz" + (f" grammar {version}" if version else ""): len(pool)
+        for (_, rate, version), pool in voskService._recognizers.items()
+    }
+    return results
+
+
+def bench_tamil(args):
+    """The old Tamil flow (base loaded per request, translate + transcribe) vs the resident one-pass engine"""
+    import whisper
+    import whisperTamilService
+
+    def legacy(audio):
+        model = whisper.load_model("base")
+        model.transcribe(audio, language="ta", task="translate", fp16=False)
+        return model.transcribe(
+            audio, language="ta", task="transcribe", fp16=False,
+            initial_prompt=whisperTamilService.ROMANIZATION_PROMPT
+        )
+
+    whisperTamilService.WhisperTamilModel.get_instance()  # resident from here on
+    results = []
+    for audio_path in args.audio:
+        audio = whisper.load_audio(audio_path)
+        timings = {}
+        for name, run in (("legacy", legacy), ("resident", whisperTamilService.recognize_speech)):
+            samples = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                run(audio)
+                samples.append((time.perf_counter() - start) * 1000)
+            timings[name] = round(statistics.median(samples), 1)
+        timings["speedup"] = round(timings["legacy"] / timings["resident"], 2)
+        results.append({"audio": audio_path, "backend": whisperTamilService.TAMIL_BACKEND, **timings})
+    return results
+
+
+def bench_vosk_grammar(args):
+    """Full language model vs the catalog grammar: decode time and whether the text names catalog rows"""
+    import catalog_grammar
+    import voskService
+
+    model_path = voskService.get_model_path()
+    model = voskService.load_model(model_path)
+
+    # recognize_speech reads the catalog from SEARCH_DB_PATH
+    catalog_grammar.SEARCH_DB_PATH = args.db
+    start = time.perf_counter()
+    grammar = catalog_grammar.catalog_grammar(model_path, model)
+    build_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    catalog_grammar.catalog_grammar(model_path, model)  # unchanged database: just a stat
+    refresh_ms = (time.perf_counter() - start) * 1000
+
+    results = {
+        "model": model_path,
+        "grammar": grammar.version,
+        "phrases": len(json.loads(grammar.current[1])),
+        "buildMs": round(build_ms, 1),
+        "refreshMs": round(refresh_ms, 3),
+        "clips": [],
+    }
+    for audio_path in args.audio:
+        clip = {"audio": audio_path}
+        for mode in ("off", "catalog"):
+            outputs = [voskService.recognize_speech(audio_path, grammar=mode) for _ in range(args.runs)]
+            clip[mode] = {
+                "text": outputs[0]["text"],
+                "decoderMs": statistics.median(output["stageTimes"].get("decoder", 0) for output in outputs),
+                "catalogMatches": grammar.matches(outputs[0]["text"]),
+            }
+        results["clips"].append(clip)
+    return results
+
+
+def bench_hotwords(args):
+    """Catalog trie build cost, per-step biasing overhead, and transcripts with and without biasing"""
+    import catalog_grammar
+    import hotwords
+    import torch
+    from audio_input import load_audio
+    from decode_cache import CachingWhisper
+    from whisper.tokenizer import get_tokenizer
+    from whisperService import load_model
+
+    catalog_grammar.SEARCH_DB_PATH = args.db
+    model = load_model(args.model)
+    start = time.perf_counter()
+    trie = hotwords.whisper_trie(model)
+    build_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    hotwords.whisper_trie(model)  # what every later request pays
+    lookup_ms = (time.perf_counter() - start) * 1000
+
+    # Worst case per step: a full-length window ending inside a catalog name
+    tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages)
+    sample_begin = len(tokenizer.sot_sequence_including_notimestamps)
+    names = [title for _, title, _ in catalog_grammar.read_catalog(args.db)][:args.steps] or ["voice search"]
+    logits = torch.zeros(1, model.dims.n_vocab)
+    step_us = []
+    for name in names:
+        name_tokens = tokenizer.encode(" " + name)
+        tokens = torch.tensor([list(tokenizer.sot_sequence_including_notimestamps) + tokenizer.encode(" play") * 8 + name_tokens[:-1]])
+        biasing = hotwords.whisper_filter(trie, sample_begin)
+        start = time.perf_counter()
+        for _ in range(args.runs * 100):
+            biasing.apply(logits, tokens)
+        step_us.append((time.perf_counter() - start) * 1e6 / (args.runs * 100))
+
+    results = {
+        "model": args.model,
+        "prefixes": len(trie),
+        "startTokens": len(trie.start_tokens),
+        "buildMs": round(build_ms, 1),
+        "lookupMs": round(lookup_ms, 3),
+        "stepUs": round(statistics.median(step_us), 1),
+        "clips": [],
+    }
+    for audio_path in args.audio:
+        audio = load_audio(audio_path)
+        clip = {"audio": audio_path}
+        for name, biased in (("plain", None), ("biased", trie)):
+            samples = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                transcription = CachingWhisper(model).transcribe(
+                    audio, language=args.language, temperature=0.0, fp16=False, hotwords=biased
+                )
+                samples.append((time.perf_counter() - start) * 1000)
+            clip[name] = {"text": transcription["text"].strip(), "ms": round(statistics.median(samples), 1)}
+        results["clips"].append(clip)
+    return results
+
+
+def _transcribe_with_context(engine, model, audio, language):
+    """One clip through the whisper or Sinhala engine; (text, encoder ms, total ms)"""
+    from decode_cache import CachingWhisper
+    from instrumentation import StageTimer
+
+    if engine == "whisper-sinhala":
+        import whisperSinhalaService
+        result = whisperSinhalaService.recognize_speech(audio)
+        if result["error"]:
+            raise RuntimeError(result["error"])
+        return result["text"], result["stageTimes"].get("encoder", 0), result["processingTime"]
+
+    wrapped = CachingWhisper(model)
+    timer = StageTimer(engine)
+    start = time.perf_counter()
+    with timer.model_stage(wrapped.encoder):
+        transcription = wrapped.transcribe(audio, language=language, temperature=0.0, fp16=False)
+    return transcription["text"].strip(), timer.stage_times()["encoder"], round((time.perf_counter() - start) * 1000, 1)
+
+
+def bench_encoder_context(args):
+    """Encoder over the clip's length vs the padded 30 s input: output parity and latency on fixture audio"""
+    import encoder_context
+    from audio_input import SAMPLE_RATE, load_audio
+    from whisperService import load_model
+
+    engine = "whisper-sinhala" if args.model == "sinhala" else "whisper"
+    model = None if engine == "whisper-sinhala" else load_model(args.model)
+    results = {"model": args.model, "padSeconds": encoder_context.ENCODER_PAD_SECONDS, "clips": []}
+    for audio_path in args.audio:
+        audio = load_audio(audio_path)
+        clip = {"audio": audio_path, "seconds": round(len(audio) / SAMPLE_RATE, 2)}
+        for name, mode in (("padded", "full"), ("trimmed", "audio")):
+            encoder_context.WHISPER_ENCODER_CONTEXT = mode
+            samples = [_transcribe_with_context(engine, model, audio, args.language) for _ in range(args.runs)]
+            clip[name] = {
+                "text": samples[0][0],
+                "encoderMs": statistics.median(sample[1] for sample in samples),
+                "totalMs": statistics.median(sample[2] for sample in samples),
+            }
+        clip["frames"] = encoder_context.context_frames(len(audio))
+        clip["wer"] = round(word_error_rate(clip["padded"]["text"], clip["trimmed"]["text"]), 3)
+        results["clips"].append(clip)
+
+    clips = results["clips"]
+    results["identical"] = sum(1 for clip in clips if clip["padded"]["text"] == clip["trimmed"]["text"])
+    results["meanWer"] = round(statistics.mean(clip["wer"] for clip in clips), 3)
+    results["encoderSpeedup"] = round(
+        sum(clip["padded"]["encoderMs"] for clip in clips) / max(sum(clip["trimmed"]["encoderMs"] for clip in clips), 1), 2
+    )
+    return results
+
+
+def bench_training_store(args):
+    """Cost of adding one example as the store grows: JSON rewrite vs the append-only store"""
+    import tempfile
+    from training_store import TrainingStore
+
+    results = {"sizes": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "training_data.json")
+        examples = []
+        store = TrainingStore(tmp)
+        for size in args.sizes:
+            while len(examples) < size:
+                example = {"audio_path": f"clip-{len(examples)}.wav", "actual_text": f"song title {len(examples)}"}
+                examples.append(example)
+                store.append(example["audio_path"], example["actual_text"])
+
+            json_times, store_times = [], []
+            for run in range(args.runs):
+                extra = {"audio_path": f"extra-{size}-{run}.wav", "actual_text": "extra"}
+                start = time.perf_counter()
+                # What save_training_data did on every save
+                with open(json_path, "w", encoding="utf-8") as f:
+                    json.dump(examples + [extra], f, ensure_ascii=False, indent=2)
+                json_times.append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                store.append(extra["audio_path"], extra["actual_text"])
+                store_times.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            with open(json_path, "r", encoding="utf-8") as f:
+                json.load(f)
+            json_load_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            store.examples()
+            store_load_ms = (time.perf_counter() - start) * 1000
+            last_id = store.append("latest.wav", "latest")
+            start = time.perf_counter()
+            store.examples(after_id=last_id - 1)
+            incremental_ms = (time.perf_counter() - start) * 1000
+
+            results["sizes"].append({
+                "examples": size,
+                "jsonSaveMs": round(statistics.median(json_times), 3),
+                "storeAppendMs": round(statistics.median(store_times), 3),
+                "jsonLoadMs": round(json_load_ms, 3),
+                "storeLoadMs": round(store_load_ms, 3),
+                "storeIncrementalLoadMs": round(incremental_ms, 3),
+            })
+        start = time.perf_counter()
+        results["compactRemoved"] = store.compact()
+        results["compactMs"] = round((time.perf_counter() - start) * 1000, 1)
+        store.close()
+    return results
+
+
+def bench_dataset(args):
+    """One pass over a clip set: WAV + metadata JSON per clip vs the packed shards"""
+    import tempfile
+    from pathlib import Path
+    import audio_input
+    import audio_shards
+
+    wav_paths = sorted(Path(args.wav_dir).glob("*.wav"))
+
+    def loose_files():
+        for wav_path in wav_paths:
+            audio = audio_input.load_audio(str(wav_path))
+            text = audio_shards.read_metadata(args.metadata, wav_path.stem).get("actualText")
+            yield audio, text
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        manifest = audio_shards.pack(args.wav_dir, tmp, args.metadata)
+        pack_s = time.perf_counter() - start
+
+        def shards():
+            for _, pcm, text in audio_shards.ShardedDataset(tmp):
+                yield audio_input.load_audio(pcm), text
+
+        timings = {}
+        for name, source in (("files", loose_files), ("shards", shards)):
+            runs = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                samples = sum(len(audio) for audio, _ in source())
+                runs.append(time.perf_counter() - start)
+            timings[name] = {"passMs": round(statistics.median(runs) * 1000, 1), "samples": samples}
+
+    return {
+        "clips": len(wav_paths),
+        "shardFiles": len(manifest["shards"]),
+        "packSeconds": round(pack_s, 2),
+        **timings,
+        "speedup": round(timings["files"]["passMs"] / max(timings["shards"]["passMs"], 1e-3), 1),
+    }
+
+
+def bench_fingerprints(args):
+    """Fingerprint index at scale: memory per clip, add/query cost, recall vs a full scan"""
+    import tracemalloc
+    import numpy as np
+    from audio_fingerprint import FingerprintIndex, hamming
+
+    rng = np.random.default_rng(0)
+    fingerprints = rng.integers(0, 256, (args.clips, 32), dtype=np.uint8)
+
+    tracemalloc.start()
+    index = FingerprintIndex()
+    start = time.perf_counter()
+    for row in fingerprints:
+        index.add(row.tobytes())
+    add_s = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    query_times, scan_times, missed = [], [], 0
+    for _ in range(args.queries):
+        # A stored clip with up to max_distance bits flipped, as a re-recording would be
+        bits = np.unpackbits(fingerprints[rng.integers(args.clips)])
+        bits[rng.choice(bits.size, rng.integers(0, args.max_distance + 1), replace=False)] ^= 1
+        query = np.packbits(bits).tobytes()
+
+        start = time.perf_counter()
+        found = {number for number, _ in index.query(query, args.max_distance)}
+        query_times.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        expected = set(np.flatnonzero(hamming(fingerprints, query) <= args.max_distance).tolist())
+        scan_times.append((time.perf_counter() - start) * 1000)
+        missed += len(expected - found)
+
+    return {
+        "clips": args.clips,
+        "indexMb": round(memory / 1e6, 1),
+        "bytesPerClip": round(memory / args.clips),
+        "addUs": round(add_s / args.clips * 1e6, 1),
+        "queryMs": round(statistics.median(query_times), 3),
+        "fullScanMs": round(statistics.median(scan_times), 3),
+        "missed": missed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Voice search engine benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    imports = commands.add_parser("imports", help="import/startup time of the engine entry points")
+    imports.add_argument("--runs", type=int, default=5)
+    imports.set_defaults(func=bench_imports)
+
+    zygote = commands.add_parser("zygote", help="request latency through the preforked zygote")
+    zygote.add_argument("audio")
+    zygote.add_argument("--language", default="en")
+    zygote.add_argument("--preload", default="whisper:tiny.en")
+    zygote.add_argument("--socket", default="/tmp/voice-search-bench.sock")
+    zygote.add_argument("--runs", type=int, default=5)
+    zygote.set_defaults(func=bench_zygote)
+
+    memory = commands.add_parser("memory", help="RSS/PSS of N workers with private vs shared weights")
+    memory.add_argument("--engine", default="whisper")
+    memory.add_argument("--model", default="medium", help="Whisper size for the whisper engine")
+    memory.add_argument("--workers", type=int, default=4)
+    memory.set_defaults(func=bench_memory)
+
+    cascade = commands.add_parser("cascade", help="latency/WER trade-off of the confidence cascade")
+    cascade.add_argument("manifest", help="JSON lines with audio, text and language")
+    cascade.add_argument("--steps", type=int, default=10)
+    cascade.set_defaults(func=bench_cascade)
+
+    speculative = commands.add_parser("speculative", help="greedy vs draft-and-verify decoding")
+    speculative.add_argument("audio", nargs="+")
+    speculative.add_argument("--language", default="si")
+    speculative.add_argument("--model", default="medium")
+    speculative.add_argument("--draft", default="tiny")
+    speculative.add_argument("--draft-tokens", type=int, default=5)
+    speculative.add_argument("--runs", type=int, default=3)
+    speculative.set_defaults(func=bench_speculative)
+
+    romanization = commands.add_parser("romanization", help="two-pass si/ta decode with and without the decode cache")
+    romanization.add_argument("audio", nargs="+")
+    romanization.add_argument("--language", default="si")
+    romanization.add_argument("--model", default="medium")
+    romanization.add_argument("--runs", type=int, default=3)
+    romanization.set_defaults(func=bench_romanization)
+
+    onnx = commands.add_parser("onnx", help="ONNX Runtime vs PyTorch parity and latency")
+    onnx.add_argument("audio", nargs="+")
+    onnx.add_argument("--model", default="tiny.en")
+    onnx.add_argument("--language", default="en")
+    onnx.add_argument("--runs", type=int, default=3)
+    onnx.set_defaults(func=bench_onnx)
+
+    protocol = commands.add_parser("protocol", help="zygote message serialization/parsing cost per request")
+    protocol.add_argument("audio", help="audio file sent inline in the request cases")
+    protocol.add_argument("--words", type=int, default=200, help="word timings in the sample result")
+    protocol.add_argument("--runs", type=int, default=200)
+    protocol.set_defaults(func=bench_protocol)
+
+    hybrid = commands.add_parser("hybrid", help="local engine raced against a stubbed Google API")
+    hybrid.add_argument("audio", nargs="+")
+    hybrid.add_argument("--language", default="en-US")
+    hybrid.add_argument("--remote-latency", type=float, nargs="+", default=[0.2, 1.0, 3.0], help="stub API latencies (s)")
+    hybrid.add_argument("--deadline", type=float, default=5.0)
+    hybrid.set_defaults(func=bench_hybrid)
+
+    vosk = commands.add_parser("vosk", help="resident Vosk engine: model reuse and multi-threaded throughput")
+    vosk.add_argument("audio", nargs="+")
+    vosk.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    vosk.set_defaults(func=bench_vosk)
+
+    tamil = commands.add_parser("tamil", help="Tamil latency before and after the resident one-pass engine")
+    tamil.add_argument("audio", nargs="+")
+    tamil.add_argument("--runs", type=int, default=3)
+    tamil.set_defaults(func=bench_tamil)
+
+    grammar = commands.add_parser("vosk-grammar", help="Vosk full LM vs the catalog-constrained grammar")
+    grammar.add_argument("audio", nargs="+")
+    grammar.add_argument("--db", default=os.path.join(SERVICES_DIR, "..", "..", "data", "search.db"))
+    grammar.add_argument("--runs", type=int, default=3)
+    grammar.set_defaults(func=bench_vosk_grammar)
+
+    hotword = commands.add_parser("hotwords", help="catalog hotword biasing: trie cost, per-step overhead, transcripts")
+    hotword.add_argument("audio", nargs="*")
+    hotword.add_argument("--db", default=os.path.join(SERVICES_DIR, "..", "..", "data", "search.db"))
+    hotword.add_argument("--model", default="tiny.en")
+    hotword.add_argument("--language", default="en")
+    hotword.add_argument("--steps", type=int, default=50, help="catalog names used for the per-step timing")
+    hotword.add_argument("--runs", type=int, default=3)
+    hotword.set_defaults(func=bench_hotwords)
+
+    context = commands.add_parser("encoder-context", help="encoder over the clip's length vs 30 s padding")
+    context.add_argument("audio", nargs="+")
+    context.add_argument("--model", default="tiny.en", help="Whisper size, or \"sinhala\" for the Sinhala engine")
+    context.add_argument("--language", default="en")
+    context.add_argument("--runs", type=int, default=3)
+    context.set_defaults(func=bench_encoder_context)
+
+    store = commands.add_parser("training-store", help="adding/loading training examples: JSON rewrite vs append-only store")
+    store.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    store.add_argument("--runs", type=int, default=5)
+    store.set_defaults(func=bench_training_store)
+
+    dataset = commands.add_parser("dataset", help="a pass over WAV + JSON files vs the packed shards")
+    dataset.add_argument("wav_dir")
+    dataset.add_argument("--metadata")
+    dataset.add_argument("--runs", type=int, default=3)
+    dataset.set_defaults(func=bench_dataset)
+
+    fingerprint = commands.add_parser("fingerprints", help="near-duplicate index: memory, add/query cost, recall")
+    fingerprint.add_argument("--clips", type=int, default=1000000)
+    fingerprint.add_argument("--queries", type=int, default=200)
+    fingerprint.add_argument("--max-distance", type=int, default=24)
+    fingerprint.set_defaults(func=bench_fingerprints)
+
+    args = parser.parse_args()
+    print(json.dumps(args.func(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import argparse
+import os
+import sys
+import time
+
+# The services import each other as top-level modules, so put their directory on the path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'services'))
+from onnx_whisper import export_model, is_exported, model_dir
+
+DEFAULT_MODELS = ["tiny.en", "base", "medium"]
+
+def export_models(models, force=False):
+    """Export Whisper models to ONNX for WHISPER_BACKEND=onnx"""
+    from whisperService import load_model
+
+    for name in models:
+        if is_exported(name) and not force:
+            print(f"{name}: already exported to {model_dir(name)}")
+            continue
+
+        start = time.time()
+        print(f"{name}: exporting...")
+        export_model(name, load_model(name))
+        print(f"{name}: exported to {model_dir(name)} in {time.time() - start:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export Whisper models to ONNX encoder/decoder graphs")
+    parser.add_argument("models", nargs="*", default=DEFAULT_MODELS)
+    parser.add_argument("--force", action="store_true", help="re-export models that are already cached")
+    args = parser.parse_args()
+
+    try:
+        export_models(args.models, args.force)
+    except Exception as e:
+        print(f"\nError exporting models: {str(e)}", file=sys.stderr)
+        sys.exit(1)
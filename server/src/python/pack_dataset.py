@@ -0,0 +1,26 @@
+import argparse
+import os
+import sys
+import time
+
+# The services import each other as top-level modules, so put their directory on the path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'services'))
+from audio_shards import DEFAULT_SHARD_BYTES, ShardedDataset, pack
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack a directory of WAV clips and their metadata into PCM shards")
+    parser.add_argument("wav_dir", help="directory of *.wav clips (e.g. test_data/wav)")
+    parser.add_argument("dataset_dir", help="output directory for manifest.json and the shards")
+    parser.add_argument("--metadata", help="directory of <clip>.json metadata with actualText (e.g. test_data/metadata)")
+    parser.add_argument("--shard-mb", type=int, default=DEFAULT_SHARD_BYTES // (1024 * 1024))
+    args = parser.parse_args()
+
+    try:
+        start = time.time()
+        manifest = pack(args.wav_dir, args.dataset_dir, args.metadata, args.shard_mb * 1024 * 1024)
+        clips = len(ShardedDataset(args.dataset_dir))
+        print(f"Packed {clips} clips into {len(manifest['shards'])} shards in {args.dataset_dir} "
+              f"({time.time() - start:.1f}s)")
+    except Exception as e:
+        print(f"\nError packing dataset: {str(e)}", file=sys.stderr)
+        sys.exit(1)
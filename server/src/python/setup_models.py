@@ -1,52 +1,146 @@
+"""
+Provision the speech models: fetch, verify, build derived artifacts, and
+record everything in model_cache/manifest.json for the services to load from.
+
+    python setup_models.py                       # fetch the default artifacts
+    python setup_models.py fetch --mirror /srv/model-mirror --derive onnx:tiny.en warmup:whisper
+    python setup_models.py lock                  # pin URLs, sha256 and sizes in models.lock.json
+    python setup_models.py verify                # re-hash everything in the manifest
+
+Artifacts are fetched concurrently. See model_provisioning.py for resuming,
+hash checks and the mirror layout. Derived artifacts run in parallel worker
+processes, each on its own slice of the cores:
+    onnx:<whisper size>  ONNX export for WHISPER_BACKEND=onnx
+    warmup:<engine>      load the engine and transcribe a second of silence
+A failed artifact doesn't stop the others. Running the command again redoes
+only what is missing or failed.
+"""
+import argparse
 import os
 import sys
-import whisper
-from transformers import WhisperForConditionalGeneration, WhisperProcessor
-from services.whisperSinhalaService import WhisperSinhalaModel
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# The services import each other as top-level modules, so put their directory on the path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'services'))
+from model_provisioning import (
+    LOCK_PATH, fetch_artifacts, read_lock, resolve, update_manifest, verify_manifest, write_json_atomic,
+)
+from thread_budget import apply_thread_budget, plan_layout
+from whisperSinhalaService import SINHALA_MODEL_ID
+from whisperTamilService import TAMIL_MODEL_ID
+
+DEFAULT_ARTIFACTS = [
+    "whisper:base",
+    "whisper:tiny.en",
+    f"hf:{SINHALA_MODEL_ID}",
+    f"hf:{TAMIL_MODEL_ID}",
+    "vosk:vosk-model-small-en-us-0.15",
+]
+# Pinned by `lock` as well: scripts/setup_models.py provisions PocketSphinx from this lock
+LOCKED_ARTIFACTS = DEFAULT_ARTIFACTS + ["pocketsphinx:en-us"]
+
+def lock_entries(names, lock_path, mirror=None):
+    """Lock entries for `names`, resolving (and pinning) the ones the lock doesn't have"""
+    pinned = read_lock(lock_path)["artifacts"]
+    entries = {}
+    for name in names:
+        if name not in pinned:
+            print(f"{name}: not in {lock_path}, resolving...")
+        entries[name] = pinned.get(name) or resolve(name, mirror)
+    return entries
 
-# Add the parent directory to Python path so we can import from services
-sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+def run_derived(task, cores):
+    """One derived artifact, in a worker process pinned to `cores`"""
+    apply_thread_budget(len(cores), cores)
+    kind, _, arg = task.partition(":")
+    start = time.time()
+    if kind == "onnx":
+        from onnx_whisper import export_model, is_exported
+        from whisperService import load_model
 
-def setup_models():
+        if not is_exported(arg):
+            export_model(arg, load_model(arg))
+    elif kind == "warmup":
+        import numpy as np
+        from engines import preload, recognize
+
+        preload(arg)
+        result = recognize(arg, np.zeros(16000, np.float32))
+        if result.get("error"):
+            raise RuntimeError(result["error"])
+    else:
+        raise ValueError(f"Unknown derived artifact: {task}")
+    return {"seconds": round(time.time() - start, 1)}
+
+def build_derived(tasks):
+    """Run the derived tasks in parallel; returns ({task: result}, {task: error})"""
+    done, errors = {}, {}
+    if not tasks:
+        return done, errors
+    layouts = plan_layout(len(tasks))
+    with ProcessPoolExecutor(max_workers=len(layouts)) as pool:
+        futures = {task: pool.submit(run_derived, task, layouts[i % len(layouts)]) for i, task in enumerate(tasks)}
+        for task, future in futures.items():
+            try:
+                done[task] = {**future.result(), "builtAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+                print(f"{task}: done in {done[task]['seconds']}s")
+            except Exception as e:
+                errors[task] = str(e)
+                print(f"{task}: {e}", file=sys.stderr)
+    return done, errors
+
+def setup_models(artifacts=None, mirror=None, jobs=8, derive=(), lock_path=LOCK_PATH):
     print("Setting up speech recognition models...")
-    
-    try:
-        # Create cache directory
-        cache_dir = os.path.join(os.path.dirname(__file__), 'model_cache')
-        os.makedirs(cache_dir, exist_ok=True)
-        
-        # Download and cache the base multilingual model
-        print("\nDownloading base multilingual Whisper model...")
-        whisper.load_model("base")
-        
-        # Download and cache the English-specific tiny model
-        print("\nDownloading English-specific Whisper model...")
-        whisper.load_model("tiny.en")
-        
-        # Initialize and cache Sinhala model
-        print("\nInitializing Sinhala model...")
-        sinhala_model = WhisperSinhalaModel.get_instance()
-        
-        # Download and cache Tamil-specific model
-        print("\nDownloading Tamil-specific model...")
-        tamil_cache_dir = os.path.join(cache_dir, 'tamil')
-        os.makedirs(tamil_cache_dir, exist_ok=True)
-        WhisperProcessor.from_pretrained(
-            "vasista22/whisper-tamil-medium",
-            cache_dir=tamil_cache_dir
-        )
-        WhisperForConditionalGeneration.from_pretrained(
-            "vasista22/whisper-tamil-medium",
-            cache_dir=tamil_cache_dir
-        )
-        
-        print("\nAll models downloaded and cached successfully!")
-        return True
-        
-    except Exception as e:
-        print(f"\nError setting up models: {str(e)}", file=sys.stderr)
+    entries = lock_entries(artifacts or DEFAULT_ARTIFACTS, lock_path, mirror)
+    installed, errors = fetch_artifacts(entries, mirror, jobs)
+    update_manifest(artifacts=installed)
+
+    derived, derive_errors = build_derived(list(derive))
+    update_manifest(derived=derived)
+
+    for name, error in {**errors, **derive_errors}.items():
+        print(f"\nFailed: {name}: {error}", file=sys.stderr)
+    if errors or derive_errors:
         return False
+    print("\nAll models provisioned and verified")
+    return True
+
+def lock_models(artifacts=None, mirror=None, lock_path=LOCK_PATH):
+    """Resolve artifacts and pin their URLs, hashes and sizes in the lock file"""
+    artifacts = artifacts or LOCKED_ARTIFACTS
+    lock = read_lock(lock_path)
+    for name in artifacts:
+        print(f"{name}: resolving...")
+        lock["artifacts"][name] = resolve(name, mirror)
+    write_json_atomic(lock_path, lock)
+    print(f"Pinned {len(artifacts)} artifacts in {lock_path}")
+    return True
 
 if __name__ == "__main__":
-    success = setup_models()
-    sys.exit(0 if success else 1)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Fetch, verify and register the speech models")
+    parser.add_argument("command", nargs="?", default="fetch", choices=["fetch", "lock", "verify"])
+    parser.add_argument("--artifacts", nargs="+",
+                        help=f"default: {' '.join(DEFAULT_ARTIFACTS)} (lock also pins {LOCKED_ARTIFACTS[-1]})")
+    parser.add_argument("--mirror", default=os.getenv("MODEL_MIRROR"),
+                        help="mirror URL or local directory to fetch from instead of the origins (env MODEL_MIRROR)")
+    parser.add_argument("--jobs", type=int, default=8, help="concurrent downloads")
+    parser.add_argument("--derive", nargs="*", default=[], help="derived artifacts, e.g. onnx:tiny.en warmup:whisper")
+    parser.add_argument("--lock", default=LOCK_PATH, help="lock file with the pinned hashes")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "lock":
+            success = lock_models(args.artifacts, args.mirror, args.lock)
+        elif args.command == "verify":
+            problems = verify_manifest()
+            for name, issues in problems.items():
+                print(f"{name}: {'; '.join(issues)}", file=sys.stderr)
+            success = not problems
+            print("All provisioned files match their hashes" if success else "\nVerification failed")
+        else:
+            success = setup_models(args.artifacts, args.mirror, args.jobs, args.derive, args.lock)
+    except Exception as e:
+        print(f"\nError setting up models: {str(e)}", file=sys.stderr)
+        success = False
+    sys.exit(0 if success else 1)
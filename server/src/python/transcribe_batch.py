@@ -0,0 +1,227 @@
+"""
+Offline batch transcription of an audio archive.
+
+    python transcribe_batch.py <source> results.jsonl --engine whisper --option language=en
+
+<source> is one of:
+- a directory, searched recursively for audio files;
+- a packed dataset (pack_dataset.py), read from its shards;
+- a manifest: one audio path per line, or JSON lines with an "audio" path and
+  an optional "id". Relative paths are relative to the manifest.
+
+The files are spread over worker processes that keep the engine's models
+resident, each with its own slice of the cores (thread_budget.plan_layout).
+On POSIX the models are loaded once before the workers fork, as the zygote
+does, so the workers share the weights.
+
+Every result is appended to the output as one JSON line and flushed to disk,
+so the output file is also the checkpoint. Running the same command again
+skips clips already in it; --retry-errors re-runs the ones that failed.
+Progress (files/s, audio-seconds/s) goes to stderr every --report-every
+seconds; a summary is printed as JSON on stdout at the end.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+
+# The services import each other as top-level modules, so put their directory on the path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'services'))
+from audio_input import SAMPLE_RATE, load_audio
+from audio_shards import ShardedDataset, is_dataset
+from engines import ENGINES, get_recognizer, preload
+from thread_budget import apply_thread_budget, plan_layout
+
+AUDIO_EXTENSIONS = {".wav", ".webm", ".ogg", ".opus", ".mp3", ".flac", ".m4a"}
+
+
+def list_items(source):
+    """(id, audio) for every clip of the source; audio is a path or int16 PCM"""
+    source = Path(source)
+    if source.is_dir() and is_dataset(source):
+        for clip_id, pcm, _ in ShardedDataset(source):
+            yield clip_id, pcm
+    elif source.is_dir():
+        for path in sorted(p for p in source.rglob("*") if p.suffix.lower() in AUDIO_EXTENSIONS):
+            yield str(path.relative_to(source)), str(path)
+    else:
+        with open(source, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line) if line.startswith("{") else {"audio": line}
+                path = Path(entry["audio"])
+                if not path.is_absolute():
+                    path = source.parent / path
+                yield entry.get("id") or entry["audio"], str(path)
+
+
+def completed_ids(output_path, retry_errors=False):
+    """Ids already in the output file (the checkpoint); a torn last line is ignored"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if not (retry_errors and result.get("error")):
+                done.add(result["id"])
+    return done
+
+
+_recognizer = None
+_options = {}
+
+
+def _init_worker(engine, models, options, layouts):
+    global _recognizer, _options
+    layout = layouts.get()
+    apply_thread_budget(len(layout), layout)
+    preload(engine, models)
+    _recognizer = get_recognizer(engine)
+    _options = options
+
+
+def _transcribe(item):
+    clip_id, audio = item
+    start = time.time()
+    try:
+        # Decoded once here: the engines take the samples, and the length gives the audio duration
+        samples = load_audio(audio)
+        result = _recognizer(samples, **_options)
+        audio_seconds = len(samples) / SAMPLE_RATE
+    except Exception as e:
+        result = {"text": "", "error": str(e), "processingTime": int((time.time() - start) * 1000)}
+        audio_seconds = 0
+    return {"id": clip_id, "audioSeconds": round(audio_seconds, 3), **result}
+
+
+def worker_layouts(workers, pending, cores=None):
+    """Core slices for the worker processes; an explicit worker count is always honoured"""
+    if not workers:
+        # One single-threaded worker per core by default (throughput mode)
+        return plan_layout(max(pending, 1), cores)
+    layouts = plan_layout(workers, cores)[:workers]
+    if len(layouts) < workers:
+        # More workers than cores (e.g. engines that wait on I/O): single-threaded, sharing the cores in turn
+        cores = [core for layout in layouts for core in layout]
+        print(f"{workers} workers on {len(cores)} cores: each runs single-threaded and the cores are shared",
+              file=sys.stderr, flush=True)
+        layouts = [(cores[i % len(cores)],) for i in range(workers)]
+    return layouts
+
+
+class Progress:
+    def __init__(self, total, report_every):
+        self.total = total
+        self.report_every = report_every
+        self.start = self.last_report = time.time()
+        self.files = 0
+        self.errors = 0
+        self.audio_seconds = 0.0
+
+    def add(self, result):
+        self.files += 1
+        self.errors += bool(result.get("error"))
+        self.audio_seconds += result.get("audioSeconds") or 0
+        now = time.time()
+        if now - self.last_report >= self.report_every or self.files == self.total:
+            self.last_report = now
+            stats = self.summary()
+            remaining = (self.total - self.files) / stats["filesPerSecond"] if stats["filesPerSecond"] else 0
+            print(
+                f"{self.files}/{self.total} files, {stats['filesPerSecond']:.2f} files/s, "
+                f"{stats['audioSecondsPerSecond']:.1f} audio-s/s, {self.errors} errors, "
+                f"ETA {remaining:.0f}s",
+                file=sys.stderr, flush=True,
+            )
+
+    def summary(self):
+        elapsed = max(time.time() - self.start, 1e-9)
+        return {
+            "files": self.files,
+            "errors": self.errors,
+            "audioSeconds": round(self.audio_seconds, 1),
+            "elapsedSeconds": round(elapsed, 1),
+            "filesPerSecond": round(self.files / elapsed, 3),
+            "audioSecondsPerSecond": round(self.audio_seconds / elapsed, 2),
+        }
+
+
+def transcribe_batch(source, output_path, engine, options=None, models=(), workers=None,
+                     retry_errors=False, report_every=10):
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine}")
+    done = completed_ids(output_path, retry_errors)
+    pending = [item for item in list_items(source) if item[0] not in done]
+
+    layouts = worker_layouts(workers, len(pending))
+    progress = Progress(len(pending), report_every)
+    print(f"{len(done)} already done, {len(pending)} to transcribe with {len(layouts)} {engine} workers",
+          file=sys.stderr, flush=True)
+    if not pending:
+        return {"skipped": len(done), **progress.summary()}
+
+    fork = "fork" in multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if fork else "spawn")
+    if fork:
+        # Loaded once here and shared copy-on-write with the forked workers
+        preload(engine, models)
+    layout_queue = context.Queue()
+    for layout in layouts:
+        layout_queue.put(layout)
+
+    with open(output_path, "a", encoding="utf-8") as output:
+        # Start on a fresh line if the last run was cut off mid-write
+        if output.tell() and not _ends_with_newline(output_path):
+            output.write("\n")
+        with context.Pool(len(layouts), _init_worker, (engine, list(models), options or {}, layout_queue)) as pool:
+            for result in pool.imap_unordered(_transcribe, pending):
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                output.flush()
+                os.fsync(output.fileno())
+                progress.add(result)
+    return {"skipped": len(done), **progress.summary()}
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def parse_option(value):
+    """"language=si" -> ("language", "si"); true/false become booleans"""
+    name, _, option = value.partition("=")
+    return name, {"true": True, "false": False}.get(option.lower(), option)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcribe a directory, manifest or packed dataset to JSONL")
+    parser.add_argument("source", help="audio directory, packed dataset directory, or manifest file")
+    parser.add_argument("output", help="results JSONL; also the checkpoint for resuming")
+    parser.add_argument("--engine", default="whisper", choices=sorted(ENGINES))
+    parser.add_argument("--option", action="append", default=[], type=parse_option,
+                        help="recognizer option as name=value, e.g. language=si (repeatable)")
+    parser.add_argument("--models", nargs="*", default=[], help="Whisper sizes to preload for --engine whisper")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--retry-errors", action="store_true", help="re-run clips whose result was an error")
+    parser.add_argument("--report-every", type=float, default=10, help="seconds between progress lines")
+    args = parser.parse_args()
+
+    try:
+        summary = transcribe_batch(
+            args.source, args.output, args.engine, dict(args.option), args.models,
+            args.workers, args.retry_errors, args.report_every,
+        )
+        print(json.dumps(summary))
+    except Exception as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
@@ -0,0 +1,32 @@
+const express = require('express');
+const threadScheduler = require('../services/threadScheduler');
+const metrics = require('../services/metrics');
+const coalescer = require('../services/coalescer');
+
+const router = express.Router();
+
+// GET /api/metrics                   -> JSON snapshot
+// GET /api/metrics?format=prometheus -> Prometheus text exposition
+router.get('/', (req, res) => {
+    if (req.query.format === 'prometheus') {
+        const layout = threadScheduler.snapshot();
+        const lines = [
+            metrics.renderPrometheus().trimEnd(),
+            `voice_search_worker_cores_total ${layout.totalCores}`,
+            `voice_search_worker_cores_free ${layout.freeCores}`,
+            `voice_search_worker_queue_depth ${layout.queueDepth}`,
+            ...layout.workers.map(worker =>
+                `voice_search_worker_threads{engine="${worker.engine}",mode="${worker.mode}",cores="${worker.cores.join(',')}"} ${worker.threads}`
+            )
+        ];
+        return res.type('text/plain; version=0.0.4').send(lines.join('\n') + '\n');
+    }
+
+    res.json({
+        threadLayout: threadScheduler.snapshot(),
+        coalescer: coalescer.snapshot(),
+        ...metrics.snapshot()
+    });
+});
+
+module.exports = router;
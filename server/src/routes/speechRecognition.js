@@ -1,19 +1,10 @@
 const express = require('express');
 const multer = require('multer');
-const path = require('path');
 const speechRecognitionService = require('../services/speechRecognitionService');
 
 const router = express.Router();
-const storage = multer.diskStorage({
-    destination: function(req, file, cb) {
-        cb(null, path.join(__dirname, '../../uploads/'));
-    },
-    filename: function(req, file, cb) {
-        cb(null, 'speech-' + Date.now() + '.wav');
-    }
-});
-
-const upload = multer({ storage });
+// Uploads stay in memory and go to the engine as bytes; nothing is written to disk
+const upload = multer({ storage: multer.memoryStorage() });
 
 // Define routes
 router.post('/recognize', upload.single('audio'), async (req, res) => {
@@ -22,8 +13,17 @@ router.post('/recognize', upload.single('audio'), async (req, res) => {
             return res.status(400).json({ error: 'No audio file provided' });
         }
 
-        console.log('Processing speech recognition for:', req.file.path);
-        const result = await speechRecognitionService.recognizeSpeech(req.file.path);
+        const language = req.body.language || 'en';
+        // 'google', 'local' or 'hybrid'; unset follows SPEECH_BACKEND
+        const backend = req.body.backend || null;
+        if (backend && !speechRecognitionService.BACKENDS.includes(backend)) {
+            return res.status(400).json({
+                error: `Unknown backend: ${backend} (expected one of ${speechRecognitionService.BACKENDS.join(', ')})`
+            });
+        }
+        
+        console.log('Processing speech recognition for:', req.file.size + ' bytes', 'Backend:', backend);
+        const result = await speechRecognitionService.recognizeSpeech(req.file.buffer, language, backend);
         
         return res.json(result);
     } catch (error) {
@@ -1,19 +1,10 @@
 const express = require('express');
 const multer = require('multer');
-const path = require('path');
 const voskService = require('../services/voskService');
 
 const router = express.Router();
-const storage = multer.diskStorage({
-    destination: function(req, file, cb) {
-        cb(null, path.join(__dirname, '../../uploads/'));
-    },
-    filename: function(req, file, cb) {
-        cb(null, 'vosk-' + Date.now() + '.wav');
-    }
-});
-
-const upload = multer({ storage });
+// Uploads stay in memory and go to the engine as bytes; nothing is written to disk
+const upload = multer({ storage: multer.memoryStorage() });
 
 router.post('/recognize', upload.single('audio'), async (req, res) => {
     try {
@@ -21,8 +12,10 @@ router.post('/recognize', upload.single('audio'), async (req, res) => {
             return res.status(400).json({ error: 'No audio file provided' });
         }
 
-        console.log('Processing Vosk recognition for:', req.file.path);
-        const result = await voskService.recognizeSpeech(req.file.path);
+        console.log('Processing Vosk recognition for:', req.file.size + ' bytes');
+        // 'true' adds word/segment timings to the result
+        const timestamps = req.body.timestamps === 'true';
+        const result = await voskService.recognizeSpeech(req.file.buffer, timestamps);
         
         return res.json(result);
     } catch (error) {
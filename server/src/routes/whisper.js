@@ -1,20 +1,11 @@
 // whisper.js (Express route)
 const express = require('express');
 const multer = require('multer');
-const path = require('path');
 const whisperService = require('../services/whisperService');
 
 const router = express.Router();
-const storage = multer.diskStorage({
-    destination: function(req, file, cb) {
-        cb(null, path.join(__dirname, '../../uploads/'));
-    },
-    filename: function(req, file, cb) {
-        cb(null, 'whisper-' + Date.now() + '.wav');
-    }
-});
-
-const upload = multer({ storage });
+// Uploads stay in memory and go to the engine as bytes; nothing is written to disk
+const upload = multer({ storage: multer.memoryStorage() });
 
 router.post('/recognize', upload.single('audio'), async (req, res) => {
     try {
@@ -24,9 +15,13 @@ router.post('/recognize', upload.single('audio'), async (req, res) => {
 
         // Get language from form data, default to 'en' if not provided
         const language = req.body.language || 'en';
+        // 'cascade' tries a faster engine first (see services/cascade.py)
+        const mode = req.body.mode || null;
+        // 'true' adds word/segment timings to the result
+        const timestamps = req.body.timestamps === 'true';
         
-        console.log('Processing Whisper recognition for:', req.file.path, 'Language:', language);
-        const result = await whisperService.recognizeSpeech(req.file.path, language);
+        console.log('Processing Whisper recognition for:', req.file.size + ' bytes', 'Language:', language, 'Mode:', mode);
+        const result = await whisperService.recognizeSpeech(req.file.buffer, language, mode, timestamps);
         
         return res.json(result);
     } catch (error) {
@@ -0,0 +1,158 @@
+"""
+Compact audio fingerprints and a Hamming-space index for near-duplicate clips.
+
+A fingerprint is 256 bits (32 bytes) taken from a clip's log-mel
+spectrogram:
+1. Bins more than 24 dB below the loudest one are raised to that floor, so
+   background noise and silence carry no energy.
+2. The clip is cut into 17 time slices that each hold an equal share of the
+   energy above the floor. Silence before, after or inside the phrase moves
+   no boundary, and a faster or slower take lines up.
+3. The slices are averaged into a 17 x 17 grid of mel bands x slices.
+4. Each bit is the sign of the energy difference between neighbouring bands,
+   compared with the previous slice (as in Haitsma-Kalker audio hashing).
+   Gain changes cancel out; so does most of the microphone colouring.
+
+Two recordings of the same phrase differ in a few bits; unrelated clips
+differ in about a third to a half of them.
+
+FingerprintIndex finds the stored fingerprints within DEDUP_MAX_DISTANCE bits
+of a query without scanning them all (multi-index hashing). The 256 bits are
+split into 16 disjoint 16-bit keys. If two fingerprints are within 31 bits of
+each other, then by pigeonhole some key differs in at most one bit. A query
+looks up each key and its 16 one-bit variations, and compares only the
+fingerprints it finds. The lookups are binary searches in one sorted column
+per key; no Python object is kept per clip. For 1M clips a query takes a few
+milliseconds, against hundreds for a full scan, and the index holds about
+130 bytes per clip (see `benchmark.py fingerprints`).
+
+Configuration (environment):
+    TRAINING_DEDUP               "merge" (default) or "off"
+    TRAINING_DEDUP_MAX_DISTANCE  bits that may differ for a near-duplicate (default 24)
+"""
+import os
+
+from lazy_imports import lazy_module
+
+np = lazy_module("numpy")
+
+TRAINING_DEDUP = os.getenv("TRAINING_DEDUP", "merge").lower()
+DEDUP_MAX_DISTANCE = int(os.getenv("TRAINING_DEDUP_MAX_DISTANCE", "24"))
+FINGERPRINT_BITS = 256
+FINGERPRINT_BYTES = FINGERPRINT_BITS // 8
+_GRID = 17
+_KEY_BITS = 16
+_TABLES = FINGERPRINT_BITS // _KEY_BITS
+# Energy floor below the loudest bin (whisper log-mel units: 1.0 = 40 dB)
+_FLOOR = 0.6
+
+
+def dedup_enabled():
+    return TRAINING_DEDUP == "merge"
+
+
+def fingerprint(log_mel):
+    """(n_mels, frames) log-mel spectrogram of the unpadded clip -> 32-byte fingerprint"""
+    mel = np.asarray(log_mel, dtype=np.float32)
+    floor = mel.max() - _FLOOR
+    mel = np.maximum(mel, floor) - floor
+    if mel.shape[1] < _GRID:
+        # Shorter than the grid: repeat frames so every slice can have one
+        mel = np.repeat(mel, -(-_GRID // mel.shape[1]), axis=1)
+
+    energy = np.cumsum(mel.sum(axis=0))
+    edges = np.searchsorted(energy, energy[-1] * np.arange(1, _GRID) / _GRID) if energy[-1] > 0 else None
+    slices = np.array_split(mel, _GRID, axis=1) if edges is None else np.split(mel, edges, axis=1)
+    columns = np.stack([
+        part.mean(axis=1) if part.shape[1] else np.zeros(mel.shape[0], np.float32) for part in slices
+    ], axis=1)
+    grid = np.stack([band.mean(axis=0) for band in np.array_split(columns, _GRID, axis=0)])
+    band_diff = grid[1:] - grid[:-1]
+    bits = (band_diff[:, 1:] - band_diff[:, :-1]) > 0
+    return np.packbits(bits.ravel()).tobytes()
+
+
+_POPCOUNT = None
+
+
+def hamming(fingerprints, query):
+    """Bit distances between rows of a (n, 32) uint8 array and one fingerprint"""
+    global _POPCOUNT
+    if _POPCOUNT is None:
+        _POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+    return _POPCOUNT[np.bitwise_xor(fingerprints, np.frombuffer(query, np.uint8))].sum(axis=-1)
+
+
+class FingerprintIndex:
+    """Fingerprints numbered 0, 1, 2... in the order they were added"""
+
+    def __init__(self):
+        self._fingerprints = np.zeros((0, FINGERPRINT_BYTES), np.uint8)
+        self._count = 0
+        # Per key: fingerprint numbers ordered by that key, and the keys in that order.
+        # Fingerprints added since the last sort (the tail) are scanned directly.
+        self._sorted = 0
+        self._order = [np.zeros(0, np.uint32) for _ in range(_TABLES)]
+        self._sorted_keys = [np.zeros(0, np.uint16) for _ in range(_TABLES)]
+
+    def __len__(self):
+        return self._count
+
+    def _keys(self, start=0, stop=None):
+        # Key t of every fingerprint is its t-th big-endian 16-bit word: a view, not a copy
+        return self._fingerprints[start:self._count if stop is None else stop].view(">u2")
+
+    def add(self, fingerprint_bytes):
+        """Store a fingerprint; returns its number"""
+        number = self._count
+        if number == len(self._fingerprints):
+            # Grow by half, like a list, so adding stays amortized O(1)
+            grown = np.zeros((max(16, number + number // 2), FINGERPRINT_BYTES), np.uint8)
+            grown[:number] = self._fingerprints[:number]
+            self._fingerprints = grown
+        self._fingerprints[number] = np.frombuffer(fingerprint_bytes, np.uint8)
+        self._count += 1
+        if self._count - self._sorted > max(1024, self._sorted // 8):
+            self._sort()
+        return number
+
+    def _sort(self):
+        keys = self._keys()
+        for table in range(_TABLES):
+            # Stable sort of 16-bit keys is a radix sort in NumPy: linear in the count
+            order = np.argsort(keys[:, table], kind="stable").astype(np.uint32)
+            self._order[table] = order
+            self._sorted_keys[table] = keys[order, table].astype(np.uint16)
+        self._sorted = self._count
+
+    def candidates(self, fingerprint_bytes):
+        """Numbers of every stored fingerprint that could be within 31 bits"""
+        query_keys = np.frombuffer(fingerprint_bytes, ">u2").astype(np.uint16)
+        flips = np.left_shift(1, np.arange(_KEY_BITS)).astype(np.uint16)
+        found = []
+        for table, key in enumerate(query_keys):
+            probes = np.concatenate([[key], key ^ flips])
+            sorted_keys = self._sorted_keys[table]
+            starts = np.searchsorted(sorted_keys, probes, side="left")
+            ends = np.searchsorted(sorted_keys, probes, side="right")
+            found.extend(self._order[table][start:end] for start, end in zip(starts, ends) if end > start)
+        # The unsorted tail: a key matches when it differs from the query's in at most one bit
+        diff = self._keys(self._sorted).astype(np.uint16) ^ query_keys
+        near = ((diff & (diff - np.uint16(1))) == 0).any(axis=1)
+        found.append(np.flatnonzero(near) + self._sorted)
+        return np.unique(np.concatenate(found))
+
+    def query(self, fingerprint_bytes, max_distance=None):
+        """[(number, distance)] within max_distance bits, nearest first"""
+        max_distance = DEDUP_MAX_DISTANCE if max_distance is None else max_distance
+        if max_distance >= 2 * _KEY_BITS:
+            # Beyond what the probes guarantee: check everything
+            numbers = np.arange(self._count)
+        else:
+            numbers = self.candidates(fingerprint_bytes).astype(np.int64)
+        if not len(numbers):
+            return []
+        distances = hamming(self._fingerprints[numbers], fingerprint_bytes)
+        close = np.flatnonzero(distances <= max_distance)
+        order = close[np.argsort(distances[close], kind="stable")]
+        return [(int(numbers[i]), int(distances[i])) for i in order]
@@ -0,0 +1,152 @@
+"""
+Shared audio decoding for the engines: every recognize_speech accepts a file
+path, the encoded bytes of an upload, or a NumPy PCM buffer.
+
+PCM WAV (what the browser recorder sends) is parsed and, if needed,
+resampled in memory. Other containers (webm/opus, ogg, mp3) are decoded by an
+ffmpeg process that reads stdin and writes raw PCM to stdout, so no
+intermediate files are written.
+"""
+import io
+import math
+import os
+import subprocess
+import sys
+import wave
+
+from lazy_imports import lazy_module
+
+np = lazy_module("numpy")
+scipy_signal = lazy_module("scipy.signal")
+
+SAMPLE_RATE = 16000
+# Command-line audio argument meaning "read the audio bytes from stdin"
+STDIN_AUDIO = "-"
+
+
+def read_audio_arg(arg):
+    """CLI audio argument -> path, or the bytes piped in on stdin for "-" """
+    return sys.stdin.buffer.read() if arg == STDIN_AUDIO else arg
+
+
+def is_path(audio):
+    return isinstance(audio, (str, os.PathLike))
+
+
+def check_audio(audio):
+    """Fail fast, before any model is loaded, on a path that doesn't exist"""
+    if is_path(audio) and not os.path.isfile(audio):
+        raise FileNotFoundError(f"Audio file not found: {audio}")
+    if isinstance(audio, (bytes, bytearray, memoryview)) and len(audio) == 0:
+        raise ValueError("Audio is empty")
+
+
+def describe(audio):
+    """Short description for log lines"""
+    if is_path(audio):
+        return str(audio)
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        return f"<{len(audio)} bytes>"
+    return f"<{len(audio)} samples>"
+
+
+def _pcm_to_float(frames, sample_width):
+    if sample_width == 1:
+        return (np.frombuffer(frames, np.uint8).astype(np.float32) - 128) / 128
+    if sample_width == 2:
+        return np.frombuffer(frames, np.int16).astype(np.float32) / 32768
+    if sample_width == 3:
+        raw = np.frombuffer(frames, np.uint8).reshape(-1, 3)
+        samples = raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8) | (raw[:, 2].astype(np.int32) << 16)
+        return (np.where(samples >= 1 << 23, samples - (1 << 24), samples)).astype(np.float32) / (1 << 23)
+    if sample_width == 4:
+        return np.frombuffer(frames, np.int32).astype(np.float32) / (1 << 31)
+    raise ValueError(f"Unsupported WAV sample width: {sample_width}")
+
+
+def resample(audio, orig_sr, sr):
+    """Polyphase resampling between integer rates (e.g. 44.1/48/8 kHz -> 16 kHz)"""
+    if orig_sr == sr:
+        return audio
+    g = math.gcd(orig_sr, sr)
+    return scipy_signal.resample_poly(audio, sr // g, orig_sr // g).astype(np.float32)
+
+
+def _is_wav(data):
+    return data[:4] == b"RIFF" and data[8:12] == b"WAVE"
+
+
+def wav_sample_rate(audio):
+    """Sample rate of PCM WAV audio (path or bytes), or None for anything else"""
+    try:
+        if is_path(audio):
+            with wave.open(os.fspath(audio), "rb") as wf:
+                return wf.getframerate()
+        if isinstance(audio, (bytes, bytearray, memoryview)) and _is_wav(bytes(audio[:12])):
+            with wave.open(io.BytesIO(audio), "rb") as wf:
+                return wf.getframerate()
+    except (wave.Error, EOFError, OSError):
+        pass
+    return None
+
+
+def _parse_wav(data, sr):
+    """Decode in-memory PCM WAV to `sr`; None if ffmpeg has to handle it"""
+    if not _is_wav(data):
+        return None
+    try:
+        with wave.open(io.BytesIO(data), "rb") as wf:
+            rate = wf.getframerate()
+            channels = wf.getnchannels()
+            audio = _pcm_to_float(wf.readframes(wf.getnframes()), wf.getsampwidth())
+    except (wave.Error, ValueError, EOFError):
+        # e.g. IEEE float or WAVE_FORMAT_EXTENSIBLE
+        return None
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    return resample(audio, rate, sr)
+
+
+def _ffmpeg(source, sr, data=None):
+    """Decode any format ffmpeg reads to mono float32 PCM at `sr`"""
+    cmd = [
+        "ffmpeg", "-threads", "0", "-i", source,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sr), "pipe:1",
+    ]
+    if data is None:
+        cmd.insert(1, "-nostdin")
+    try:
+        out = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg is required to decode this audio format") from None
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to decode audio: {e.stderr.decode(errors='replace').strip()[-300:]}") from None
+    return np.frombuffer(out, np.int16).astype(np.float32) / 32768
+
+
+def load_audio(audio, sr=SAMPLE_RATE):
+    """Path, encoded bytes or PCM array -> mono float32 NumPy array at `sr`"""
+    check_audio(audio)
+    if is_path(audio):
+        with open(audio, "rb") as f:
+            parsed = _parse_wav(f.read(), sr)
+        return parsed if parsed is not None else _ffmpeg(os.fspath(audio), sr)
+
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        data = bytes(audio)
+        parsed = _parse_wav(data, sr)
+        return parsed if parsed is not None else _ffmpeg("pipe:0", sr, data)
+
+    # Already decoded: assumed to be at `sr`, shaped (samples,) or (samples, channels)
+    audio = np.asarray(audio)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    if audio.dtype == np.int16:
+        return audio.astype(np.float32) / 32768
+    return audio.astype(np.float32, copy=False)
+
+
+def to_pcm16(audio):
+    """Float PCM in [-1, 1] -> 16-bit little-endian bytes (Vosk, speech_recognition)"""
+    # Inverse of the /32768 scaling above, so 16-bit input round-trips exactly
+    return np.clip(np.asarray(audio) * 32768, -32768, 32767).astype("<i2").tobytes()
@@ -0,0 +1,159 @@
+"""
+Packed, sharded audio datasets.
+
+The training and evaluation sets are thousands of short WAV files, each with
+a JSON metadata file. A pass over them spends most of its time on stat/open/
+close, not on audio. pack() writes the clips into a few large shards instead:
+
+    <dataset>/manifest.json          format, sample rate, shard list
+    <dataset>/shard-00000.pcm        clips back to back: 16 kHz mono int16 PCM
+    <dataset>/shard-00000.json       index: [{id, offset, samples, text, metadata}]
+
+A shard is closed once it reaches shard_bytes. Readers memory-map each shard
+and take every clip as a NumPy view of the mapping, so a clip costs no open()
+or read() and nothing is copied until the audio is used. Clips come back in
+the order they were packed, which is also the order they sit on disk.
+
+The clips are stored as raw PCM, not FLAC: the readers need no codec and the
+views can be handed straight to the decoders. Use audio_input.load_audio(pcm)
+for float samples, or pcm.tobytes() for engines that take 16-bit bytes.
+"""
+import json
+import logging
+import os
+from pathlib import Path
+
+from audio_input import SAMPLE_RATE, load_audio, to_pcm16
+from lazy_imports import lazy_module
+
+np = lazy_module("numpy")
+
+logger = logging.getLogger(__name__)
+
+FORMAT = "voicesearch-pcm16-shards/1"
+MANIFEST_NAME = "manifest.json"
+DEFAULT_SHARD_BYTES = 256 * 1024 * 1024
+
+
+def is_dataset(path):
+    return os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+
+def _shard_paths(dataset_dir, index):
+    stem = os.path.join(dataset_dir, f"shard-{index:05d}")
+    return f"{stem}.pcm", f"{stem}.json"
+
+
+class _ShardWriter:
+    def __init__(self, dataset_dir, shard_bytes):
+        self.dataset_dir = dataset_dir
+        self.shard_bytes = shard_bytes
+        self.shards = []
+        self._pcm = None
+        self._entries = []
+        self._offset = 0
+
+    def _close_shard(self):
+        if self._pcm is None:
+            return
+        self._pcm.close()
+        _, index_path = _shard_paths(self.dataset_dir, len(self.shards))
+        with open(index_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False)
+        self.shards.append({"clips": len(self._entries), "bytes": self._offset})
+        self._pcm, self._entries, self._offset = None, [], 0
+
+    def add(self, clip_id, pcm_bytes, text, metadata):
+        if self._pcm is not None and self._offset + len(pcm_bytes) > self.shard_bytes:
+            self._close_shard()
+        if self._pcm is None:
+            pcm_path, _ = _shard_paths(self.dataset_dir, len(self.shards))
+            self._pcm = open(pcm_path, "wb")
+        self._pcm.write(pcm_bytes)
+        self._entries.append({
+            "id": clip_id,
+            "offset": self._offset,
+            "samples": len(pcm_bytes) // 2,
+            "text": text,
+            "metadata": metadata,
+        })
+        self._offset += len(pcm_bytes)
+
+    def close(self):
+        self._close_shard()
+        manifest = {"format": FORMAT, "sampleRate": SAMPLE_RATE, "shards": self.shards}
+        with open(os.path.join(self.dataset_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+
+def read_metadata(metadata_dir, clip_id):
+    """Metadata saved by the training UI for a clip (metadata/<stem>.json), or {}"""
+    if metadata_dir is None:
+        return {}
+    path = Path(metadata_dir) / f"{clip_id}.json"
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def pack(wav_dir, dataset_dir, metadata_dir=None, shard_bytes=DEFAULT_SHARD_BYTES):
+    """
+    Pack every *.wav in `wav_dir` (sorted by name) into a dataset. Each clip's
+    text is the actualText of metadata_dir/<stem>.json when there is one.
+    Audio is converted to 16 kHz mono on the way in. Returns the manifest.
+    """
+    os.makedirs(dataset_dir, exist_ok=True)
+    writer = _ShardWriter(dataset_dir, shard_bytes)
+    for wav_path in sorted(Path(wav_dir).glob("*.wav")):
+        try:
+            pcm = to_pcm16(load_audio(str(wav_path)))
+        except Exception as e:
+            logger.warning(f"Skipping {wav_path}: {e}")
+            continue
+        metadata = read_metadata(metadata_dir, wav_path.stem)
+        writer.add(wav_path.stem, pcm, metadata.get("actualText"), metadata)
+    return writer.close()
+
+
+class ShardedDataset:
+    """Memory-mapped reader: iterate for (id, pcm int16 view, text) in packed order"""
+
+    def __init__(self, dataset_dir):
+        self.dataset_dir = os.fspath(dataset_dir)
+        with open(os.path.join(self.dataset_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT:
+            raise ValueError(f"Unsupported dataset format: {self.manifest.get('format')}")
+        self.sample_rate = self.manifest["sampleRate"]
+        self._maps = {}
+
+    def __len__(self):
+        return sum(shard["clips"] for shard in self.manifest["shards"])
+
+    def _map(self, index):
+        if index not in self._maps:
+            pcm_path, _ = _shard_paths(self.dataset_dir, index)
+            # An empty file can't be mapped; a shard is never empty, but be safe
+            self._maps[index] = (
+                np.memmap(pcm_path, dtype="<i2", mode="r") if os.path.getsize(pcm_path) else np.zeros(0, "<i2")
+            )
+        return self._maps[index]
+
+    def index(self, shard):
+        _, index_path = _shard_paths(self.dataset_dir, shard)
+        with open(index_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def records(self):
+        """(id, pcm, text, metadata) for every clip"""
+        for shard in range(len(self.manifest["shards"])):
+            samples = self._map(shard)
+            for entry in self.index(shard):
+                start = entry["offset"] // 2
+                yield entry["id"], samples[start:start + entry["samples"]], entry["text"], entry["metadata"]
+
+    def __iter__(self):
+        for clip_id, pcm, text, _ in self.records():
+            yield clip_id, pcm, text
@@ -0,0 +1,83 @@
+import json
+import sys
+import time
+
+from audio_input import load_audio, read_audio_arg
+from confidence import is_confident
+from engines import recognize
+from profiling import profiled
+from thread_budget import apply_thread_budget
+from timings import pop_timestamps_flag
+
+# Fastest engine first; each later tier only runs when the one before it
+# wasn't confident (see confidence.is_confident).
+TIERS = {
+    "en": [("vosk", {}), ("whisper", {"language": "en"})],
+    "si": [("whisper-sinhala", {}), ("whisper", {"language": "si"})],
+    "ta": [("whisper-tamil", {}), ("whisper", {"language": "ta"})],
+}
+
+
+@profiled
+def recognize_speech(audio, language="en", thresholds=None, timestamps=False):
+    """
+    Answer from the cheapest tier that is confident, escalating otherwise.
+    The result is the answering tier's, plus `tier`/`tierEngine` and a
+    `cascade` list with the latency and confidence of every tier tried.
+    """
+    start_time = time.time()
+    if language not in TIERS:
+        return {
+            "text": "",
+            "romanized": "",
+            "error": f"No cascade configured for language: {language}",
+            "processingTime": 0,
+        }
+
+    try:
+        # Decoded once and handed to every tier tried
+        audio = load_audio(audio)
+    except Exception as e:
+        return {
+            "text": "",
+            "romanized": "",
+            "error": f"{type(e).__name__}: {str(e)}",
+            "processingTime": int((time.time() - start_time) * 1000),
+        }
+
+    tiers = TIERS[language]
+    attempts = []
+    for tier, (engine, options) in enumerate(tiers):
+        result = recognize(engine, audio, timestamps=timestamps, **options)
+        accepted = tier == len(tiers) - 1 or is_confident(result, thresholds)
+        attempts.append({
+            "engine": engine,
+            "processingTime": result.get("processingTime"),
+            "confidence": result.get("confidence"),
+            "error": result.get("error"),
+            "accepted": accepted,
+        })
+        if accepted:
+            break
+
+    result.setdefault("romanized", result.get("text", ""))
+    result["tier"] = tier
+    result["tierEngine"] = engine
+    result["cascade"] = attempts
+    result["processingTime"] = int((time.time() - start_time) * 1000)
+    return result
+
+
+if __name__ == "__main__":
+    apply_thread_budget()
+
+    argv, timestamps = pop_timestamps_flag(sys.argv)
+    if len(argv) not in (2, 3):
+        result = {
+            "text": "",
+            "error": "Invalid arguments. Usage: python cascade.py <audio_file_path|-> [language] [--timestamps]",
+            "processingTime": 0
+        }
+    else:
+        result = recognize_speech(read_audio_arg(argv[1]), argv[2] if len(argv) > 2 else "en", timestamps=timestamps)
+    print(json.dumps(result, ensure_ascii=False))
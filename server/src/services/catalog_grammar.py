@@ -0,0 +1,148 @@
+"""
+Vosk grammar built from the search catalog (search_content).
+
+Voice queries are song titles and artists. Instead of decoding against the
+model's whole language model, a recognizer can be limited to those phrases,
+plus "[unk]" for anything else. The search space is much smaller, and the
+text that comes back is a catalog phrase that maps straight to its rows.
+
+A grammar is kept per model and identified by a version: a hash of its
+phrases. refresh() is cheap while the database file is unchanged (same size
+and mtime). When it has changed, the rows are re-read and only rows whose
+title or artist changed are normalized and checked against the model's
+vocabulary again.
+
+Only models with a dynamic graph (the vosk-model-small-* family) honour a
+grammar; larger models decode with their full graph regardless.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+SEARCH_DB_PATH = os.getenv(
+    'SEARCH_DB_PATH', os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'search.db')
+)
+UNKNOWN = "[unk]"
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def catalog_stamp(db_path=None):
+    """Changes whenever the catalog database is written (size and mtime)"""
+    db_path = db_path or SEARCH_DB_PATH
+    stat = os.stat(db_path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    # A database in WAL mode takes its latest writes in the -wal file
+    wal_path = f"{db_path}-wal"
+    if os.path.exists(wal_path):
+        wal = os.stat(wal_path)
+        stamp += (wal.st_size, wal.st_mtime_ns)
+    return stamp
+
+
+def read_catalog(db_path=None):
+    """[(id, title, artist)] from search_content"""
+    # Read-only, so it never takes a write lock from the Node server
+    uri = f"file:{os.path.abspath(db_path or SEARCH_DB_PATH)}?mode=ro"
+    with sqlite3.connect(uri, uri=True) as db:
+        return db.execute("SELECT id, title, artist FROM search_content").fetchall()
+
+
+def normalize(text):
+    """Lowercase words as Vosk emits them: "Billie Jean!" -> "billie jean" """
+    return " ".join(_WORD.findall((text or "").lower().replace("&", " and ")))
+
+
+def row_phrases(title, artist):
+    """What a user might say for a catalog row"""
+    title, artist = normalize(title), normalize(artist)
+    phrases = [title, artist]
+    if title and artist:
+        phrases += [f"{title} {artist}", f"{title} by {artist}", f"{artist} {title}"]
+    return [phrase for phrase in phrases if phrase]
+
+
+class CatalogGrammar:
+    """The catalog's phrases as a grammar for one Vosk model"""
+
+    def __init__(self, model, db_path=SEARCH_DB_PATH):
+        self.model = model
+        self.db_path = db_path
+        # (version, grammar JSON), replaced as a unit so readers never mix them
+        self.current = (None, None)
+        self._stamp = None
+        # row id -> ((title, artist), phrases the model can say)
+        self._rows = {}
+        self._phrase_rows = {}
+        self._vocabulary = {}
+        self._lock = threading.Lock()
+
+    def _in_vocabulary(self, phrase):
+        for word in phrase.split():
+            if word not in self._vocabulary:
+                self._vocabulary[word] = self.model.vosk_model_find_word(word) != -1
+            if not self._vocabulary[word]:
+                return False
+        return True
+
+    def refresh(self):
+        """Bring the grammar up to date with the catalog; returns self"""
+        stamp = catalog_stamp(self.db_path)
+        with self._lock:
+            if stamp == self._stamp:
+                return self
+
+            rows = {}
+            changed = 0
+            for row_id, title, artist in read_catalog(self.db_path):
+                cached = self._rows.get(row_id)
+                if cached is not None and cached[0] == (title, artist):
+                    rows[row_id] = cached
+                    continue
+                changed += 1
+                phrases = [phrase for phrase in row_phrases(title, artist) if self._in_vocabulary(phrase)]
+                rows[row_id] = ((title, artist), phrases)
+
+            phrase_rows = {}
+            for row_id, (_, phrases) in rows.items():
+                for phrase in phrases:
+                    phrase_rows.setdefault(phrase, []).append(row_id)
+
+            grammar = json.dumps(sorted(phrase_rows) + [UNKNOWN], ensure_ascii=False)
+            version = hashlib.sha1(grammar.encode("utf-8")).hexdigest()[:12]
+            if version != self.current[0]:
+                logger.debug(
+                    f"Catalog grammar {version}: {len(phrase_rows)} phrases from {len(rows)} rows "
+                    f"({changed} re-read, {sum(1 for _, p in rows.values() if not p)} without in-vocabulary phrases)"
+                )
+            self._rows, self._phrase_rows = rows, phrase_rows
+            self.current, self._stamp = (version, grammar), stamp
+            return self
+
+    @property
+    def version(self):
+        return self.current[0]
+
+    def matches(self, text):
+        """Catalog row ids whose title/artist phrases equal the recognized text"""
+        return list(self._phrase_rows.get(normalize(text), []))
+
+
+_grammars = {}
+_grammars_lock = threading.Lock()
+
+
+def catalog_grammar(model_path, model, db_path=None):
+    """The resident, refreshed catalog grammar for a loaded model"""
+    db_path = db_path or SEARCH_DB_PATH
+    key = (model_path, db_path)
+    with _grammars_lock:
+        if key not in _grammars:
+            _grammars[key] = CatalogGrammar(model, db_path)
+        grammar = _grammars[key]
+    return grammar.refresh()
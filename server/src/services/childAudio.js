@@ -0,0 +1,18 @@
+// In-memory uploads go to the Python scripts on stdin (their audio argument
+// is '-'). A child that exits before reading it (rejected arguments, an
+// import error) makes the write fail with EPIPE. Without a listener Node
+// throws that error and the whole server goes down; the child's 'close'
+// handler already reports the failed request, so it is only logged here.
+function pipeAudio(child, audio) {
+    if (!Buffer.isBuffer(audio)) {
+        return;
+    }
+    child.stdin.on('error', (error) => {
+        console.error('Could not send audio to the Python process:', error.message);
+    });
+    child.stdin.end(audio);
+}
+
+module.exports = {
+    pipeAudio
+};
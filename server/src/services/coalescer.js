@@ -0,0 +1,88 @@
+const crypto = require('crypto');
+const fs = require('fs').promises;
+const metrics = require('./metrics');
+
+// Single-flight for recognition requests. Clients double-submit and the
+// training UI replays clips, so the same audio often reaches the same engine
+// with the same options while the first run is still going. Requests are
+// keyed by a hash of the audio bytes, the engine and its options:
+// - a duplicate of a request in progress waits for that run's result;
+// - a duplicate arriving within COALESCE_TTL_MS of a successful run gets
+//   the finished result.
+// Failed runs are not kept. COALESCE_TTL_MS=0 keeps only the in-flight part.
+const TTL_MS = parseInt(process.env.COALESCE_TTL_MS || '10000', 10);
+const MAX_ENTRIES = parseInt(process.env.COALESCE_MAX_ENTRIES || '256', 10);
+
+const inFlight = new Map();
+const recent = new Map();
+
+// `audio` is a Buffer or a file path; a path is hashed by its contents
+async function requestKey(engine, audio, options) {
+    const bytes = Buffer.isBuffer(audio) ? audio : await fs.readFile(audio);
+    const sortedOptions = Object.keys(options || {}).sort().map(name => [name, options[name]]);
+    return crypto.createHash('sha256')
+        .update(JSON.stringify([engine, sortedOptions]))
+        .update('\u0000')
+        .update(bytes)
+        .digest('hex');
+}
+
+function remember(key, result) {
+    if (TTL_MS <= 0) {
+        return;
+    }
+    const now = Date.now();
+    recent.forEach((entry, entryKey) => {
+        if (entry.expires <= now) {
+            recent.delete(entryKey);
+        }
+    });
+    recent.set(key, { result, expires: now + TTL_MS });
+    // Maps iterate in insertion order, so the first key is the oldest
+    while (recent.size > MAX_ENTRIES) {
+        recent.delete(recent.keys().next().value);
+    }
+}
+
+// Each caller gets its own copy (routes may add fields before responding)
+function copyOf(result, coalesced) {
+    return { ...result, coalesced };
+}
+
+// Run `compute()` unless an identical request is running or just finished
+async function coalesce(engine, audio, options, compute) {
+    const key = await requestKey(engine, audio, options);
+
+    const cached = recent.get(key);
+    if (cached && cached.expires > Date.now()) {
+        metrics.increment('coalesce_cached', engine);
+        return copyOf(cached.result, 'cached');
+    }
+    if (inFlight.has(key)) {
+        metrics.increment('coalesce_joined', engine);
+        return copyOf(await inFlight.get(key), 'joined');
+    }
+
+    metrics.increment('coalesce_computed', engine);
+    const run = compute()
+        .then(result => {
+            if (result && !result.error) {
+                // Kept apart from the object handed to the first caller
+                remember(key, { ...result });
+            }
+            return result;
+        })
+        .finally(() => inFlight.delete(key));
+    inFlight.set(key, run);
+    return run;
+}
+
+function snapshot() {
+    return { inFlight: inFlight.size, cached: recent.size, ttlMs: TTL_MS };
+}
+
+module.exports = {
+    coalesce,
+    requestKey,
+    snapshot
+};
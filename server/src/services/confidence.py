@@ -0,0 +1,63 @@
+import math
+import os
+
+# Whisper's own fallback thresholds (transcribe's logprob_threshold and
+# no_speech_threshold) are the defaults; Vosk words below 0.7 are usually wrong.
+DEFAULT_THRESHOLDS = {
+    "min_avg_logprob": float(os.getenv("CASCADE_MIN_AVG_LOGPROB", "-1.0")),
+    "max_no_speech_prob": float(os.getenv("CASCADE_MAX_NO_SPEECH_PROB", "0.6")),
+    "min_word_confidence": float(os.getenv("CASCADE_MIN_WORD_CONFIDENCE", "0.7")),
+}
+
+
+def _round(value):
+    return None if value is None else round(float(value), 4)
+
+
+def whisper_confidence(transcription):
+    """avgLogprob (token-weighted over segments) and noSpeechProb of a whisper transcribe() result"""
+    segments = transcription.get("segments") or []
+    if not segments:
+        return {"avgLogprob": None, "noSpeechProb": None}
+    tokens = [max(len(s.get("tokens") or ()), 1) for s in segments]
+    avg_logprob = sum(s["avg_logprob"] * n for s, n in zip(segments, tokens)) / sum(tokens)
+    no_speech_prob = sum(s["no_speech_prob"] for s in segments) / len(segments)
+    return {"avgLogprob": _round(avg_logprob), "noSpeechProb": _round(no_speech_prob)}
+
+
+def hf_confidence(model, outputs):
+    """avgLogprob of the tokens produced by a Hugging Face generate(..., output_scores=True)"""
+    scores = model.compute_transition_scores(outputs["sequences"], outputs["scores"], normalize_logits=True)
+    finite = [s for s in scores[0].tolist() if math.isfinite(s)]
+    return {"avgLogprob": _round(sum(finite) / len(finite)) if finite else None}
+
+
+def vosk_confidence(result):
+    """Mean word confidence of a Vosk result decoded with SetWords(True)"""
+    words = result.get("result") or []
+    if not words:
+        return {"wordConfidence": None}
+    return {"wordConfidence": _round(sum(w["conf"] for w in words) / len(words))}
+
+
+def is_confident(result, thresholds=None):
+    """
+    Whether a result is good enough to return without asking a larger model.
+    Errors and empty transcripts never are; missing signals are not held
+    against the result.
+    """
+    thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    if result.get("error") or not (result.get("text") or "").strip():
+        return False
+
+    confidence = result.get("confidence") or {}
+    avg_logprob = confidence.get("avgLogprob")
+    no_speech_prob = confidence.get("noSpeechProb")
+    word_confidence = confidence.get("wordConfidence")
+    if avg_logprob is not None and avg_logprob < thresholds["min_avg_logprob"]:
+        return False
+    if no_speech_prob is not None and no_speech_prob > thresholds["max_no_speech_prob"]:
+        return False
+    if word_confidence is not None and word_confidence < thresholds["min_word_confidence"]:
+        return False
+    return True
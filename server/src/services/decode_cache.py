@@ -0,0 +1,207 @@
+"""
+Request-scoped reuse of Whisper encoder output and prompt prefills.
+
+A Sinhala/Tamil request decodes the same audio twice (native text, then the
+romanization pass with its long initial prompt), and transcribe() re-runs
+decode() at higher temperatures whenever a result looks unreliable. Each of
+those decode() calls used to re-encode the audio and push the whole prompt
+through the decoder again. Here the encoder output is computed once per mel
+segment, and the decoder's self-attention KV cache after the initial tokens
+(prompt + start-of-transcript sequence) is kept and restored for any later
+decode of the same prompt on the same audio.
+
+The prompt's decoder state can't be shared across requests: from the first
+cross-attention layer on, every prompt position depends on the audio.
+
+With WHISPER_ENCODER_CONTEXT=audio the encoder runs over the clip's length
+rather than 30 s (see encoder_context.py).
+"""
+import functools
+import hashlib
+from collections import OrderedDict
+from dataclasses import replace
+
+from encoder_context import audio_context_enabled, context_frames, short_encoder
+from hotwords import whisper_filter
+from lazy_imports import lazy_module
+
+torch = lazy_module("torch")
+whisper = lazy_module("whisper")
+
+
+class DecodeCache:
+    """Small LRU of encoder outputs and prompt prefills for one request"""
+
+    def __init__(self, max_entries=4, encoder_frames=None):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Mel frames the encoder sees; None for the full 30 s
+        self.encoder_frames = encoder_frames
+
+    @staticmethod
+    def mel_key(mel):
+        return hashlib.sha1(mel.detach().cpu().numpy().tobytes()).hexdigest()
+
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return value
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        return value if value is not None else self.put(key, compute())
+
+    def features(self, model, mel, mel_key):
+        """Encoder output for `mel`, computed once per request"""
+        frames = self.encoder_frames
+        if frames is None:
+            encode = lambda: model.encoder(mel)
+        else:
+            encode = lambda: short_encoder(model.encoder)(mel, frames)
+        return self.get_or_compute(("features", id(model), mel_key, frames), encode)
+
+
+@functools.lru_cache(maxsize=None)
+def cached_task_class():
+    """DecodingTask that reads/writes a DecodeCache (whisper is imported lazily)"""
+    from whisper.decoding import DecodingTask
+
+    class CachedDecodingTask(DecodingTask):
+        def __init__(self, model, options, cache, hotwords=None):
+            super().__init__(model, options)
+            self.cache = cache
+            self.mel_key = None
+            if hotwords is not None:
+                # Catalog names biased at every step, after whisper's own filters
+                self.logit_filters.append(whisper_filter(hotwords, self.sample_begin))
+
+        def _is_features(self, mel):
+            return mel.shape[-2:] == (self.model.dims.n_audio_ctx, self.model.dims.n_audio_state)
+
+        def _encode(self, model, mel):
+            return self.cache.features(model, mel, self.mel_key)
+
+        def _get_audio_features(self, mel):
+            if self.options.fp16 or self._is_features(mel):
+                return super()._get_audio_features(mel)
+            self.mel_key = self.cache.mel_key(mel)
+            return self._encode(self.model, mel)
+
+        def _prefill(self, tokens, audio_features):
+            """
+            Logits at the start-of-transcript token and at the last initial
+            token, leaving the initial tokens in the inference KV cache.
+            """
+            inference = self.inference
+            key = ("prefix", id(self.model), self.mel_key, self.initial_tokens)
+            cached = self.cache.get(key) if self.mel_key else None
+            if cached is None:
+                # Every row starts from the same initial tokens; run one
+                logits = inference.logits(tokens[:1], audio_features)
+                snapshot = {module: inference.kv_cache[module] for module in inference.kv_modules}
+                cached = (snapshot, logits[:, self.sot_index], logits[:, -1])
+                if self.mel_key:
+                    self.cache.put(key, cached)
+            else:
+                # Cross-attention entries are left out and recomputed on the next step
+                inference.kv_cache, inference.hooks = self.model.install_kv_cache_hooks(cached[0])
+
+            snapshot, sot_logits, last_logits = cached
+            n_batch = tokens.shape[0]
+            if n_batch > 1:
+                for module in inference.kv_modules:
+                    inference.kv_cache[module] = snapshot[module].repeat_interleave(n_batch, dim=0)
+            return sot_logits.expand(n_batch, -1), last_logits.expand(n_batch, -1).clone()
+
+        def _main_loop(self, audio_features, tokens):
+            # DecodingTask._main_loop with the first step served by _prefill
+            n_batch = tokens.shape[0]
+            sum_logprobs = torch.zeros(n_batch, device=audio_features.device)
+            no_speech_probs = [float("nan")] * n_batch
+
+            try:
+                for i in range(self.sample_len):
+                    if i == 0:
+                        sot_logits, logits = self._prefill(tokens, audio_features)
+                        if self.tokenizer.no_speech is not None:
+                            probs_at_sot = sot_logits.float().softmax(dim=-1)
+                            no_speech_probs = probs_at_sot[:, self.tokenizer.no_speech].tolist()
+                    else:
+                        logits = self.inference.logits(tokens, audio_features)[:, -1]
+
+                    for logit_filter in self.logit_filters:
+                        logit_filter.apply(logits, tokens)
+
+                    tokens, completed = self.decoder.update(tokens, logits, sum_logprobs)
+                    if completed or tokens.shape[-1] > self.n_ctx:
+                        break
+            finally:
+                self.inference.cleanup_caching()
+
+            return tokens, sum_logprobs, no_speech_probs
+
+    return CachedDecodingTask
+
+
+class CachingWhisper:
+    """
+    Stands in for a Whisper model in transcribe() for the length of one
+    request, sharing encoder output and prompt prefills between its decodes.
+    """
+
+    def __init__(self, model, cache=None):
+        self.model = model
+        self.cache = cache if cache is not None else DecodeCache()
+        # HotwordTrie for the transcribe() in progress, if it biases toward the catalog
+        self.hotwords = None
+        if audio_context_enabled():
+            # What the services time as the encoder stage
+            self.encoder = short_encoder(model.encoder)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def _task(self, mel, options):
+        return cached_task_class()(self.model, options, self.cache, self.hotwords)
+
+    def decode(self, mel, options=None, **kwargs):
+        options = replace(options or whisper.DecodingOptions(), **kwargs)
+        batched = mel.ndim == 3 and mel.shape[0] > 1
+        if batched or options.beam_size is not None or options.task == "lang_id":
+            return self.model.decode(mel, options)
+
+        single = mel.ndim == 2
+        if single:
+            mel = mel.unsqueeze(0)
+        with torch.no_grad():
+            result = self._task(mel, options).run(mel)
+        return result[0] if single else result
+
+    def __call__(self, mel, tokens):
+        """
+        Whisper.forward, used by word-timestamp alignment: one decoder pass
+        over the final tokens against the already cached encoder output.
+        """
+        audio_features = self.cache.features(self.model, mel, self.cache.mel_key(mel))
+        return self.model.decoder(tokens, audio_features)
+
+    def transcribe(self, audio, hotwords=None, **kwargs):
+        if audio_context_enabled() and not isinstance(audio, str):
+            # Later segments of a long clip hold less audio, never more
+            self.cache.encoder_frames = context_frames(audio.shape[-1])
+        self.hotwords = hotwords
+        try:
+            return whisper.transcribe(self, audio, **kwargs)
+        finally:
+            self.hotwords = None
@@ -0,0 +1,107 @@
+"""
+Run the Whisper encoder over the length of the clip instead of 30 seconds.
+
+Every Whisper path pads its input to 30 s (3000 mel frames, 1500 encoder
+positions), so a 2 s search query pays for a full-length encoder pass. The
+encoder works position by position apart from its positional embedding, so
+it can take a shorter mel once that embedding is sliced to the same length.
+The decoder cross-attends to however many positions it is given. This is the
+same idea as whisper.cpp's audio_ctx.
+
+The models only saw padded input in training, so the clip isn't cut at its
+last sample. The context keeps WHISPER_ENCODER_PAD_SECONDS of padding after
+the audio and is rounded up to whole seconds. Check the output against the
+padded encoder with `benchmark.py encoder-context` before enabling it.
+
+Configuration (environment):
+    WHISPER_ENCODER_CONTEXT      "full" (default) or "audio"
+    WHISPER_ENCODER_PAD_SECONDS  padding kept after the audio (default 1)
+
+Used by the decode cache (openai-whisper tiny/base/medium) and by the Hugging
+Face Sinhala/Tamil engines. The ONNX backend's encoder graph is exported for
+3000 frames and always runs at full length.
+"""
+import functools
+import inspect
+import math
+import os
+
+from audio_input import SAMPLE_RATE
+from lazy_imports import lazy_module
+
+torch = lazy_module("torch")
+
+WHISPER_ENCODER_CONTEXT = os.getenv("WHISPER_ENCODER_CONTEXT", "full").lower()
+ENCODER_PAD_SECONDS = float(os.getenv("WHISPER_ENCODER_PAD_SECONDS", "1"))
+MEL_FRAMES_PER_SECOND = 100
+FULL_FRAMES = 30 * MEL_FRAMES_PER_SECOND
+
+
+def audio_context_enabled():
+    return WHISPER_ENCODER_CONTEXT == "audio"
+
+
+def context_frames(n_samples, sr=SAMPLE_RATE, pad_seconds=None):
+    """Mel frames to encode for a clip of `n_samples`: audio + padding, whole seconds, at most 30 s"""
+    pad_seconds = ENCODER_PAD_SECONDS if pad_seconds is None else pad_seconds
+    seconds = max(math.ceil(n_samples / sr + pad_seconds), 1)
+    return min(seconds * MEL_FRAMES_PER_SECOND, FULL_FRAMES)
+
+
+@functools.lru_cache(maxsize=None)
+def _short_encoder_class():
+    class ShortEncoder(torch.nn.Module):
+        """openai-whisper AudioEncoder.forward over the first `n_frames` mel frames"""
+
+        def __init__(self, encoder):
+            super().__init__()
+            self.encoder = encoder
+
+        def forward(self, mel, n_frames=None):
+            encoder = self.encoder
+            if n_frames is None or n_frames >= mel.shape[-1]:
+                return encoder(mel)
+            x = torch.nn.functional.gelu(encoder.conv1(mel[..., :n_frames]))
+            x = torch.nn.functional.gelu(encoder.conv2(x))
+            x = x.permute(0, 2, 1)
+            x = (x + encoder.positional_embedding[:x.shape[1]]).to(x.dtype)
+            for block in encoder.blocks:
+                x = block(x)
+            return encoder.ln_post(x)
+
+    return ShortEncoder
+
+
+@functools.lru_cache(maxsize=None)
+def short_encoder(encoder):
+    """
+    One ShortEncoder per resident encoder. It stays the same module across
+    requests, so forward hooks (StageTimer) can be registered on it.
+    """
+    return _short_encoder_class()(encoder)
+
+
+def hf_encoder_outputs(model, input_features, n_frames):
+    """
+    Hugging Face WhisperEncoder over the first `n_frames` mel frames. Pass the
+    result to generate() as encoder_outputs; the stock encoder refuses any
+    input that isn't exactly 3000 frames.
+    """
+    from transformers.modeling_outputs import BaseModelOutput
+
+    encoder = model.get_encoder()
+    with torch.no_grad():
+        x = torch.nn.functional.gelu(encoder.conv1(input_features[..., :n_frames]))
+        x = torch.nn.functional.gelu(encoder.conv2(x))
+        x = x.permute(0, 2, 1)
+        x = x + encoder.embed_positions.weight[:x.shape[1]]
+        head_mask = {"layer_head_mask": None} if _takes_head_mask(encoder.layers[0]) else {}
+        for layer in encoder.layers:
+            x = layer(x, None, **head_mask)
+            x = x[0] if isinstance(x, tuple) else x
+        return BaseModelOutput(last_hidden_state=encoder.layer_norm(x))
+
+
+def _takes_head_mask(layer):
+    # transformers 4.x encoder layers take a (required) layer_head_mask and return a tuple
+    return "layer_head_mask" in inspect.signature(layer.forward).parameters
@@ -0,0 +1,57 @@
+import importlib
+
+# engine name -> (module, recognizer function). Names match the Node routes.
+ENGINES = {
+    "whisper": ("whisperService", "recognize_speech"),
+    "whisper-sinhala": ("whisperSinhalaService", "recognize_speech"),
+    "whisper-tamil": ("whisperTamilService", "recognize_speech"),
+    "vosk": ("voskService", "recognize_speech"),
+    "google": ("speech_recognition_service", "recognize_speech"),
+    # Language-ID routing onto one of the engines above
+    "auto": ("language_router", "recognize_speech"),
+    # Fast engine first, larger model only when it isn't confident
+    "cascade": ("cascade", "recognize_speech"),
+}
+
+
+def get_recognizer(engine):
+    """Import the engine's module and return its recognize_speech function"""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine}")
+    module_name, function_name = ENGINES[engine]
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def recognize(engine, audio, **options):
+    return get_recognizer(engine)(audio, **options)
+
+
+def preload(engine, models=()):
+    """
+    Import an engine and load its models so they are resident in this
+    process (and shared copy-on-write with anything forked from it).
+    `models` selects Whisper sizes for the "whisper" engine.
+    """
+    get_recognizer(engine)
+    if engine == "whisper":
+        from whisperService import load_model
+        for model_size in models or ("tiny.en",):
+            load_model(model_size)
+    elif engine == "auto":
+        from language_router import LID_MODEL
+        from whisperService import load_model
+        load_model(LID_MODEL)
+    elif engine == "google":
+        # Keep the local backend warm when it may answer instead of Google
+        from speech_recognition_service import SPEECH_BACKEND, SPEECH_LOCAL_ENGINE
+        if SPEECH_BACKEND != "google":
+            preload(SPEECH_LOCAL_ENGINE)
+    elif engine == "vosk":
+        from voskService import load_model as load_vosk_model
+        load_vosk_model()
+    elif engine == "whisper-sinhala":
+        from whisperSinhalaService import WhisperSinhalaModel
+        WhisperSinhalaModel.get_instance()
+    elif engine == "whisper-tamil":
+        from whisperTamilService import WhisperTamilModel
+        WhisperTamilModel.get_instance()
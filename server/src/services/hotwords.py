@@ -0,0 +1,210 @@
+"""
+Catalog hotword biasing for the Whisper decoders.
+
+Artist names and song titles are the words the models get wrong. The titles
+and artists in search_content are tokenized once per tokenizer into a prefix
+trie, which every request shares; it is rebuilt only when the catalog
+database changes. During decoding a logits filter looks at the last tokens
+generated:
+- when they spell the start of a catalog name, the tokens that continue the
+  name get HOTWORD_BOOST added to their logits;
+- tokens that start a name get HOTWORD_START_BOOST at word boundaries only:
+  at the start of the output, and after a special token or a token ending
+  in whitespace or punctuation. BPE marks where words start (a leading
+  space), not where they end, so these are the only places a new word is
+  certain; boosting elsewhere would pull a word in progress toward a name.
+Nothing is forced: a boosted token still has to be likely enough to win.
+
+The cost per decoding step and row is at most MAX_MATCH_TOKENS dict lookups
+plus two indexed adds on the logits (see `benchmark.py hotwords`).
+
+Configuration (environment):
+    WHISPER_HOTWORDS     "off" (default) or "catalog"
+    HOTWORD_BOOST        logit bonus for continuing a name (default 3)
+    HOTWORD_START_BOOST  logit bonus for starting one (default 1)
+"""
+import functools
+import logging
+import os
+import string
+import threading
+
+from catalog_grammar import catalog_stamp, read_catalog
+from lazy_imports import lazy_module
+
+torch = lazy_module("torch")
+
+logger = logging.getLogger(__name__)
+
+WHISPER_HOTWORDS = os.getenv("WHISPER_HOTWORDS", "off").lower()
+HOTWORD_BOOST = float(os.getenv("HOTWORD_BOOST", "3"))
+HOTWORD_START_BOOST = float(os.getenv("HOTWORD_START_BOOST", "1"))
+# Longest name prefix (in tokens) looked for at the end of the output
+MAX_MATCH_TOKENS = 16
+# A token ending in one of these finishes a word; apostrophes and hyphens can be inside one
+_WORD_BREAKS = frozenset(string.whitespace + string.punctuation) - {"'", "-"}
+
+
+def hotwords_enabled():
+    return WHISPER_HOTWORDS == "catalog"
+
+
+def surface_forms(text):
+    """Spellings of a catalog name as it can appear mid-sentence"""
+    text = " ".join((text or "").split())
+    if not text:
+        return []
+    return sorted({f" {text}", f" {text.lower()}", f" {text.title()}"})
+
+
+def ends_word(text):
+    """Whether a token's text finishes a word (special tokens like <|en|> do)"""
+    return bool(text) and text[-1] in _WORD_BREAKS
+
+
+class HotwordTrie:
+    """
+    Token prefixes of the catalog names -> the tokens that may follow them.
+    `word_ends` are the ids of the tokens that finish a word.
+    """
+
+    def __init__(self, sequences, word_ends=frozenset()):
+        self.children = {}
+        for sequence in sequences:
+            for i in range(len(sequence)):
+                self.children.setdefault(tuple(sequence[:i]), set()).add(sequence[i])
+        starts = self.children.pop((), set())
+        self.max_length = min(max((len(s) for s in sequences), default=0), MAX_MATCH_TOKENS)
+        self.children = {prefix: sorted(tokens) for prefix, tokens in self.children.items()}
+        self.start_tokens = torch.tensor(sorted(starts), dtype=torch.long)
+        self.word_ends = word_ends
+
+    def __len__(self):
+        return len(self.children)
+
+    def continuations(self, tokens):
+        """Tokens continuing any catalog name whose start ends `tokens` (a list of ids)"""
+        found = set()
+        for length in range(1, min(self.max_length, len(tokens)) + 1):
+            following = self.children.get(tuple(tokens[-length:]))
+            if following:
+                found.update(following)
+        return found
+
+    def at_word_boundary(self, tokens):
+        return not tokens or tokens[-1] in self.word_ends
+
+    def bias(self, logits, tokens, boost=None, start_boost=None):
+        """
+        Add the bonuses to one row of logits, given that row's generated
+        tokens (empty at the start of the output)
+        """
+        boost = HOTWORD_BOOST if boost is None else boost
+        start_boost = HOTWORD_START_BOOST if start_boost is None else start_boost
+        if start_boost and len(self.start_tokens) and self.at_word_boundary(tokens):
+            logits[self.start_tokens] += start_boost
+        following = self.continuations(tokens[-self.max_length:]) if self.max_length else None
+        if following:
+            logits[torch.tensor(sorted(following), dtype=torch.long)] += boost
+
+
+_tries = {}
+_word_ends = {}
+_tries_lock = threading.Lock()
+
+
+def catalog_trie(tokenizer_key, encode, token_texts, db_path=None):
+    """
+    The shared trie of catalog names for one tokenizer. `encode` maps text to
+    token ids, `token_texts` returns the text of every token id in order;
+    `tokenizer_key` identifies the tokenizer they belong to.
+    """
+    stamp = catalog_stamp(db_path)
+    with _tries_lock:
+        cached = _tries.get(tokenizer_key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        # Depends only on the vocabulary, so it is kept when the catalog changes
+        if tokenizer_key not in _word_ends:
+            _word_ends[tokenizer_key] = frozenset(i for i, text in enumerate(token_texts()) if ends_word(text))
+        names = {name for _, title, artist in read_catalog(db_path) for name in (title, artist) if name}
+        sequences = [encode(form) for name in names for form in surface_forms(name)]
+        trie = HotwordTrie([sequence for sequence in sequences if sequence], _word_ends[tokenizer_key])
+        logger.debug(f"Hotword trie for {tokenizer_key}: {len(names)} names, {len(trie)} prefixes")
+        _tries[tokenizer_key] = (stamp, trie)
+        return trie
+
+
+def whisper_trie(model):
+    """Catalog trie for an openai-whisper model's tokenizer"""
+    import whisper
+
+    tokenizer = whisper.tokenizer.get_tokenizer(model.is_multilingual, num_languages=model.num_languages)
+    key = ("whisper", model.is_multilingual, model.num_languages)
+
+    def token_texts():
+        encoding = tokenizer.encoding
+        texts = [encoding.decode_single_token_bytes(i).decode("utf-8", "replace") for i in range(tokenizer.eot)]
+        # Everything from <|endoftext|> on is special (language, task, timestamp tokens)
+        return texts + ["<|special|>"] * (encoding.n_vocab - tokenizer.eot)
+
+    return catalog_trie(key, tokenizer.encode, token_texts)
+
+
+def hf_trie(model_id, tokenizer):
+    """Catalog trie for a Hugging Face Whisper tokenizer"""
+    return catalog_trie(
+        ("hf", model_id),
+        lambda text: tokenizer.encode(text, add_special_tokens=False),
+        # Special and added tokens decode to "<|...|>"
+        lambda: tokenizer.batch_decode([[i] for i in range(len(tokenizer))]),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _whisper_filter_class():
+    from whisper.decoding import LogitFilter
+
+    class HotwordFilter(LogitFilter):
+        """openai-whisper logit filter; only the tokens after the prompt are matched"""
+
+        def __init__(self, trie, sample_begin):
+            self.trie = trie
+            self.sample_begin = sample_begin
+
+        def apply(self, logits, tokens):
+            window = max(self.sample_begin, tokens.shape[-1] - self.trie.max_length)
+            for row, generated in enumerate(tokens[:, window:].tolist()):
+                self.trie.bias(logits[row], generated)
+
+    return HotwordFilter
+
+
+def whisper_filter(trie, sample_begin):
+    return _whisper_filter_class()(trie, sample_begin)
+
+
+@functools.lru_cache(maxsize=None)
+def _hf_processor_class():
+    from transformers import LogitsProcessor
+
+    class HotwordLogitsProcessor(LogitsProcessor):
+        """transformers logits processor for generate(logits_processor=...)"""
+
+        def __init__(self, trie):
+            self.trie = trie
+
+        def __call__(self, input_ids, scores):
+            window = input_ids[:, -self.trie.max_length:] if self.trie.max_length else input_ids[:, :0]
+            for row, generated in enumerate(window.tolist()):
+                self.trie.bias(scores[row], generated)
+            return scores
+
+    return HotwordLogitsProcessor
+
+
+def hf_logits_processor(trie):
+    from transformers import LogitsProcessorList
+
+    return LogitsProcessorList([_hf_processor_class()(trie)])
@@ -0,0 +1,193 @@
+import json
+import threading
+from contextlib import contextmanager
+from time import perf_counter_ns
+
+# Stage names shared by every engine so timings can be compared across them
+STAGES = (
+    "queue",
+    "model_loading",
+    "decode",
+    "preprocessing",
+    "features",
+    "encoder",
+    "decoder",
+    "romanization",
+)
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum_ms", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.sum_ms = 0.0
+        self.count = 0
+
+    def observe(self, value_ms):
+        for i, bound in enumerate(BUCKETS_MS):
+            if value_ms <= bound:
+                break
+        else:
+            i = len(BUCKETS_MS)
+        self.counts[i] += 1
+        self.sum_ms += value_ms
+        self.count += 1
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sumMs": round(self.sum_ms, 3),
+            "buckets": dict(zip([*map(str, BUCKETS_MS), "+Inf"], self.counts)),
+        }
+
+
+class MetricsRegistry:
+    """In-process aggregation of stage timings per (engine, stage)"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, engine, stage, value_ms):
+        key = (engine, stage)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value_ms)
+
+    def increment(self, name, engine, amount=1):
+        key = (name, engine)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """JSON-serialisable view: {engine: {stage: histogram}, counters: {...}}"""
+        with self._lock:
+            stages = {}
+            for (engine, stage), histogram in sorted(self._histograms.items()):
+                stages.setdefault(engine, {})[stage] = histogram.as_dict()
+            counters = {}
+            for (name, engine), value in sorted(self._counters.items()):
+                counters.setdefault(name, {})[engine] = value
+        return {"stages": stages, "counters": counters}
+
+    def render_prometheus(self):
+        """Prometheus text exposition format"""
+        lines = [
+            "# HELP voice_search_stage_ms Time spent per recognition stage",
+            "# TYPE voice_search_stage_ms histogram",
+        ]
+        with self._lock:
+            for (engine, stage), histogram in sorted(self._histograms.items()):
+                labels = f'engine="{engine}",stage="{stage}"'
+                cumulative = 0
+                for bound, count in zip([*map(str, BUCKETS_MS), "+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f'voice_search_stage_ms_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"voice_search_stage_ms_sum{{{labels}}} {histogram.sum_ms:.3f}")
+                lines.append(f"voice_search_stage_ms_count{{{labels}}} {histogram.count}")
+            for (name, engine), value in sorted(self._counters.items()):
+                lines.append(f'voice_search_{name}_total{{engine="{engine}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class StageTimer:
+    """
+    Collects the per-stage timings of one request.
+
+    Usage:
+        timer = StageTimer("whisper")
+        with timer.stage("decode"):
+            audio = load(...)
+        result["stageTimes"] = timer.finish()
+    """
+
+    def __init__(self, engine, registry=REGISTRY):
+        self.engine = engine
+        self.registry = registry
+        self._ns = {}
+        self._start = perf_counter_ns()
+
+    @contextmanager
+    def stage(self, name):
+        start = perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter_ns() - start)
+
+    @contextmanager
+    def model_stage(self, encoder):
+        """
+        Time a fused model call (transcribe/generate). Time spent inside the
+        encoder's forward is reported as "encoder", the rest as "decoder".
+        """
+        encoder_before = self._ns.get("encoder", 0)
+        start = perf_counter_ns()
+        try:
+            with module_timer(self, "encoder", encoder):
+                yield
+        finally:
+            elapsed = perf_counter_ns() - start
+            self.add("decoder", elapsed - (self._ns.get("encoder", 0) - encoder_before))
+
+    def add(self, name, elapsed_ns):
+        self._ns[name] = self._ns.get(name, 0) + elapsed_ns
+
+    def stage_times(self):
+        """Stage timings so far, in whole milliseconds"""
+        return {name: elapsed // 1_000_000 for name, elapsed in self._ns.items()}
+
+    def total_ms(self):
+        return (perf_counter_ns() - self._start) // 1_000_000
+
+    def finish(self, record=True):
+        """Record this request into the registry and return its stage timings"""
+        if record and self.registry is not None:
+            for name, elapsed in self._ns.items():
+                self.registry.observe(self.engine, name, elapsed / 1_000_000)
+            self.registry.observe(self.engine, "total", (perf_counter_ns() - self._start) / 1_000_000)
+        return self.stage_times()
+
+
+@contextmanager
+def module_timer(timer, stage, module):
+    """Attribute the time spent inside a torch module's forward calls to `stage`"""
+    starts = []
+
+    def before(_module, _args):
+        starts.append(perf_counter_ns())
+
+    def after(_module, _args, _output):
+        timer.add(stage, perf_counter_ns() - starts.pop())
+
+    handles = [
+        module.register_forward_pre_hook(before),
+        module.register_forward_hook(after),
+    ]
+    try:
+        yield
+    finally:
+        for handle in handles:
+            handle.remove()
+
+
+def metrics_snapshot(fmt="json"):
+    """The registry as Prometheus text ("prometheus") or a JSON string ("json")"""
+    if fmt == "prometheus":
+        return REGISTRY.render_prometheus()
+    return json.dumps(REGISTRY.snapshot())
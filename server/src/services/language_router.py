@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+
+from audio_input import check_audio, load_audio, read_audio_arg
+from engines import recognize
+from timings import pop_timestamps_flag
+from instrumentation import StageTimer
+from lazy_imports import lazy_module
+from profiling import profiled
+from thread_budget import apply_thread_budget
+from whisperService import load_model
+
+whisper = lazy_module("whisper")
+
+# Cheapest engine that covers each language; anything else goes to whisperService
+ROUTES = {
+    "en": ("whisper", {"language": "en"}),   # tiny.en
+    "si": ("whisper-sinhala", {}),           # HF whisper-tiny-sinhala
+    "ta": ("whisper-tamil", {}),             # whisper base
+}
+
+LID_MODEL = os.getenv("LANG_ID_MODEL", "tiny")
+LID_ESCALATION_MODEL = os.getenv("LANG_ID_ESCALATION_MODEL", "base")
+LID_MIN_CONFIDENCE = float(os.getenv("LANG_ID_MIN_CONFIDENCE", "0.6"))
+LID_SECONDS = float(os.getenv("LANG_ID_SECONDS", "10"))
+LID_CACHE_SIZE = 256
+
+_lid_cache = OrderedDict()
+
+
+def _clip_key(audio, model_size):
+    return model_size, hashlib.sha1(audio.tobytes()).hexdigest()
+
+
+def detect_language(audio, model_size=None, seconds=None):
+    """
+    Language ID on the first `seconds` of a 16 kHz clip with a small
+    multilingual Whisper model. Returns (language, probability). Results are
+    cached per (model, clip) so repeated routing of the same audio is free.
+    """
+    model_size = model_size or LID_MODEL
+    seconds = seconds or LID_SECONDS
+    clip = audio[: int(seconds * whisper.audio.SAMPLE_RATE)]
+
+    key = _clip_key(clip, model_size)
+    if key in _lid_cache:
+        _lid_cache.move_to_end(key)
+        return _lid_cache[key]
+
+    model = load_model(model_size)
+    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(clip), model.dims.n_mels).to(model.device)
+    _, probs = model.detect_language(mel)
+    language = max(probs, key=probs.get)
+    detected = (language, float(probs[language]))
+
+    _lid_cache[key] = detected
+    if len(_lid_cache) > LID_CACHE_SIZE:
+        _lid_cache.popitem(last=False)
+    return detected
+
+
+def route(audio):
+    """
+    Pick the engine for a decoded clip. Low-confidence detections are
+    re-checked with the larger escalation model before routing; if that is
+    still unsure the clip goes to whisperService, which handles any language.
+    """
+    language, confidence = detect_language(audio)
+    lid_model = LID_MODEL
+    if confidence < LID_MIN_CONFIDENCE and LID_ESCALATION_MODEL:
+        language, confidence = detect_language(audio, LID_ESCALATION_MODEL)
+        lid_model = LID_ESCALATION_MODEL
+
+    if confidence >= LID_MIN_CONFIDENCE and language in ROUTES:
+        engine, options = ROUTES[language]
+    else:
+        engine, options = "whisper", {"language": language}
+
+    return {
+        "language": language,
+        "confidence": round(confidence, 4),
+        "lidModel": lid_model,
+        "engine": engine,
+        "options": options,
+    }
+
+
+@profiled
+def recognize_speech(audio, timestamps=False):
+    """Detect the spoken language and transcribe with the cheapest adequate engine"""
+    start_time = time.time()
+    timer = StageTimer("auto")
+
+    try:
+        check_audio(audio)
+
+        with timer.stage("decode"):
+            audio = load_audio(audio)
+        with timer.stage("language_id"):
+            routing = route(audio)
+    except Exception as e:
+        return {
+            "text": "",
+            "romanized": "",
+            "error": f"{type(e).__name__}: {str(e)}",
+            "processingTime": int((time.time() - start_time) * 1000),
+            "stageTimes": timer.finish(record=False),
+        }
+
+    # The chosen engine gets the decoded samples rather than decoding again
+    result = recognize(routing["engine"], audio, timestamps=timestamps, **routing["options"])
+    routing_times = timer.finish()
+    result["stageTimes"] = {**routing_times, **(result.get("stageTimes") or {})}
+    result["routing"] = routing
+    result["processingTime"] = int((time.time() - start_time) * 1000)
+    return result
+
+
+if __name__ == "__main__":
+    apply_thread_budget()
+
+    argv, timestamps = pop_timestamps_flag(sys.argv)
+    if len(argv) != 2:
+        result = {
+            "text": "",
+            "error": "Invalid arguments. Usage: python language_router.py <audio_file_path|-> [--timestamps]",
+            "processingTime": 0
+        }
+    else:
+        result = recognize_speech(read_audio_arg(argv[1]), timestamps=timestamps)
+    print(json.dumps(result, ensure_ascii=False))
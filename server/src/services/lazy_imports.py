@@ -0,0 +1,46 @@
+import importlib
+import sys
+import time
+
+
+class LazyModule:
+    """
+    Stand-in for a heavy module (torch, whisper, transformers, librosa) that
+    imports it on first attribute access, so entry points and error paths
+    that never touch the model don't pay for the import.
+    """
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__dict__["_name"])
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self.__dict__['_name']!r} ({state})>"
+
+
+def lazy_module(name):
+    """Return the module if it is already imported, otherwise a LazyModule for it"""
+    return sys.modules.get(name) or LazyModule(name)
+
+
+def time_import(name):
+    """Import `name` and return how long it took in milliseconds (0 if already imported)"""
+    if name in sys.modules:
+        return 0
+    start = time.perf_counter_ns()
+    importlib.import_module(name)
+    return (time.perf_counter_ns() - start) // 1_000_000
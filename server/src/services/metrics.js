@@ -0,0 +1,111 @@
+// Aggregates the stageTimes reported by the Python engines (see
+// instrumentation.py) into per-(engine, stage) histograms for /api/metrics.
+const BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000];
+
+const histograms = new Map();
+const counters = new Map();
+
+function observe(engine, stage, valueMs) {
+    const key = `${engine}\u0000${stage}`;
+    let histogram = histograms.get(key);
+    if (!histogram) {
+        histogram = { engine, stage, counts: new Array(BUCKETS_MS.length + 1).fill(0), sumMs: 0, count: 0 };
+        histograms.set(key, histogram);
+    }
+    let index = BUCKETS_MS.findIndex(bound => valueMs <= bound);
+    if (index === -1) {
+        index = BUCKETS_MS.length;
+    }
+    histogram.counts[index] += 1;
+    histogram.sumMs += valueMs;
+    histogram.count += 1;
+}
+
+function increment(name, engine, amount = 1) {
+    const key = `${name}\u0000${engine}`;
+    const counter = counters.get(key) || { name, engine, value: 0 };
+    counter.value += amount;
+    counters.set(key, counter);
+}
+
+function observeResult(engine, result, lease) {
+    if (lease && typeof lease.queuedMs === 'number') {
+        observe(engine, 'queue', lease.queuedMs);
+    }
+    if (!result) {
+        return;
+    }
+    increment(result.error ? 'errors' : 'requests', engine);
+    Object.entries(result.stageTimes || {}).forEach(([stage, valueMs]) => {
+        observe(engine, stage, valueMs);
+    });
+    if (typeof result.processingTime === 'number') {
+        observe(engine, 'total', result.processingTime);
+    }
+}
+
+// Share of requests answered by the coalescer (joined a run in progress or
+// served a recent result) rather than run, per engine
+function coalesceHitRates() {
+    const rates = {};
+    counters.forEach(({ name, engine }) => {
+        if (!name.startsWith('coalesce_') || engine in rates) {
+            return;
+        }
+        const count = (counterName) => (counters.get(`${counterName}\u0000${engine}`) || { value: 0 }).value;
+        const hits = count('coalesce_joined') + count('coalesce_cached');
+        const total = hits + count('coalesce_computed');
+        rates[engine] = total ? hits / total : 0;
+    });
+    return rates;
+}
+
+function snapshot() {
+    const stages = {};
+    histograms.forEach(({ engine, stage, counts, sumMs, count }) => {
+        const buckets = {};
+        [...BUCKETS_MS.map(String), '+Inf'].forEach((bound, i) => {
+            buckets[bound] = counts[i];
+        });
+        stages[engine] = stages[engine] || {};
+        stages[engine][stage] = { count, sumMs, buckets };
+    });
+    const counterValues = {};
+    counters.forEach(({ name, engine, value }) => {
+        counterValues[name] = counterValues[name] || {};
+        counterValues[name][engine] = value;
+    });
+    return { stages, counters: counterValues, coalesceHitRate: coalesceHitRates() };
+}
+
+function renderPrometheus() {
+    const lines = [
+        '# HELP voice_search_stage_ms Time spent per recognition stage',
+        '# TYPE voice_search_stage_ms histogram'
+    ];
+    histograms.forEach(({ engine, stage, counts, sumMs, count }) => {
+        const labels = `engine="${engine}",stage="${stage}"`;
+        let cumulative = 0;
+        [...BUCKETS_MS.map(String), '+Inf'].forEach((bound, i) => {
+            cumulative += counts[i];
+            lines.push(`voice_search_stage_ms_bucket{${labels},le="${bound}"} ${cumulative}`);
+        });
+        lines.push(`voice_search_stage_ms_sum{${labels}} ${sumMs}`);
+        lines.push(`voice_search_stage_ms_count{${labels}} ${count}`);
+    });
+    counters.forEach(({ name, engine, value }) => {
+        lines.push(`voice_search_${name}_total{engine="${engine}"} ${value}`);
+    });
+    Object.entries(coalesceHitRates()).forEach(([engine, rate]) => {
+        lines.push(`voice_search_coalesce_hit_ratio{engine="${engine}"} ${rate}`);
+    });
+    return lines.join('\n') + '\n';
+}
+
+module.exports = {
+    observe,
+    increment,
+    observeResult,
+    snapshot,
+    renderPrometheus
+};
@@ -0,0 +1,75 @@
+"""
+The models provisioned by python/setup_models.py, for the services to find
+at startup.
+
+setup_models.py downloads every artifact, verifies it against the sha256 in
+models.lock.json, and then writes model_cache/manifest.json, which records
+where each artifact was installed. When an artifact is in the manifest and
+its files are present with the recorded sizes, the services load it from
+that path:
+- openai-whisper gets the directory as download_root;
+- transformers gets the local snapshot instead of a hub id;
+- Vosk gets the unpacked model directory.
+Then nothing is looked up on the network. Anything missing from the manifest
+is loaded as before.
+
+Artifact names: "whisper:<size>", "hf:<model id>", "vosk:<model name>",
+"pocketsphinx:<language>".
+
+Configuration (environment):
+    MODEL_MANIFEST  manifest path (default services/model_cache/manifest.json)
+"""
+import functools
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+MODEL_CACHE_DIR = os.path.join(os.path.dirname(__file__), "model_cache")
+MANIFEST_PATH = os.getenv("MODEL_MANIFEST", os.path.join(MODEL_CACHE_DIR, "manifest.json"))
+# Where artifacts without a location of their own (Hugging Face snapshots, PocketSphinx) are installed
+PROVISIONED_DIR = os.path.join(MODEL_CACHE_DIR, "provisioned")
+
+
+@functools.lru_cache(maxsize=None)
+def load_manifest(path=None):
+    """The manifest as written by setup_models.py; empty if there is none"""
+    path = path or MANIFEST_PATH
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"artifacts": {}, "derived": {}}
+    except ValueError as e:
+        logger.warning(f"Ignoring unreadable model manifest {path}: {e}")
+        return {"artifacts": {}, "derived": {}}
+
+
+def _installed(entry):
+    # Sizes only: hashing gigabytes on every start would defeat the purpose (setup_models.py verify does that)
+    for file in entry.get("files", []):
+        path = os.path.join(entry["path"], file["path"])
+        if not os.path.isfile(path) or os.path.getsize(path) != file["size"]:
+            return False
+    return True
+
+
+def artifact_path(name):
+    """Install path of a provisioned artifact, or None to fall back to the usual lookup"""
+    entry = load_manifest().get("artifacts", {}).get(name)
+    if entry is None:
+        return None
+    if not _installed(entry):
+        logger.warning(f"{name} is in the model manifest but its files are missing or incomplete")
+        return None
+    return entry["path"]
+
+
+def whisper_download_root(model_size):
+    return artifact_path(f"whisper:{model_size}")
+
+
+def hf_model_source(model_id):
+    """What to pass to from_pretrained: the provisioned snapshot if there is one, else the hub id"""
+    return artifact_path(f"hf:{model_id}") or model_id
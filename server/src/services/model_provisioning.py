@@ -0,0 +1,365 @@
+"""
+Fetching, verifying and installing model artifacts (python/setup_models.py).
+
+An artifact is a set of files with a URL, sha256 and size each.
+models.lock.json pins them; where they are installed is worked out on each
+machine (install_dir()). An artifact
+missing from the lock is resolved on the spot; see resolve() for where its
+hashes come from.
+
+Each file is downloaded to <file>.part and renamed into place only after its
+size and sha256 match the lock, so an installed file is always a complete,
+verified one. After a failure or an interrupted run, the download continues
+from the end of the .part file (HTTP Range). A file already installed with
+the right hash is not downloaded again.
+
+With a mirror (an http(s)/file URL or a local directory), every file is read
+from <mirror>/<mirrorPath> instead of its origin:
+    whisper/<file>.pt
+    hf/<model id>/<file>
+    vosk/<model>.zip
+    pocketsphinx/<language>/<file>
+This is how provisioning runs offline.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import urllib.parse
+import urllib.request
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from model_manifest import MANIFEST_PATH, PROVISIONED_DIR, load_manifest
+
+logger = logging.getLogger(__name__)
+
+LOCK_PATH = os.path.join(os.path.dirname(__file__), "..", "python", "models.lock.json")
+HF_ENDPOINT = os.getenv("HF_ENDPOINT", "https://huggingface.co")
+VOSK_MODELS_URL = "https://alphacephei.com/vosk/models"
+VOSK_MODELS_DIR = os.path.join(os.path.dirname(__file__), "..", "models")
+POCKETSPHINX_URL = "https://raw.githubusercontent.com/cmusphinx/pocketsphinx/master/model/en-us"
+POCKETSPHINX_FILES = ["en-us-phone.lm.bin", "en-us.lm.bin", "cmudict-en-us.dict"]
+DOWNLOADS_DIR = os.path.join(PROVISIONED_DIR, "downloads")
+CHUNK_BYTES = 1 << 20
+RETRIES = 3
+# Hugging Face repo files a transformers Whisper checkpoint doesn't need
+_HF_SKIP_SUFFIXES = (".md", ".gitattributes", ".msgpack", ".h5", ".ot", ".onnx", ".png", ".jpg")
+
+
+def sha256_of(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _local_path(location):
+    """Filesystem path for a local directory or file:// URL, else None"""
+    parsed = urllib.parse.urlparse(location)
+    if parsed.scheme == "file":
+        return urllib.request.url2pathname(parsed.path)
+    if parsed.scheme in ("http", "https"):
+        return None
+    return location
+
+
+def source_url(file, mirror=None):
+    if not mirror:
+        return file["url"]
+    local = _local_path(mirror)
+    if local is not None:
+        return os.path.join(local, *file["mirrorPath"].split("/"))
+    return f"{mirror.rstrip('/')}/{urllib.parse.quote(file['mirrorPath'])}"
+
+
+def _open(url, offset):
+    """(readable stream, offset it starts at): the offset is 0 if the source can't resume"""
+    local = _local_path(url)
+    if local is not None:
+        stream = open(local, "rb")
+        stream.seek(offset)
+        return stream, offset
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    response = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=60)
+    if offset and response.status != 206:
+        # The server ignored the range: start over
+        return response, 0
+    return response, offset
+
+
+def _hash_source(url):
+    """sha256 and size of a file read straight from its source (used only when resolving)"""
+    digest, size = hashlib.sha256(), 0
+    stream, _ = _open(url, 0)
+    with stream:
+        for chunk in iter(lambda: stream.read(CHUNK_BYTES), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def _source_size(url):
+    """Size of a file at its source, without downloading it"""
+    local = _local_path(url)
+    if local is not None:
+        return os.path.getsize(local)
+    request = urllib.request.Request(url, method="HEAD")
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return int(response.headers["Content-Length"])
+
+
+def fetch_file(file, directory, mirror=None):
+    """Download one file into `directory`, resuming and verifying; returns {path, sha256, size}"""
+    dest = os.path.join(directory, *file["path"].split("/"))
+    if os.path.isfile(dest) and (file.get("size") is None or os.path.getsize(dest) == file["size"]):
+        actual = sha256_of(dest)
+        if file.get("sha256") in (None, actual):
+            return {"path": file["path"], "sha256": actual, "size": os.path.getsize(dest), "fetched": False}
+
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    part = f"{dest}.part"
+    url = source_url(file, mirror)
+    for attempt in range(1, RETRIES + 1):
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        if file.get("size") is not None and offset > file["size"]:
+            offset = 0
+        try:
+            stream, offset = _open(url, offset)
+            with stream, open(part, "r+b" if offset else "wb") as out:
+                out.seek(offset)
+                out.truncate()
+                for chunk in iter(lambda: stream.read(CHUNK_BYTES), b""):
+                    out.write(chunk)
+            break
+        except OSError as e:
+            if attempt == RETRIES:
+                raise RuntimeError(f"Failed to download {url}: {e}") from None
+            logger.warning(f"Download of {url} interrupted ({e}); resuming (attempt {attempt + 1}/{RETRIES})")
+            time.sleep(attempt)
+
+    actual, size = sha256_of(part), os.path.getsize(part)
+    if (file.get("size") is not None and size != file["size"]) or file.get("sha256") not in (None, actual):
+        os.remove(part)
+        raise ValueError(
+            f"{file['path']} from {url} does not match the lock: sha256 {actual}, {size} bytes "
+            f"(expected {file.get('sha256')}, {file.get('size')} bytes)"
+        )
+    os.replace(part, dest)
+    return {"path": file["path"], "sha256": actual, "size": size, "fetched": True}
+
+
+def _file(path, url, mirror_path, sha256=None, size=None):
+    return {"path": path, "url": url, "mirrorPath": mirror_path, "sha256": sha256, "size": size}
+
+
+def _pin(artifact, mirror):
+    """Fill in missing hashes by reading each file from its source once, and missing sizes"""
+    for file in artifact["files"]:
+        if file["sha256"] is None:
+            file["sha256"], file["size"] = _hash_source(source_url(file, mirror))
+        elif file["size"] is None:
+            # Whisper checkpoints: the hash is in the URL, the size isn't
+            file["size"] = _source_size(source_url(file, mirror))
+    return artifact
+
+
+def whisper_root():
+    """openai-whisper's default download root (where load_model looks first)"""
+    cache = os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(cache, "whisper")
+
+
+def pocketsphinx_model_dir():
+    """The installed pocketsphinx package's model directory, or one under the model cache"""
+    configured = os.getenv("POCKETSPHINX_MODEL_DIR")
+    if configured:
+        return configured
+    try:
+        from pocketsphinx import get_model_path
+        return get_model_path()
+    except ImportError:
+        return os.path.join(PROVISIONED_DIR, "pocketsphinx")
+
+
+def install_dir(name):
+    """Directory an artifact's files are downloaded into on this machine"""
+    kind, _, spec = name.partition(":")
+    if kind == "whisper":
+        return whisper_root()
+    if kind == "hf":
+        return os.path.join(PROVISIONED_DIR, "hf", spec.replace("/", "--"))
+    if kind == "pocketsphinx":
+        return pocketsphinx_model_dir()
+    # Vosk: the zip is kept here and unpacked into VOSK_MODELS_DIR
+    return DOWNLOADS_DIR
+
+
+def _resolve_hf(model_id, mirror):
+    local_mirror = _local_path(mirror) if mirror else None
+    files = []
+    if local_mirror is not None:
+        root = os.path.join(local_mirror, "hf", *model_id.split("/"))
+        for base, _, names in os.walk(root):
+            for name in sorted(names):
+                path = os.path.relpath(os.path.join(base, name), root).replace(os.sep, "/")
+                files.append(_file(path, f"{HF_ENDPOINT}/{model_id}/resolve/main/{path}", f"hf/{model_id}/{path}"))
+    else:
+        from huggingface_hub import HfApi
+
+        info = HfApi(endpoint=HF_ENDPOINT).model_info(model_id, files_metadata=True)
+        names = {sibling.rfilename for sibling in info.siblings}
+        for sibling in info.siblings:
+            name = sibling.rfilename
+            if name.endswith(_HF_SKIP_SUFFIXES) or (name == "pytorch_model.bin" and "model.safetensors" in names):
+                continue
+            lfs = getattr(sibling, "lfs", None)
+            # Pinned to the commit resolved now, so the hashes stay valid
+            files.append(_file(
+                name, f"{HF_ENDPOINT}/{model_id}/resolve/{info.sha}/{name}", f"hf/{model_id}/{name}",
+                lfs.sha256 if lfs else None, sibling.size,
+            ))
+    if not files:
+        raise ValueError(f"No files found for {model_id}")
+    return {"kind": "hf", "files": files}
+
+
+def resolve(name, mirror=None):
+    """
+    Lock entry for an artifact. Whisper hashes are part of openai-whisper's
+    download URLs. Hugging Face LFS hashes come from the hub API. Any other
+    file (small repo files, the Vosk zip, PocketSphinx) is hashed by reading
+    it once from the mirror, or from its origin if there is no mirror.
+    """
+    kind, _, spec = name.partition(":")
+    if kind == "whisper":
+        import whisper
+
+        url = whisper._MODELS[spec]
+        filename = url.rsplit("/", 1)[-1]
+        artifact = {"kind": kind, "files": [_file(filename, url, f"whisper/{filename}", url.split("/")[-2])]}
+    elif kind == "hf":
+        artifact = _resolve_hf(spec, mirror)
+    elif kind == "vosk":
+        filename = f"{spec}.zip"
+        artifact = {"kind": kind, "files": [_file(filename, f"{VOSK_MODELS_URL}/{filename}", f"vosk/{filename}")]}
+    elif kind == "pocketsphinx":
+        artifact = {"kind": kind, "files": [
+            _file(filename, f"{POCKETSPHINX_URL}/{filename}", f"pocketsphinx/{spec}/{filename}")
+            for filename in POCKETSPHINX_FILES
+        ]}
+    else:
+        raise ValueError(f"Unknown artifact: {name}")
+    return _pin(artifact, mirror)
+
+
+def read_lock(path=None):
+    try:
+        with open(path or LOCK_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"artifacts": {}}
+
+
+def write_json_atomic(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+
+def _unpack(archive, destination):
+    """Extract a zip with one top-level directory; returns (model dir, file list with hashes)"""
+    with zipfile.ZipFile(archive) as zf:
+        top = {member.split("/", 1)[0] for member in zf.namelist()}
+        if len(top) != 1:
+            raise ValueError(f"{archive} should contain a single directory, found {sorted(top)}")
+        model_dir = os.path.join(destination, top.pop())
+        staging = f"{model_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        zf.extractall(staging)
+    # Swapped in whole, so a half-extracted model is never picked up
+    shutil.rmtree(model_dir, ignore_errors=True)
+    os.replace(os.path.join(staging, os.path.basename(model_dir)), model_dir)
+    shutil.rmtree(staging, ignore_errors=True)
+    files = []
+    for base, _, names in os.walk(model_dir):
+        for filename in sorted(names):
+            path = os.path.join(base, filename)
+            files.append({"path": os.path.relpath(path, model_dir).replace(os.sep, "/"),
+                          "sha256": sha256_of(path), "size": os.path.getsize(path)})
+    return model_dir, files
+
+
+def fetch_artifacts(artifacts, mirror=None, jobs=8, progress=print):
+    """
+    Fetch every file of every artifact ({name: lock entry}) concurrently.
+    Returns ({name: manifest entry} for the artifacts installed, {name: error} for the rest).
+    """
+    installed, errors = {}, {}
+    results = {name: [] for name in artifacts}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = {
+            pool.submit(fetch_file, file, install_dir(name), mirror): name
+            for name, artifact in artifacts.items() for file in artifact["files"]
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+                results[name].append(result)
+                progress(f"{name}: {result['path']} {'downloaded' if result['fetched'] else 'already present'}")
+            except Exception as e:
+                errors.setdefault(name, str(e))
+                progress(f"{name}: {e}")
+
+    for name, artifact in artifacts.items():
+        if name in errors:
+            continue
+        path, files = install_dir(name), [{k: r[k] for k in ("path", "sha256", "size")} for r in results[name]]
+        try:
+            if artifact["kind"] == "vosk":
+                path, files = _unpack(os.path.join(path, artifact["files"][0]["path"]), VOSK_MODELS_DIR)
+        except Exception as e:
+            errors[name] = str(e)
+            continue
+        installed[name] = {
+            "kind": artifact["kind"],
+            "path": os.path.abspath(path),
+            "files": sorted(files, key=lambda file: file["path"]),
+            "source": mirror or "origin",
+            "provisionedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+    return installed, errors
+
+
+def update_manifest(artifacts=None, derived=None, path=None):
+    """Merge entries into the manifest (entries of other artifacts are kept)"""
+    path = path or MANIFEST_PATH
+    load_manifest.cache_clear()
+    manifest = load_manifest(path)
+    manifest = {"artifacts": {**manifest.get("artifacts", {}), **(artifacts or {})},
+                "derived": {**manifest.get("derived", {}), **(derived or {})}}
+    write_json_atomic(path, manifest)
+    load_manifest.cache_clear()
+    return manifest
+
+
+def verify_manifest(path=None):
+    """{artifact: [problems]} after re-hashing every installed file"""
+    load_manifest.cache_clear()
+    problems = {}
+    for name, entry in load_manifest(path or MANIFEST_PATH).get("artifacts", {}).items():
+        for file in entry["files"]:
+            full_path = os.path.join(entry["path"], file["path"])
+            if not os.path.isfile(full_path):
+                problems.setdefault(name, []).append(f"{file['path']}: missing")
+            elif sha256_of(full_path) != file["sha256"]:
+                problems.setdefault(name, []).append(f"{file['path']}: sha256 mismatch")
+    return problems
+
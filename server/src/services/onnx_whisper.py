@@ -0,0 +1,331 @@
+"""
+openai-whisper models exported to ONNX and run with ONNX Runtime.
+
+Each model is exported as three graphs, cached under model_cache/onnx/<name>/:
+    encoder.onnx   mel (batch, n_mels, 3000) -> audio_features
+    cross_kv.onnx  audio_features -> cross_k, cross_v   (n_layer, batch, n_audio_ctx, n_state)
+    decoder.onnx   tokens (batch, n_new), self_k, self_v (n_layer, batch, n_past, n_state),
+                   cross_k, cross_v -> logits (batch, n_new, n_vocab), self_k, self_v (with n_new appended)
+
+OnnxWhisper plugs these into whisper's own DecodingTask through its
+Inference interface, so transcribe() options, logit filters, temperature
+fallback and beam search behave as with the PyTorch model.
+"""
+import functools
+import json
+import os
+import sys
+from dataclasses import replace
+from pathlib import Path
+from types import SimpleNamespace
+
+from hotwords import whisper_filter
+from lazy_imports import lazy_module
+from thread_budget import current_layout, max_threads_per_worker
+
+torch = lazy_module("torch")
+np = lazy_module("numpy")
+ort = lazy_module("onnxruntime")
+whisper = lazy_module("whisper")
+
+ONNX_DIR = Path(os.path.dirname(__file__)) / "model_cache" / "onnx"
+GRAPHS = ("encoder", "cross_kv", "decoder")
+OPSET = 17
+
+_sessions = {}
+
+
+def model_dir(name):
+    return ONNX_DIR / name
+
+
+def is_exported(name):
+    directory = model_dir(name)
+    return (directory / "dims.json").exists() and all((directory / f"{g}.onnx").exists() for g in GRAPHS)
+
+
+def _attention(q, k, v, n_head, mask=None):
+    """MultiHeadAttention.qkv_attention without the kv_cache plumbing"""
+    n_state = q.shape[-1]
+    scale = (n_state // n_head) ** -0.25
+    q = q.view(q.shape[0], q.shape[1], n_head, -1).permute(0, 2, 1, 3) * scale
+    k = k.view(k.shape[0], k.shape[1], n_head, -1).permute(0, 2, 3, 1) * scale
+    v = v.view(v.shape[0], v.shape[1], n_head, -1).permute(0, 2, 1, 3)
+    qk = q @ k
+    if mask is not None:
+        qk = qk + mask
+    w = torch.softmax(qk.float(), dim=-1).to(q.dtype)
+    return (w @ v).permute(0, 2, 1, 3).flatten(start_dim=2)
+
+
+def _export_modules(model):
+    """nn.Modules with the tensor-only signatures of the three graphs"""
+    nn = torch.nn
+    decoder = model.decoder
+
+    class CrossKV(nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.blocks = decoder.blocks
+
+        def forward(self, audio_features):
+            keys = [block.cross_attn.key(audio_features) for block in self.blocks]
+            values = [block.cross_attn.value(audio_features) for block in self.blocks]
+            return torch.stack(keys), torch.stack(values)
+
+    class CachedDecoder(nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.decoder = decoder
+
+        def forward(self, tokens, self_k, self_v, cross_k, cross_v):
+            offset = self_k.shape[2]
+            n_new = tokens.shape[1]
+            x = self.decoder.token_embedding(tokens) + self.decoder.positional_embedding[offset:offset + n_new]
+            mask = self.decoder.mask[offset:offset + n_new, :offset + n_new]
+
+            new_k, new_v = [], []
+            for i, block in enumerate(self.decoder.blocks):
+                attn = block.attn
+                h = block.attn_ln(x)
+                k = torch.cat([self_k[i], attn.key(h)], dim=1)
+                v = torch.cat([self_v[i], attn.value(h)], dim=1)
+                new_k.append(k)
+                new_v.append(v)
+                x = x + attn.out(_attention(attn.query(h), k, v, attn.n_head, mask))
+
+                cross = block.cross_attn
+                h = block.cross_attn_ln(x)
+                x = x + cross.out(_attention(cross.query(h), cross_k[i], cross_v[i], cross.n_head))
+                x = x + block.mlp(block.mlp_ln(x))
+
+            x = self.decoder.ln(x)
+            logits = (x @ torch.transpose(self.decoder.token_embedding.weight, 0, 1)).float()
+            return logits, torch.stack(new_k), torch.stack(new_v)
+
+    return model.encoder, CrossKV(), CachedDecoder()
+
+
+def export_model(name, model):
+    """Export an openai-whisper model to ONNX graphs in model_cache/onnx/<name>"""
+    dims = model.dims
+    directory = model_dir(name)
+    directory.mkdir(parents=True, exist_ok=True)
+    encoder, cross_kv, decoder = _export_modules(model.float().eval())
+
+    mel = torch.zeros(1, dims.n_mels, whisper.audio.N_FRAMES)
+    features = torch.zeros(1, dims.n_audio_ctx, dims.n_audio_state)
+    tokens = torch.zeros(1, 3, dtype=torch.long)
+    past = torch.zeros(dims.n_text_layer, 1, 2, dims.n_text_state)
+    cross = torch.zeros(dims.n_text_layer, 1, dims.n_audio_ctx, dims.n_text_state)
+    batch = {0: "batch"}
+    layer_batch = {1: "batch"}
+
+    def export(module, args, graph, input_names, output_names, dynamic_axes):
+        # Write to a temporary name so a crash never leaves a half-written graph
+        tmp_path = directory / f"{graph}.onnx.tmp"
+        torch.onnx.export(
+            module, args, str(tmp_path),
+            input_names=input_names, output_names=output_names,
+            dynamic_axes=dynamic_axes, opset_version=OPSET, dynamo=False
+        )
+        os.replace(tmp_path, directory / f"{graph}.onnx")
+
+    with torch.no_grad():
+        export(encoder, (mel,), "encoder", ["mel"], ["audio_features"],
+               {"mel": batch, "audio_features": batch})
+        export(cross_kv, (features,), "cross_kv", ["audio_features"], ["cross_k", "cross_v"],
+               {"audio_features": batch, "cross_k": layer_batch, "cross_v": layer_batch})
+        export(decoder, (tokens, past, past, cross, cross), "decoder",
+               ["tokens", "self_k", "self_v", "cross_k", "cross_v"], ["logits", "new_self_k", "new_self_v"],
+               {
+                   "tokens": {0: "batch", 1: "new"},
+                   "self_k": {1: "batch", 2: "past"},
+                   "self_v": {1: "batch", 2: "past"},
+                   "cross_k": layer_batch,
+                   "cross_v": layer_batch,
+                   "logits": {0: "batch", 1: "new"},
+                   "new_self_k": {1: "batch", 2: "total"},
+                   "new_self_v": {1: "batch", 2: "total"},
+               })
+
+    with open(directory / "dims.json", "w") as f:
+        json.dump(dims.__dict__, f)
+    return directory
+
+
+def onnx_threads():
+    """Intra-op threads: WHISPER_ONNX_THREADS, else this worker's thread budget"""
+    configured = int(os.getenv("WHISPER_ONNX_THREADS", "0"))
+    if configured:
+        return configured
+    layout = current_layout()
+    return layout["threads"] if layout else max_threads_per_worker()
+
+
+def _session(path, threads):
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    return ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+
+
+@functools.lru_cache(maxsize=None)
+def _encoder_class():
+    class OnnxEncoder(torch.nn.Module):
+        """The encoder session as a module, so forward hooks (StageTimer) still see it"""
+
+        def __init__(self, session):
+            super().__init__()
+            self.session = session
+
+        def forward(self, mel):
+            (features,) = self.session.run(None, {"mel": mel.float().numpy()})
+            return torch.from_numpy(features)
+
+    return OnnxEncoder
+
+
+@functools.lru_cache(maxsize=None)
+def _task_class():
+    from whisper.decoding import BeamSearchDecoder, DecodingTask, Inference
+
+    class OnnxInference(Inference):
+        def __init__(self, model, initial_token_length):
+            self.model = model
+            self.initial_token_length = initial_token_length
+            self.cross = None
+            self.self_k = None
+            self.self_v = None
+
+        def logits(self, tokens, audio_features):
+            if self.cross is None:
+                self.cross = self.model.cross_kv(audio_features)
+            tokens = tokens.numpy()
+            if self.self_k is None:
+                dims = self.model.dims
+                empty = np.zeros((dims.n_text_layer, tokens.shape[0], 0, dims.n_text_state), dtype=np.float32)
+                self.self_k = self.self_v = empty
+            elif tokens.shape[-1] > self.initial_token_length:
+                # only need to use the last token except in the first forward pass
+                tokens = tokens[:, -1:]
+
+            logits, self.self_k, self.self_v = self.model.run_decoder(tokens, self.self_k, self.self_v, *self.cross)
+            return torch.from_numpy(logits)
+
+        def rearrange_kv_cache(self, source_indices):
+            if source_indices != list(range(len(source_indices))):
+                self.self_k = self.self_k[:, source_indices]
+                self.self_v = self.self_v[:, source_indices]
+
+        def cleanup_caching(self):
+            self.cross = None
+            self.self_k = None
+            self.self_v = None
+
+    class OnnxDecodingTask(DecodingTask):
+        def __init__(self, model, options, hotwords=None):
+            super().__init__(model, options)
+            self.inference = OnnxInference(model, len(self.initial_tokens))
+            if hotwords is not None:
+                self.logit_filters.append(whisper_filter(hotwords, self.sample_begin))
+            if isinstance(self.decoder, BeamSearchDecoder):
+                self.decoder.inference = self.inference
+
+        def _get_audio_features(self, mel):
+            if mel.shape[-2:] == (self.model.dims.n_audio_ctx, self.model.dims.n_audio_state):
+                return mel
+            return self.model.encoder(mel)
+
+    return OnnxDecodingTask
+
+
+class OnnxWhisper:
+    """
+    Stands in for a Whisper model in whisper.transcribe(), running the
+    exported graphs with ONNX Runtime. Word timestamps (which need the
+    cross-attention weights) are not available; segments are.
+    """
+
+    def __init__(self, name, threads=None):
+        directory = model_dir(name)
+        with open(directory / "dims.json") as f:
+            self.dims = whisper.model.ModelDimensions(**json.load(f))
+        self.name = name
+        self.device = torch.device("cpu")
+        # DecodingTask.__init__ builds a PyTorchInference (which only lists the
+        # decoder blocks) before OnnxDecodingTask swaps in OnnxInference
+        self.decoder = SimpleNamespace(blocks=())
+        threads = threads or onnx_threads()
+        self.sessions = {graph: _session(directory / f"{graph}.onnx", threads) for graph in GRAPHS}
+        self.encoder = _encoder_class()(self.sessions["encoder"])
+        self.hotwords = None
+
+    @property
+    def is_multilingual(self):
+        return self.dims.n_vocab >= 51865
+
+    @property
+    def num_languages(self):
+        return self.dims.n_vocab - 51765 - int(self.is_multilingual)
+
+    def cross_kv(self, audio_features):
+        return self.sessions["cross_kv"].run(None, {"audio_features": audio_features.float().numpy()})
+
+    def run_decoder(self, tokens, self_k, self_v, cross_k, cross_v):
+        return self.sessions["decoder"].run(None, {
+            "tokens": tokens.astype(np.int64),
+            "self_k": self_k,
+            "self_v": self_v,
+            "cross_k": cross_k,
+            "cross_v": cross_v,
+        })
+
+    def logits(self, tokens, audio_features):
+        """Whisper.logits (used by detect_language): a decoder pass with no cache"""
+        dims = self.dims
+        empty = np.zeros((dims.n_text_layer, tokens.shape[0], 0, dims.n_text_state), dtype=np.float32)
+        logits, _, _ = self.run_decoder(tokens.numpy(), empty, empty, *self.cross_kv(audio_features))
+        return torch.from_numpy(logits)
+
+    def embed_audio(self, mel):
+        return self.encoder(mel)
+
+    def detect_language(self, mel, tokenizer=None):
+        return whisper.decoding.detect_language(self, mel, tokenizer)
+
+    def decode(self, mel, options=None, **kwargs):
+        options = replace(options or whisper.DecodingOptions(), **kwargs)
+        single = mel.ndim == 2
+        if single:
+            mel = mel.unsqueeze(0)
+        with torch.no_grad():
+            result = _task_class()(self, options, self.hotwords).run(mel)
+        return result[0] if single else result
+
+    def transcribe(self, audio, hotwords=None, **kwargs):
+        if kwargs.pop("word_timestamps", False):
+            print("Word timestamps are not available with the ONNX backend; returning segments only", file=sys.stderr)
+        # Sessions are shared by a process's requests, so set per transcribe()
+        self.hotwords = hotwords
+        try:
+            return whisper.transcribe(self, audio, **kwargs)
+        finally:
+            self.hotwords = None
+
+
+def load_onnx_model(name, loader):
+    """
+    ONNX Runtime model for Whisper `name`, exporting it first if needed.
+    `loader` returns the PyTorch model and is only called for the export.
+    Sessions are created on first use in the worker (ONNX Runtime's thread
+    pools must not be created before a fork).
+    """
+    if name not in _sessions:
+        if not is_exported(name):
+            print(f"Exporting {name} to ONNX...", file=sys.stderr)
+            export_model(name, loader())
+        _sessions[name] = OnnxWhisper(name)
+    return _sessions[name]
@@ -0,0 +1,164 @@
+import cProfile
+import functools
+import os
+import random
+import sys
+import threading
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+
+# VOICE_SEARCH_PROFILE=1 profiles every request, VOICE_SEARCH_PROFILE_RATE=0.01
+# profiles a random 1% of them (low enough to leave on in production).
+PROFILE_ENV = "VOICE_SEARCH_PROFILE"
+RATE_ENV = "VOICE_SEARCH_PROFILE_RATE"
+DIR_ENV = "VOICE_SEARCH_PROFILE_DIR"
+# "sampling" (default) writes folded stacks, "cprofile" writes a .pstats file
+MODE_ENV = "VOICE_SEARCH_PROFILER"
+# Torch profiler trace (op-level view of the model call). On by default for
+# explicitly profiled requests, off for rate-sampled ones since it is not cheap.
+TORCH_ENV = "VOICE_SEARCH_PROFILE_TORCH"
+
+DEFAULT_INTERVAL = 0.005
+
+# One profile at a time per process. A recognizer called by another profiled
+# one (language router, cascade, hybrid race) is covered by the outer
+# profile, and torch profilers can't be nested.
+_profiling = threading.Lock()
+
+
+def profile_dir():
+    return Path(os.getenv(DIR_ENV, os.path.join(os.path.dirname(__file__), "profiles")))
+
+
+def should_profile(flag=None):
+    """
+    Returns None (don't profile), "explicit" or "sampled". An explicit request
+    flag wins; otherwise use the env switch, then the sampling rate.
+    """
+    if flag is not None:
+        return "explicit" if flag else None
+    if os.getenv(PROFILE_ENV, "").lower() in ("1", "true", "yes"):
+        return "explicit"
+    try:
+        rate = float(os.getenv(RATE_ENV, "0"))
+    except ValueError:
+        return None
+    return "sampled" if rate > 0 and random.random() < rate else None
+
+
+class StackSampler:
+    """
+    Minimal sampling profiler: a background thread snapshots the profiled
+    thread's Python stack every `interval` seconds and counts identical
+    stacks. Output uses the folded format read by flamegraph.pl / speedscope.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._target = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write_folded(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _torch_profiler(reason):
+    if os.getenv(TORCH_ENV, "1" if reason == "explicit" else "0") == "0":
+        return None
+    try:
+        # Engines import torch lazily, so it is usually not loaded yet when the request starts
+        import torch
+    except ImportError:
+        return None
+    return torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU])
+
+
+def run_profiled(func, args, kwargs, request_id=None, reason="explicit"):
+    """Run func(*args, **kwargs) under the profilers; returns (result, profile info)"""
+    request_id = request_id or uuid.uuid4().hex
+    out_dir = profile_dir()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    base = out_dir / request_id
+    files = []
+
+    mode = os.getenv(MODE_ENV, "sampling")
+    torch_profiler = _torch_profiler(reason)
+    with ExitStack() as stack:
+        # Python-level profiler innermost so it doesn't see the torch profiler's teardown
+        if torch_profiler is not None:
+            stack.enter_context(torch_profiler)
+        if mode == "cprofile":
+            profiler = cProfile.Profile()
+            stack.callback(profiler.disable)
+            profiler.enable()
+        else:
+            sampler = stack.enter_context(StackSampler())
+        result = func(*args, **kwargs)
+
+    # Never fail a request because writing the profile did
+    try:
+        if mode == "cprofile":
+            files.append(f"{base}.pstats")
+            profiler.dump_stats(files[-1])
+        else:
+            files.append(f"{base}.folded")
+            sampler.write_folded(files[-1])
+        if torch_profiler is not None:
+            files.append(f"{base}.torch.json")
+            torch_profiler.export_chrome_trace(files[-1])
+    except Exception as e:
+        print(f"Could not write profile {request_id}: {e}", file=sys.stderr)
+
+    return result, {"requestId": request_id, "mode": mode, "reason": reason, "files": files}
+
+
+def profiled(func):
+    """
+    Decorator for recognize_speech functions adding two keyword arguments:
+    profile (True/False to force, None to follow the env settings) and
+    request_id (names the output files). The written files are listed
+    under result["profile"].
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, profile=None, request_id=None, **kwargs):
+        reason = should_profile(profile)
+        if reason is None or not _profiling.acquire(blocking=False):
+            return func(*args, **kwargs)
+        try:
+            result, info = run_profiled(func, args, kwargs, request_id, reason)
+        finally:
+            _profiling.release()
+        if isinstance(result, dict):
+            result["profile"] = info
+        return result
+
+    return wrapper
@@ -0,0 +1,109 @@
+import os
+import sys
+from pathlib import Path
+
+from lazy_imports import lazy_module
+
+torch = lazy_module("torch")
+
+# Opt-in: the first load writes an fp32 copy of the weights (about 3 GB for
+# Whisper medium) next to the model cache; every later worker maps it.
+SHARED_WEIGHTS_ENV = "VOICE_SEARCH_SHARED_WEIGHTS"
+SHARED_DIR = Path(os.path.dirname(__file__)) / "model_cache" / "shared"
+
+
+def shared_weights_enabled():
+    return os.getenv(SHARED_WEIGHTS_ENV, "0").lower() in ("1", "true", "yes")
+
+
+def weights_path(name):
+    safe_name = name.replace("/", "--")
+    return SHARED_DIR / f"{safe_name}.pt"
+
+
+def _save_atomic(path, write):
+    """write(tmp_path), then rename it into place, so no reader sees a partial file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _load_mapped(path):
+    """
+    Load a checkpoint with its tensors backed by a read-only mapping of the
+    file, so every process that maps it shares the same page-cache pages.
+    """
+    try:
+        return torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    except TypeError:
+        # torch < 2.1 has no mmap support; fall back to a private copy
+        return torch.load(path, map_location="cpu")
+
+
+def load_whisper(name, loader):
+    """
+    openai-whisper model `name` with memory-mapped weights. `loader` loads the
+    model the normal way and is only used to create the shared copy.
+    """
+    import whisper
+    from whisper.model import ModelDimensions, Whisper
+
+    path = weights_path(f"whisper-{name}")
+    if not path.exists():
+        model = loader()
+        checkpoint = {"dims": model.dims.__dict__, "model_state_dict": model.state_dict()}
+        _save_atomic(path, lambda tmp_path: torch.save(checkpoint, tmp_path))
+        del checkpoint
+        del model
+
+    checkpoint = _load_mapped(path)
+    # Built on the CPU like whisper.load_model() does (its constructor creates
+    # buffers that can't live on the meta device); assign=True then swaps the
+    # freshly initialised parameters for the mapped ones instead of copying.
+    model = Whisper(ModelDimensions(**checkpoint["dims"]))
+    model.load_state_dict(checkpoint["model_state_dict"], assign=True)
+    if name in whisper._ALIGNMENT_HEADS:
+        model.set_alignment_heads(whisper._ALIGNMENT_HEADS[name])
+    return model.eval()
+
+
+def load_hf_whisper(model_id, loader):
+    """Hugging Face Whisper model with memory-mapped weights (see load_whisper)"""
+    import transformers
+
+    path = weights_path(f"hf-{model_id}")
+    config_path = path.with_suffix(".config.json")
+    generation_config_path = path.with_suffix(".generation.json")
+    if not path.exists():
+        model = loader()
+        # The weights go last: once they exist, the configs are complete too
+        _save_atomic(config_path, lambda tmp_path: model.config.to_json_file(str(tmp_path)))
+        _save_atomic(generation_config_path, lambda tmp_path: model.generation_config.to_json_file(str(tmp_path)))
+        _save_atomic(path, lambda tmp_path: torch.save(model.state_dict(), tmp_path))
+        del model
+
+    config = transformers.WhisperConfig.from_json_file(str(config_path))
+    with torch.device("meta"):
+        model = transformers.WhisperForConditionalGeneration(config)
+    model.load_state_dict(_load_mapped(path), assign=True)
+    model.tie_weights()
+    # Whisper's generate() needs the language/task token tables from here
+    model.generation_config = transformers.GenerationConfig.from_pretrained(
+        str(generation_config_path.parent), config_file_name=generation_config_path.name
+    )
+    return model.eval()
+
+
+def memory_usage(pid="self"):
+    """Rss/Pss/shared memory of a process in MB (Linux only; empty dict elsewhere)"""
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss", "Shared_Clean", "Private_Dirty"):
+                    usage[key] = round(int(value.split()[0]) / 1024, 1)
+    except OSError as e:
+        print(f"Memory usage unavailable: {e}", file=sys.stderr)
+    return usage
@@ -0,0 +1,183 @@
+"""
+Speculative (assisted) greedy decoding for openai-whisper models.
+
+A small draft model (e.g. tiny) proposes a few tokens autoregressively, and
+the large target model (e.g. medium) scores all of them in a single decoder
+forward pass. The longest prefix the target agrees with is kept, plus the
+target's own next token, so the output is the target's greedy decode; only
+the number of sequential target forward passes goes down.
+
+Hugging Face models get the same from generate(..., assistant_model=draft).
+"""
+import functools
+import os
+
+from decode_cache import CachingWhisper, cached_task_class
+from lazy_imports import lazy_module
+
+torch = lazy_module("torch")
+
+DRAFT_TOKENS = int(os.getenv("WHISPER_DRAFT_TOKENS", "5"))
+
+
+class _CachedCausalMask:
+    """
+    Causal mask for `n` new tokens following `offset` cached ones.
+    MultiHeadAttention slices its mask as mask[:n, :n], which only fits when
+    nothing is cached; this returns the (n, offset + n) mask instead.
+    """
+
+    def __init__(self, mask, offset):
+        self.mask = mask
+        self.offset = offset
+
+    def __getitem__(self, index):
+        n = index[0].stop
+        return self.mask[self.offset:self.offset + n, :self.offset + n]
+
+
+def cache_length(model, kv_cache):
+    """Number of token positions held in a decoder KV cache"""
+    key = model.decoder.blocks[0].attn.key
+    return kv_cache[key].shape[1] if key in kv_cache else 0
+
+
+def trim_cache(model, kv_cache, length):
+    """Drop self-attention entries past `length`; cross-attention entries are per-audio and stay"""
+    for block in model.decoder.blocks:
+        for module in (block.attn.key, block.attn.value):
+            if module in kv_cache:
+                kv_cache[module] = kv_cache[module][:, :length]
+
+
+def decoder_forward(model, tokens, audio_features, kv_cache):
+    """
+    TextDecoder.forward for any number of new tokens on top of a KV cache
+    (the stock forward only supports several tokens when the cache is empty).
+    """
+    decoder = model.decoder
+    offset = cache_length(model, kv_cache)
+    x = decoder.token_embedding(tokens) + decoder.positional_embedding[offset:offset + tokens.shape[-1]]
+    x = x.to(audio_features.dtype)
+
+    mask = _CachedCausalMask(decoder.mask, offset)
+    for block in decoder.blocks:
+        x = block(x, audio_features, mask=mask, kv_cache=kv_cache)
+
+    x = decoder.ln(x)
+    return (x @ torch.transpose(decoder.token_embedding.weight.to(x.dtype), 0, 1)).float()
+
+
+@functools.lru_cache(maxsize=None)
+def _speculative_task_class():
+    class SpeculativeDecodingTask(cached_task_class()):
+        """DecodingTask whose greedy main loop is drafted by a smaller model"""
+
+        def __init__(self, model, draft, options, draft_tokens, cache, hotwords=None):
+            super().__init__(model, options, cache, hotwords)
+            self.draft = draft
+            self.draft_tokens = draft_tokens
+            self.draft_features = None
+
+        def _get_audio_features(self, mel):
+            # Same mel for both models; each encodes it with its own encoder
+            audio_features = super()._get_audio_features(mel)
+            self.draft_features = self._encode(self.draft, mel) if self.mel_key else self.draft.encoder(mel)
+            return audio_features
+
+        def _propose(self, tokens, kv_cache, limit):
+            """Greedy draft of up to `limit` tokens following `tokens`"""
+            proposal = []
+            feed = tokens[:, cache_length(self.draft, kv_cache):]
+            sequence = tokens
+            for _ in range(limit):
+                logits = decoder_forward(self.draft, feed, self.draft_features, kv_cache)[:, -1]
+                for logit_filter in self.logit_filters:
+                    logit_filter.apply(logits, sequence)
+                feed = logits.argmax(dim=-1)[:, None]
+                sequence = torch.cat([sequence, feed], dim=-1)
+                proposal.append(int(feed))
+                if proposal[-1] == self.tokenizer.eot:
+                    break
+            return proposal
+
+        def _main_loop(self, audio_features, tokens):
+            sum_logprobs = torch.zeros(tokens.shape[0], device=audio_features.device)
+            no_speech_probs = [float("nan")]
+            target_cache, target_hooks = self.model.install_kv_cache_hooks()
+            draft_cache, draft_hooks = self.draft.install_kv_cache_hooks()
+            generated = 0
+
+            try:
+                # Both caches always hold every accepted token but the last one
+                # (English-only models start from the start-of-transcript token alone)
+                pending = None
+                if tokens.shape[-1] > 1:
+                    prefill = decoder_forward(self.model, tokens[:, :-1], audio_features, target_cache)
+                    pending = prefill[:, self.sot_index:self.sot_index + 1]
+
+                while generated < self.sample_len:
+                    start = tokens.shape[-1]
+                    limit = min(self.draft_tokens, self.n_ctx - start, self.sample_len - generated - 1)
+                    proposal = self._propose(tokens, draft_cache, limit) if limit > 0 else []
+
+                    chunk = torch.cat([tokens[:, -1:], torch.tensor([proposal], dtype=tokens.dtype)], dim=-1)
+                    logits = decoder_forward(self.model, chunk, audio_features, target_cache)
+
+                    if generated == 0 and self.tokenizer.no_speech is not None:
+                        sot_logits = pending if self.sot_index < start - 1 else logits[:, :1]
+                        probs_at_sot = sot_logits[:, 0].float().softmax(dim=-1)
+                        no_speech_probs = probs_at_sot[:, self.tokenizer.no_speech].tolist()
+
+                    # Accept draft tokens while the target's greedy choice agrees
+                    completed = False
+                    for i in range(len(proposal) + 1):
+                        step_logits = logits[:, i].clone()
+                        for logit_filter in self.logit_filters:
+                            logit_filter.apply(step_logits, tokens)
+                        tokens, completed = self.decoder.update(tokens, step_logits, sum_logprobs)
+                        generated += 1
+                        if completed or tokens.shape[-1] > self.n_ctx or generated >= self.sample_len:
+                            break
+                        if i < len(proposal) and int(tokens[0, -1]) != proposal[i]:
+                            break
+
+                    if completed or tokens.shape[-1] > self.n_ctx:
+                        break
+
+                    accepted = tokens.shape[-1] - 1
+                    trim_cache(self.model, target_cache, accepted)
+                    trim_cache(self.draft, draft_cache, min(cache_length(self.draft, draft_cache), accepted))
+            finally:
+                for hook in target_hooks + draft_hooks:
+                    hook.remove()
+
+            return tokens, sum_logprobs, no_speech_probs
+
+    return SpeculativeDecodingTask
+
+
+class SpeculativeWhisper(CachingWhisper):
+    """
+    Stands in for a Whisper model in transcribe(): greedy (temperature 0)
+    decodes of a single segment are drafted by `draft`; sampling fallbacks
+    and everything else are decoded by the target alone.
+    """
+
+    def __init__(self, model, draft, draft_tokens=DRAFT_TOKENS, cache=None):
+        if draft is model:
+            # Both KV-cache hooks would land on the same modules
+            raise ValueError("Draft model must be a separate model instance")
+        if draft.dims.n_vocab != model.dims.n_vocab or draft.dims.n_mels != model.dims.n_mels:
+            raise ValueError("Draft model must share the target's vocabulary and mel bins")
+        super().__init__(model, cache)
+        self.draft = draft
+        self.draft_tokens = draft_tokens
+
+    def _task(self, mel, options):
+        is_features = mel.shape[-2:] == (self.model.dims.n_audio_ctx, self.model.dims.n_audio_state)
+        if options.temperature == 0 and not is_features:
+            return _speculative_task_class()(
+                self.model, self.draft, options, self.draft_tokens, self.cache, self.hotwords
+            )
+        return super()._task(mel, options)
@@ -1,5 +1,10 @@
 const { spawn } = require('child_process');
 const path = require('path');
+const metrics = require('./metrics');
+const threadScheduler = require('./threadScheduler');
+const zygoteClient = require('./zygoteClient');
+const coalescer = require('./coalescer');
+const { pipeAudio } = require('./childAudio');
 
 // Language mapping for Google Speech Recognition
 const LANGUAGE_MAPPING = {
@@ -8,13 +13,38 @@ const LANGUAGE_MAPPING = {
     'ta': 'ta-IN'
 };
 
-async function recognizeSpeech(audioPath, language = 'en') {
+// The backends recognize_speech.py accepts (BACKENDS in speech_recognition_service.py)
+const BACKENDS = ['google', 'local', 'hybrid'];
+
+// `audio` is a file path or a Buffer with the encoded upload. backend is
+// 'google', 'local' (a resident local engine) or 'hybrid' (both raced against
+// a deadline); it defaults to SPEECH_BACKEND (see speech_recognition_service.py).
+async function runRecognition(audio, language, backend) {
+    // Map the language code to the appropriate format
+    const googleLanguage = LANGUAGE_MAPPING[language] || 'en-US';
+    const effectiveBackend = backend || process.env.SPEECH_BACKEND || 'google';
+    // Only the local engine needs cores; a Google request just waits on the network
+    const lease = effectiveBackend === 'google' ? null : await threadScheduler.acquire('google');
+
+    if (zygoteClient.isReady()) {
+        try {
+            const result = await zygoteClient.recognize('google', audio, { language: googleLanguage, backend: effectiveBackend }, lease, 30000);
+            metrics.observeResult('google', result, lease);
+            return result;
+        } finally {
+            threadScheduler.release(lease);
+        }
+    }
+
     return new Promise((resolve, reject) => {
         const pythonScript = path.join(__dirname, '../python/recognize_speech.py');
-        // Map the language code to the appropriate format
-        const googleLanguage = LANGUAGE_MAPPING[language] || 'en-US';
         
-        const pythonProcess = spawn('python', [pythonScript, audioPath, googleLanguage]);
+        const pythonProcess = spawn('python', [pythonScript, Buffer.isBuffer(audio) ? '-' : audio, googleLanguage, effectiveBackend], {
+            env: { ...process.env, ...(lease ? lease.env : {}) }
+        });
+
+        // Audio held in memory is piped to the script, which reads it from stdin ('-')
+        pipeAudio(pythonProcess, audio);
         
         let outputData = '';
         let errorData = '';
@@ -29,10 +59,12 @@ async function recognizeSpeech(audioPath, language = 'en') {
         });
 
         pythonProcess.on('close', (code) => {
+            threadScheduler.release(lease);
             console.log('Python process exited with code:', code);
             
             try {
                 const result = JSON.parse(outputData);
+                metrics.observeResult('google', result, lease);
                 resolve(result);
             } catch (error) {
                 console.error('Failed to parse Python output:', outputData);
@@ -42,12 +74,19 @@ async function recognizeSpeech(audioPath, language = 'en') {
         });
 
         pythonProcess.on('error', (error) => {
+            threadScheduler.release(lease);
             console.error('Failed to start Python process:', error);
             reject(error);
         });
     });
 }
 
+// Identical requests in flight (or just answered) share one run; see coalescer.js
+function recognizeSpeech(audio, language = 'en', backend = null) {
+    return coalescer.coalesce('google', audio, { language, backend }, () => runRecognition(audio, language, backend));
+}
+
 module.exports = {
+    BACKENDS,
     recognizeSpeech
 };
\ No newline at end of file
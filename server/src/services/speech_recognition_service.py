@@ -1,25 +1,142 @@
-import speech_recognition as sr
+import os
+import queue
+import threading
 import time
+from audio_input import SAMPLE_RATE, load_audio, to_pcm16
+from engines import recognize
+from instrumentation import StageTimer
+from lazy_imports import lazy_module
+from profiling import profiled
 
-def recognize_speech(audio_file_path):
+sr = lazy_module("speech_recognition")
+
+# google: the Google Web Speech API (network); local: a resident engine on
+# this machine; hybrid: both at once, first usable answer within the deadline
+BACKENDS = ("google", "local", "hybrid")
+SPEECH_BACKEND = os.getenv("SPEECH_BACKEND", "google")
+# "whisper" (tiny.en for English) or "vosk"
+SPEECH_LOCAL_ENGINE = os.getenv("SPEECH_LOCAL_ENGINE", "whisper")
+SPEECH_HYBRID_DEADLINE = float(os.getenv("SPEECH_HYBRID_DEADLINE", "5"))
+
+
+def _error(message, start_time, timer=None):
+    result = {
+        "text": "",
+        "error": message,
+        "processingTime": int((time.time() - start_time) * 1000),
+    }
+    if timer is not None:
+        result["stageTimes"] = timer.finish(record=False)
+    return result
+
+
+def recognize_google(audio, language="en-US"):
+    """Google Web Speech API; `audio` as accepted by audio_input.load_audio"""
     start_time = time.time()
+    timer = StageTimer("google")
     recognizer = sr.Recognizer()
-    
+
     try:
-        with sr.AudioFile(audio_file_path) as source:
-            audio = recognizer.record(source)
-            text = recognizer.recognize_google(audio)  # Using Google's speech recognition
-            
-        processing_time = (time.time() - start_time) * 1000  # Convert to milliseconds
-        return {
-            "text": text,
-            "error": None,
-            "processingTime": processing_time
-        }
+        with timer.stage("decode"):
+            audio_data = sr.AudioData(to_pcm16(load_audio(audio)), SAMPLE_RATE, 2)
+        with timer.stage("decoder"):
+            text = recognizer.recognize_google(audio_data, language=language)
+    except sr.UnknownValueError:
+        return _error("Speech Recognition could not understand audio", start_time, timer)
+    except sr.RequestError as e:
+        return _error(f"Could not request results from Speech Recognition service; {str(e)}", start_time, timer)
     except Exception as e:
-        processing_time = (time.time() - start_time) * 1000
-        return {
-            "text": "",
-            "error": str(e),
-            "processingTime": processing_time
-        }
+        return _error(f"Error processing audio: {str(e)}", start_time, timer)
+
+    return {
+        "text": text,
+        "error": None,
+        "processingTime": int((time.time() - start_time) * 1000),
+        "stageTimes": timer.finish(),
+        "backend": "google",
+    }
+
+
+def recognize_local(audio, language="en-US"):
+    """The same query answered by a local engine (models stay resident in the zygote)"""
+    language = language.split("-")[0].lower()
+    if SPEECH_LOCAL_ENGINE == "vosk":
+        if language != "en":
+            return _error(f"The local Vosk model only covers English, not {language}", time.time())
+        result = recognize("vosk", audio)
+    else:
+        result = recognize("whisper", audio, language=language)
+    result.pop("romanized", None)
+    result["backend"] = "local"
+    return result
+
+
+RECOGNIZERS = {"google": recognize_google, "local": recognize_local}
+
+
+def _race_backend(name, recognize_fn, audio, language, answers):
+    try:
+        result = recognize_fn(audio, language)
+    except Exception as e:
+        result = {"text": "", "error": f"{type(e).__name__}: {str(e)}"}
+    answers.put((name, result))
+
+
+def recognize_hybrid(audio, language="en-US", deadline=SPEECH_HYBRID_DEADLINE, backends=RECOGNIZERS):
+    """
+    Run the local and remote backends concurrently and return the first
+    result without an error. A backend that fails doesn't end the race; the
+    other one still gets until the deadline. `backends` lets tests and
+    benchmarks swap in a stub for the Google API.
+    """
+    start_time = time.time()
+    try:
+        # Decode once for both sides
+        audio = load_audio(audio)
+    except Exception as e:
+        return _error(f"Error processing audio: {str(e)}", start_time)
+
+    answers = queue.Queue()
+    for name, recognize_fn in backends.items():
+        # Daemon threads, so the process can exit with the winner's answer
+        # without joining the loser (e.g. a slow network request)
+        threading.Thread(
+            target=_race_backend, args=(name, recognize_fn, audio, language, answers),
+            name=f"hybrid-{name}", daemon=True,
+        ).start()
+
+    pending = list(backends)
+    race = {}
+    errors = []
+    while pending:
+        remaining = deadline - (time.time() - start_time)
+        try:
+            name, result = answers.get(timeout=max(remaining, 0))
+        except queue.Empty:
+            break
+        pending.remove(name)
+        race[name] = {"processingTime": result.get("processingTime"), "error": result.get("error")}
+        if not result.get("error"):
+            for loser in pending:
+                race[loser] = {"processingTime": None, "error": None}
+            result["race"] = race
+            result["processingTime"] = int((time.time() - start_time) * 1000)
+            return result
+        errors.append(f"{name}: {result['error']}")
+
+    for name in pending:
+        race[name] = {"processingTime": None, "error": "Did not finish before the deadline"}
+        errors.append(f"{name}: no answer within {deadline:g}s")
+    result = _error("; ".join(errors), start_time)
+    result["race"] = race
+    return result
+
+
+@profiled
+def recognize_speech(audio, language="en-US", backend=None):
+    backend = backend or SPEECH_BACKEND
+    if backend == "hybrid":
+        return recognize_hybrid(audio, language)
+    if backend not in RECOGNIZERS:
+        return _error(f"Unknown speech backend: {backend} (expected one of {', '.join(BACKENDS)})", time.time())
+    return RECOGNIZERS[backend](audio, language)
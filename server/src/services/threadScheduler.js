@@ -0,0 +1,95 @@
+const os = require('os');
+
+// Mirrors ThreadBudgetScheduler in thread_budget.py for the Python processes
+// spawned by the Node services: every worker gets a slice of the cores sized
+// from the current queue depth, so concurrent requests never oversubscribe
+// the machine.
+const POOL_ENV_VARS = [
+    'OMP_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS'
+];
+
+class ThreadScheduler {
+    constructor(options = {}) {
+        const totalCores = options.totalCores
+            || parseInt(process.env.VOICE_SEARCH_CORES, 10)
+            || os.cpus().length
+            || 1;
+        this.cores = Array.from({ length: totalCores }, (_, i) => i);
+        this.maxWidth = Math.max(1, Math.min(
+            totalCores,
+            options.maxWidth || parseInt(process.env.VOICE_SEARCH_MAX_THREADS, 10) || 8
+        ));
+        this.free = [...this.cores];
+        this.active = new Map();
+        this.waiting = [];
+        this.nextId = 0;
+    }
+
+    acquire(engine = 'default') {
+        return new Promise((resolve) => {
+            this.waiting.push({ engine, resolve, requestedAt: Date.now() });
+            this._dispatch();
+        });
+    }
+
+    release(lease) {
+        if (!lease || !this.active.delete(lease.id)) {
+            return;
+        }
+        this.free.push(...lease.cores);
+        this.free.sort((a, b) => a - b);
+        this._dispatch();
+    }
+
+    _dispatch() {
+        while (this.waiting.length > 0 && this.free.length > 0) {
+            const depth = this.active.size + this.waiting.length;
+            const width = Math.max(1, Math.min(
+                this.maxWidth,
+                Math.floor(this.cores.length / depth),
+                this.free.length
+            ));
+            const { engine, resolve, requestedAt } = this.waiting.shift();
+            const lease = {
+                id: ++this.nextId,
+                engine,
+                threads: width,
+                cores: this.free.splice(0, width),
+                mode: width > 1 ? 'latency' : 'throughput',
+                queuedMs: Date.now() - requestedAt
+            };
+            lease.env = leaseEnv(lease);
+            this.active.set(lease.id, lease);
+            resolve(lease);
+        }
+    }
+
+    snapshot() {
+        return {
+            totalCores: this.cores.length,
+            maxThreadsPerWorker: this.maxWidth,
+            freeCores: this.free.length,
+            queueDepth: this.waiting.length,
+            workers: [...this.active.values()].map(({ engine, threads, cores, mode }) => ({
+                engine, threads, cores, mode
+            }))
+        };
+    }
+}
+
+function leaseEnv(lease) {
+    const env = {
+        VOICE_SEARCH_THREADS: String(lease.threads),
+        VOICE_SEARCH_CPUS: lease.cores.join(',')
+    };
+    POOL_ENV_VARS.forEach(name => {
+        env[name] = String(lease.threads);
+    });
+    return env;
+}
+
+module.exports = new ThreadScheduler();
@@ -0,0 +1,211 @@
+import os
+import sys
+import threading
+
+# Environment variables the parent (Node scheduler or a Python worker pool)
+# uses to hand a worker its slice of the machine.
+THREADS_ENV = "VOICE_SEARCH_THREADS"
+CPUS_ENV = "VOICE_SEARCH_CPUS"
+MAX_THREADS_ENV = "VOICE_SEARCH_MAX_THREADS"
+
+# Libraries that size their own thread pools from the environment at import time
+_POOL_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+)
+
+_applied_layout = None
+
+
+def available_cores():
+    """Return the sorted list of cores this process is allowed to run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def max_threads_per_worker(total=None):
+    """Upper bound on the width of a single worker (wide workers stop scaling past ~8 threads)"""
+    total = total or len(available_cores())
+    try:
+        limit = int(os.getenv(MAX_THREADS_ENV, "8"))
+    except ValueError:
+        limit = 8
+    return max(1, min(total, limit))
+
+
+def plan_layout(queue_depth, cores=None, max_width=None):
+    """
+    Split the cores between workers for the given queue depth.
+
+    A single outstanding request gets one wide worker (latency mode); as the
+    queue grows the cores are split into more, narrower workers until every
+    worker is single-threaded (throughput mode).
+    """
+    cores = list(cores if cores is not None else available_cores())
+    max_width = max_width or max_threads_per_worker(len(cores))
+    depth = max(1, int(queue_depth))
+
+    width = max(1, min(max_width, len(cores) // depth))
+    workers = max(1, len(cores) // width)
+    return [tuple(cores[i * width:(i + 1) * width]) for i in range(workers)]
+
+
+def layout_mode(width):
+    return "latency" if width > 1 else "throughput"
+
+
+def parse_cpu_list(value):
+    """Parse a cpuset string such as "0-3,8,10-11" into a list of core ids"""
+    cores = []
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cores.extend(range(int(start), int(end) + 1))
+        else:
+            cores.append(int(part))
+    return cores
+
+
+def format_cpu_list(cores):
+    return ",".join(str(core) for core in cores)
+
+
+def lease_env(threads, cores=()):
+    """Environment for a child worker that should use `threads` threads on `cores`"""
+    env = {name: str(threads) for name in _POOL_ENV_VARS}
+    env[THREADS_ENV] = str(threads)
+    if cores:
+        env[CPUS_ENV] = format_cpu_list(cores)
+    return env
+
+
+def apply_thread_budget(threads=None, cores=None):
+    """
+    Apply this worker's thread budget to the current process.
+
+    Uses the explicit arguments, falling back to the budget handed down by the
+    parent through the environment and finally to the whole machine. Torch
+    is only configured if it has already been imported, so light engines
+    (Vosk, Google) don't pay for importing it.
+    """
+    global _applied_layout
+
+    if cores is None:
+        cores = parse_cpu_list(os.getenv(CPUS_ENV)) or None
+    if threads is None:
+        try:
+            threads = int(os.getenv(THREADS_ENV, "0")) or None
+        except ValueError:
+            threads = None
+    if threads is None:
+        threads = len(cores) if cores else max_threads_per_worker()
+    threads = max(1, threads)
+
+    pinned = False
+    if cores and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cores)
+            pinned = True
+        except OSError as e:
+            print(f"Could not pin worker to cores {format_cpu_list(cores)}: {e}", file=sys.stderr)
+
+    for name in _POOL_ENV_VARS:
+        os.environ[name] = str(threads)
+
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+        try:
+            # Only allowed before the first inter-op parallel region runs
+            torch.set_num_interop_threads(1 if threads == 1 else 2)
+        except RuntimeError:
+            pass
+
+    _applied_layout = {
+        "threads": threads,
+        "cores": list(cores) if cores else [],
+        "pinned": pinned,
+        "mode": layout_mode(threads),
+    }
+    return _applied_layout
+
+
+def current_layout():
+    """The layout applied by the last apply_thread_budget() call, if any"""
+    return _applied_layout
+
+
+class ThreadBudgetScheduler:
+    """
+    Hands out core sets to concurrent engine workers inside one process
+    (worker pools, batch jobs). Each acquire() sizes its lease from the number
+    of requests currently active or waiting, so the machine is never
+    oversubscribed: the sum of all lease widths never exceeds the core count.
+    """
+
+    def __init__(self, cores=None, max_width=None):
+        self.cores = list(cores if cores is not None else available_cores())
+        self.max_width = max_width or max_threads_per_worker(len(self.cores))
+        self._free = list(self.cores)
+        self._active = {}
+        self._waiting = 0
+        self._next_id = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, engine="default", timeout=None):
+        with self._condition:
+            self._waiting += 1
+            try:
+                if not self._condition.wait_for(lambda: self._free, timeout=timeout):
+                    raise TimeoutError(f"No cores available for {engine} worker")
+                depth = len(self._active) + self._waiting
+                width = max(1, min(self.max_width, len(self.cores) // depth, len(self._free)))
+                cores = tuple(self._free[:width])
+                del self._free[:width]
+            finally:
+                self._waiting -= 1
+
+            self._next_id += 1
+            lease = {
+                "id": self._next_id,
+                "engine": engine,
+                "threads": width,
+                "cores": cores,
+                "mode": layout_mode(width),
+            }
+            self._active[lease["id"]] = lease
+            return lease
+
+    def release(self, lease):
+        with self._condition:
+            if self._active.pop(lease["id"], None) is None:
+                return
+            self._free.extend(lease["cores"])
+            self._free.sort()
+            self._condition.notify_all()
+
+    def snapshot(self):
+        """Current layout, for the metrics endpoint"""
+        with self._condition:
+            return {
+                "totalCores": len(self.cores),
+                "maxThreadsPerWorker": self.max_width,
+                "freeCores": len(self._free),
+                "queueDepth": self._waiting,
+                "workers": [
+                    {
+                        "engine": lease["engine"],
+                        "threads": lease["threads"],
+                        "cores": list(lease["cores"]),
+                        "mode": lease["mode"],
+                    }
+                    for lease in self._active.values()
+                ],
+            }
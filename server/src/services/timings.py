@@ -0,0 +1,111 @@
+"""
+Word/segment timings in one compact schema for every engine:
+
+    "timings": {
+        "segments": [[start, end, "text"], ...],
+        "words": [["word", start, end, probability], ...]
+    }
+
+Times are seconds from the start of the clip (two decimals); probability is
+null when the engine has none. Engines only add it when asked
+(timestamps=True, or --timestamps on the command line).
+"""
+TIMESTAMPS_FLAG = "--timestamps"
+
+
+def pop_timestamps_flag(argv):
+    """Remove --timestamps from a command line; returns (argv, requested)"""
+    requested = TIMESTAMPS_FLAG in argv
+    return [arg for arg in argv if arg != TIMESTAMPS_FLAG], requested
+
+
+def _t(seconds):
+    return round(float(seconds), 2)
+
+
+def _p(probability):
+    return None if probability is None else round(float(probability), 3)
+
+
+def whisper_timings(transcription):
+    """From a whisper transcribe() result (words only if word_timestamps was on)"""
+    segments = transcription.get("segments") or []
+    words = [
+        [word["word"].strip(), _t(word["start"]), _t(word["end"]), _p(word.get("probability"))]
+        for segment in segments
+        for word in segment.get("words") or ()
+    ]
+    return {
+        "segments": [[_t(s["start"]), _t(s["end"]), s["text"].strip()] for s in segments],
+        "words": words,
+    }
+
+
+def vosk_timings(results):
+    """From Vosk Result()/FinalResult() dicts of each utterance, decoded with SetWords(True)"""
+    segments, words = [], []
+    for result in results:
+        utterance = result.get("result") or []
+        if not utterance:
+            continue
+        segments.append([_t(utterance[0]["start"]), _t(utterance[-1]["end"]), result.get("text", "")])
+        words.extend([w["word"], _t(w["start"]), _t(w["end"]), _p(w.get("conf"))] for w in utterance)
+    return {"segments": segments, "words": words}
+
+
+def source_time(seconds, intervals, sr=16000):
+    """
+    Map a time in audio that was cut down to `intervals` (sample ranges of
+    the original, concatenated in order) back to the original clip.
+    """
+    sample = seconds * sr
+    for start, end in intervals:
+        if sample <= end - start:
+            return (start + sample) / sr
+        sample -= end - start
+    return intervals[-1][1] / sr if intervals else seconds
+
+
+def ensure_alignment_heads(model):
+    """
+    Token timestamps come from the cross-attention of generation_config's
+    alignment_heads; fine-tuned checkpoints often ship without them, so fall
+    back to every head in the top half of the decoder (as openai-whisper does).
+    """
+    config = model.generation_config
+    if getattr(config, "alignment_heads", None) is None:
+        layers = model.config.decoder_layers
+        heads = model.config.decoder_attention_heads
+        config.alignment_heads = [[layer, head] for layer in range(layers // 2, layers) for head in range(heads)]
+
+
+def hf_timings(tokenizer, token_ids, token_timestamps, intervals=None, sr=16000):
+    """
+    From a Hugging Face Whisper generate(..., return_token_timestamps=True):
+    token i spans [timestamps[i], timestamps[i + 1]], and a word starts at
+    every token whose text begins with a space. `intervals` maps times back
+    to the original clip when silence was cut out before decoding.
+    """
+    def at(seconds):
+        return _t(source_time(seconds, intervals, sr) if intervals else seconds)
+
+    groups = []  # [token ids, start, end] per word
+    special = set(tokenizer.all_special_ids)
+    ids = [int(t) for t in token_ids]
+    times = [float(t) for t in token_timestamps]
+    for i, token_id in enumerate(ids):
+        if token_id in special:
+            continue
+        end = times[i + 1] if i + 1 < len(times) else times[i]
+        # Byte-level BPE marks a leading space with "Ġ"; decode whole words so
+        # multi-byte (Sinhala/Tamil) characters split across tokens stay intact
+        if not groups or tokenizer.convert_ids_to_tokens(token_id).startswith("Ġ"):
+            groups.append([[token_id], times[i], end])
+        else:
+            groups[-1][0].append(token_id)
+            groups[-1][2] = end
+
+    words = [[tokenizer.decode(group).strip(), at(start), at(end), None] for group, start, end in groups]
+    words = [w for w in words if w[0]]
+    segments = [[words[0][1], words[-1][2], " ".join(w[0] for w in words)]] if words else []
+    return {"segments": segments, "words": words}
@@ -0,0 +1,189 @@
+"""
+Append-only store for the training examples (audio path + corrected text).
+
+The examples used to live in one training_data.json that was rewritten in
+full on every save and parsed in full on every load. They are now rows in a
+SQLite database in WAL mode:
+- adding an example is one INSERT, whatever the size of the store;
+- several worker processes can add examples at once. WAL lets readers run
+  alongside the writer, and writers wait their turn (busy timeout) instead
+  of failing;
+- readers ask for the rows after the last id they have seen, so a resident
+  trainer loads only what is new.
+
+Rows are never updated. Correcting the text of a clip appends a new row, and
+the newest row for an audio path is the one that counts. compact() deletes
+the superseded rows and reclaims the space.
+
+Each row can carry the clip's audio fingerprint (audio_fingerprint.py). A
+clip merged into a near-duplicate example is still appended, with
+duplicate_of naming the example it was merged into, so the weight of that
+example survives a reload.
+
+An existing training_data.json next to the database is imported once, the
+first time the store is opened.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+STORE_NAME = "training_data.db"
+LEGACY_NAME = "training_data.json"
+# How long a writer waits for another process's write to finish
+BUSY_TIMEOUT_MS = int(os.getenv("TRAINING_STORE_BUSY_TIMEOUT_MS", "30000"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS examples (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    audio_path TEXT NOT NULL,
+    actual_text TEXT NOT NULL,
+    added_at REAL NOT NULL,
+    fingerprint BLOB,
+    duplicate_of TEXT
+);
+CREATE INDEX IF NOT EXISTS examples_audio_path ON examples (audio_path, id);
+CREATE INDEX IF NOT EXISTS examples_actual_text ON examples (actual_text);
+"""
+
+
+class TrainingStore:
+    """The training examples under one training directory"""
+
+    def __init__(self, training_dir):
+        self.training_dir = os.fspath(training_dir)
+        self.path = os.path.join(self.training_dir, STORE_NAME)
+        # isolation_level=None: autocommit, transactions are opened explicitly
+        self._db = sqlite3.connect(
+            self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            self._db.execute("PRAGMA journal_mode = WAL")
+            # WAL + NORMAL is still crash-safe; only the last commits before a power loss can be lost
+            self._db.execute("PRAGMA synchronous = NORMAL")
+            self._db.executescript(_SCHEMA)
+            self._add_columns()
+        self._import_legacy()
+
+    def _add_columns(self):
+        # Stores created before fingerprints were kept
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(examples)")}
+        for name, column_type in (("fingerprint", "BLOB"), ("duplicate_of", "TEXT")):
+            if name not in columns:
+                try:
+                    self._db.execute(f"ALTER TABLE examples ADD COLUMN {name} {column_type}")
+                except sqlite3.OperationalError:
+                    # Another worker added it first
+                    pass
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def append(self, audio_path, actual_text, fingerprint=None, duplicate_of=None):
+        """Add one example; returns its row id"""
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO examples (audio_path, actual_text, added_at, fingerprint, duplicate_of) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (os.fspath(audio_path), actual_text, time.time(), fingerprint, duplicate_of),
+            )
+            return cursor.lastrowid
+
+    def examples(self, after_id=0):
+        """
+        [(id, audio_path, actual_text, fingerprint, duplicate_of)] added after
+        `after_id`, oldest first. Rows superseded by a later row for the same
+        audio path are left out.
+        """
+        with self._lock:
+            return self._db.execute(
+                """
+                SELECT id, audio_path, actual_text, fingerprint, duplicate_of FROM examples AS e
+                WHERE id > ? AND NOT EXISTS (
+                    SELECT 1 FROM examples AS later WHERE later.audio_path = e.audio_path AND later.id > e.id
+                )
+                ORDER BY id
+                """,
+                (after_id,),
+            ).fetchall()
+
+    def latest(self, audio_path):
+        """Current text for an audio path, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT actual_text FROM examples WHERE audio_path = ? ORDER BY id DESC LIMIT 1",
+                (os.fspath(audio_path),),
+            ).fetchone()
+        return row[0] if row else None
+
+    def with_text(self, actual_text):
+        """Audio paths whose current text is `actual_text`"""
+        with self._lock:
+            return [row[0] for row in self._db.execute(
+                """
+                SELECT audio_path FROM examples AS e
+                WHERE actual_text = ? AND NOT EXISTS (
+                    SELECT 1 FROM examples AS later WHERE later.audio_path = e.audio_path AND later.id > e.id
+                )
+                ORDER BY id
+                """,
+                (actual_text,),
+            )]
+
+    def compact(self):
+        """Delete superseded rows and reclaim their space; returns how many were removed"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                removed = self._db.execute(
+                    "DELETE FROM examples WHERE id NOT IN (SELECT MAX(id) FROM examples GROUP BY audio_path)"
+                ).rowcount
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            if removed:
+                self._db.execute("VACUUM")
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        logger.debug(f"Compacted {self.path}: {removed} superseded rows removed")
+        return removed
+
+    def checkpoint(self):
+        """Fold the WAL into the database file"""
+        with self._lock:
+            self._db.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(DISTINCT audio_path) FROM examples").fetchone()[0]
+
+    def _import_legacy(self):
+        """One-time import of training_data.json; the file is renamed afterwards"""
+        legacy_path = os.path.join(self.training_dir, LEGACY_NAME)
+        if not os.path.exists(legacy_path):
+            return
+        with open(legacy_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # Another worker may have imported it while this one waited for the lock
+                if os.path.exists(legacy_path):
+                    self._db.executemany(
+                        "INSERT INTO examples (audio_path, actual_text, added_at) VALUES (?, ?, ?)",
+                        [(example["audio_path"], example["actual_text"], now) for example in data],
+                    )
+                    os.replace(legacy_path, f"{legacy_path}.imported")
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        logger.info(f"Imported {len(data)} examples from {legacy_path} into {self.path}")
@@ -1,10 +1,33 @@
 const { spawn } = require('child_process');
 const path = require('path');
+const threadScheduler = require('./threadScheduler');
+const metrics = require('./metrics');
+const zygoteClient = require('./zygoteClient');
+const coalescer = require('./coalescer');
+const { pipeAudio } = require('./childAudio');
+
+// `audio` is a file path or a Buffer with the encoded upload
+const runRecognition = async (audio, timestamps) => {
+  const lease = await threadScheduler.acquire('vosk');
+
+  if (zygoteClient.isReady()) {
+    try {
+      const result = await zygoteClient.recognize('vosk', audio, timestamps ? { timestamps } : {}, lease, 30000);
+      metrics.observeResult('vosk', result, lease);
+      return result;
+    } finally {
+      threadScheduler.release(lease);
+    }
+  }
 
-const recognizeSpeech = (filePath) => {
   return new Promise((resolve, reject) => {
     const scriptPath = path.join(__dirname, 'voskService.py');
-    const process = spawn('python', [scriptPath, filePath]);
+    const process = spawn('python', [scriptPath, Buffer.isBuffer(audio) ? '-' : audio, ...(timestamps ? ['--timestamps'] : [])], {
+      env: { ...global.process.env, ...lease.env }
+    });
+
+    // Audio held in memory is piped to the script, which reads it from stdin ('-')
+    pipeAudio(process, audio);
 
     let stdout = '';
     let stderr = '';
@@ -19,6 +42,7 @@ const recognizeSpeech = (filePath) => {
     });
 
     process.on('close', (code) => {
+      threadScheduler.release(lease);
       console.log('Python process exited with code:', code);
       
       try {
@@ -26,6 +50,7 @@ const recognizeSpeech = (filePath) => {
         const lines = stdout.trim().split('\n');
         const lastLine = lines[lines.length - 1];
         const result = JSON.parse(lastLine);
+        metrics.observeResult('vosk', result, lease);
         resolve(result);
       } catch (error) {
         console.error('Failed to parse Python output:', error);
@@ -36,10 +61,15 @@ const recognizeSpeech = (filePath) => {
     });
 
     process.on('error', (error) => {
+      threadScheduler.release(lease);
       console.error('Failed to start Python process:', error);
       reject(error);
     });
   });
 };
 
+// Identical requests in flight (or just answered) share one run; see coalescer.js
+const recognizeSpeech = (audio, timestamps = false) =>
+  coalescer.coalesce('vosk', audio, { timestamps }, () => runRecognition(audio, timestamps));
+
 module.exports = { recognizeSpeech };
\ No newline at end of file
@@ -1,83 +1,185 @@
 import os
-import wave
 import json
 import time
 import sys
 import logging
-from vosk import Model, KaldiRecognizer
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from vosk import Model, KaldiRecognizer, SetLogLevel
+from thread_budget import apply_thread_budget, available_cores
+from audio_input import SAMPLE_RATE, load_audio, read_audio_arg, to_pcm16, wav_sample_rate
+from catalog_grammar import catalog_grammar
+from model_manifest import artifact_path
+from instrumentation import StageTimer
+from confidence import vosk_confidence
+from timings import pop_timestamps_flag, vosk_timings
+from profiling import profiled
 
 # Configure logging to write to stderr
-logging.basicConfig(level=logging.INFO, stream=sys.stderr, format='%(message)s')
+logging.basicConfig(level=os.getenv('VOSK_LOG_LEVEL', 'WARNING').upper(), stream=sys.stderr, format='%(message)s')
 logger = logging.getLogger(__name__)
 
+# Kaldi logs every model load at INFO; keep it quiet unless we are debugging
+SetLogLevel(0 if logger.isEnabledFor(logging.DEBUG) else -1)
+
+# Model setup_models.py provisions by default
+VOSK_MODEL_NAME = os.getenv('VOSK_MODEL_NAME', 'vosk-model-small-en-us-0.15')
+
 def get_model_path():
     """Get model path from environment variable or use default"""
     env_path = os.getenv('VOSK_MODEL_PATH')
     if env_path:
         return env_path
     
+    # Unpacked by setup_models.py
+    provisioned = artifact_path(f"vosk:{VOSK_MODEL_NAME}")
+    if provisioned:
+        return provisioned
+    
     # Default paths based on environment
     if os.name == 'nt':  # Windows
         return os.path.join(os.path.dirname(__file__), '..', 'models', 'vosk-model-small-en-us')
     else:  # Linux/Mac
         return os.path.join(os.path.dirname(__file__), '../models/vosk-model-small-en-us')
 
-def recognize_speech(audio_file_path):
+# Rates fed to Kaldi as they are; anything else is resampled to 16 kHz
+VOSK_SAMPLE_RATES = (8000, 16000)
+# Audio handed to AcceptWaveform per call
+CHUNK_SECONDS = 0.25
+# "catalog": decode only the titles/artists in search_content (see
+# catalog_grammar.py) instead of the model's full language model
+VOSK_GRAMMAR = os.getenv('VOSK_GRAMMAR', 'off').lower()
+
+# Models are loaded once per process: a Model is thread-safe and shared by
+# every recognizer. Recognizers hold per-stream state, so each request takes
+# one from the pool for its (model, sample rate, grammar) and returns it reset.
+_models = {}
+_model_lock = threading.Lock()
+_recognizers = {}
+_pool_lock = threading.Lock()
+
+def load_model(model_path=None):
+    """Load and cache a Vosk model"""
+    model_path = model_path or get_model_path()
+    with _model_lock:
+        if model_path not in _models:
+            logger.debug(f"Loading model from: {model_path}")
+            _models[model_path] = Model(model_path)
+        return _models[model_path]
+
+@contextmanager
+def pooled_recognizer(model_path, sample_rate, grammar=None):
+    """
+    A KaldiRecognizer (words enabled) for this model and rate, returned to
+    the pool afterwards. `grammar` is a CatalogGrammar to decode against.
+    """
+    version, grammar_json = grammar.current if grammar else (None, None)
+    key = (model_path, sample_rate, version)
+    with _pool_lock:
+        if version:
+            # Recognizers compiled for an older catalog are never handed out again
+            for stale in [k for k in _recognizers if k[:2] == key[:2] and k[2] not in (None, version)]:
+                del _recognizers[stale]
+        pool = _recognizers.setdefault(key, [])
+        rec = pool.pop() if pool else None
+    if rec is None:
+        model = load_model(model_path)
+        rec = KaldiRecognizer(model, sample_rate, grammar_json) if version else KaldiRecognizer(model, sample_rate)
+        rec.SetWords(True)
+    try:
+        yield rec
+    finally:
+        rec.Reset()
+        with _pool_lock:
+            _recognizers.setdefault(key, []).append(rec)
+
+def recognizer_sample_rate(audio):
+    """Decode 8/16 kHz WAV at its own rate; resample everything else to 16 kHz"""
+    rate = wav_sample_rate(audio)
+    return rate if rate in VOSK_SAMPLE_RATES else SAMPLE_RATE
+
+@profiled
+def recognize_speech(audio, timestamps=False, grammar=None):
     start_time = time.time()
-    
+    timer = StageTimer("vosk")
     model_path = get_model_path()
-    logger.info(f"Loading model from: {model_path}")
-    
+    use_catalog = (grammar or VOSK_GRAMMAR) == "catalog"
     
     try:
-        model = Model(model_path)
+        with timer.stage("model_loading"):
+            model = load_model(model_path)
         
-        wf = wave.open(audio_file_path, "rb")
-        if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getframerate() not in [8000, 16000]:
-            raise ValueError("Audio file must be WAV format mono PCM.")
+        catalog = None
+        if use_catalog:
+            # Rebuilt only when search_content has changed
+            with timer.stage("grammar"):
+                catalog = catalog_grammar(model_path, model)
         
-        rec = KaldiRecognizer(model, wf.getframerate())
-        rec.SetWords(True)
+        # Any input format, as mono 16-bit PCM at a rate Kaldi takes
+        with timer.stage("decode"):
+            sample_rate = recognizer_sample_rate(audio)
+            pcm = to_pcm16(load_audio(audio, sample_rate))
         
-        # Process audio in chunks
-        while True:
-            data = wf.readframes(4000)
-            if len(data) == 0:
-                break
-            rec.AcceptWaveform(data)
-        
-        # Get final result
-        result = json.loads(rec.FinalResult())
-        text = result.get("text", "")
+        # Process audio in chunks, keeping every finished utterance (only
+        # reading FinalResult() would drop all but the last one)
+        chunk_bytes = int(sample_rate * CHUNK_SECONDS) * 2
+        utterances = []
+        with pooled_recognizer(model_path, sample_rate, catalog) as rec:
+            with timer.stage("decoder"):
+                for offset in range(0, len(pcm), chunk_bytes):
+                    if rec.AcceptWaveform(pcm[offset:offset + chunk_bytes]):
+                        utterances.append(json.loads(rec.Result()))
+                utterances.append(json.loads(rec.FinalResult()))
+        text = " ".join(u["text"] for u in utterances if u.get("text"))
+        words = [word for u in utterances for word in u.get("result", [])]
         processing_time = int((time.time() - start_time) * 1000)
         
-        # Clean up
-        wf.close()
-        
-        return {
+        result = {
             "text": text,
             "error": None,
-            "processingTime": processing_time
+            "processingTime": processing_time,
+            "stageTimes": timer.finish(),
+            "confidence": vosk_confidence({"result": words})
         }
+        if catalog:
+            result["grammar"] = catalog.version
+            result["catalogMatches"] = catalog.matches(text)
+        if timestamps:
+            result["timings"] = vosk_timings(utterances)
+        return result
     except Exception as e:
         logger.error(f"Error during speech recognition: {str(e)}")
         processing_time = int((time.time() - start_time) * 1000)
         return {
             "text": "",
             "error": str(e),
-            "processingTime": processing_time
+            "processingTime": processing_time,
+            "stageTimes": timer.finish(record=False)
         }
 
+def recognize_many(audios, max_workers=None, timestamps=False):
+    """
+    Recognize several files concurrently on threads sharing one model (Kaldi
+    decodes without holding the GIL); results come back in input order.
+    """
+    max_workers = max_workers or len(available_cores())
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda audio: recognize_speech(audio, timestamps=timestamps), audios))
+
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
+    apply_thread_budget()
+
+    argv, timestamps = pop_timestamps_flag(sys.argv)
+    if len(argv) != 2:
         result = {
             "text": "",
-            "error": "Invalid arguments. Usage: python voskService.py <audio_file_path>",
+            "error": "Invalid arguments. Usage: python voskService.py <audio_file_path|-> [--timestamps]",
             "processingTime": 0
         }
     else:
-        audio_file_path = sys.argv[1]
-        result = recognize_speech(audio_file_path)
+        audio = read_audio_arg(argv[1])
+        result = recognize_speech(audio, timestamps=timestamps)
     
     # Only output the JSON result to stdout
     sys.stdout.write(json.dumps(result) + "\n")
@@ -1,17 +1,63 @@
 const { spawn } = require('child_process');
 const path = require('path');
+const threadScheduler = require('./threadScheduler');
+const metrics = require('./metrics');
+const zygoteClient = require('./zygoteClient');
+const coalescer = require('./coalescer');
+const { pipeAudio } = require('./childAudio');
+
+// `audio` is a file path or a Buffer with the encoded upload (sent to Python
+// as bytes). language 'auto' runs the language-ID router (language_router.py), which
+// picks the cheapest engine that covers the detected language. mode 'cascade'
+// answers from a fast engine first and only escalates to Whisper when that
+// result isn't confident (cascade.py).
+function pythonCommand(audio, language, mode) {
+    const audioArg = Buffer.isBuffer(audio) ? '-' : audio;
+    if (language === 'auto') {
+        return { engine: 'auto', options: {}, script: 'language_router.py', args: [audioArg] };
+    }
+    if (mode === 'cascade') {
+        return { engine: 'cascade', options: { language }, script: 'cascade.py', args: [audioArg, language] };
+    }
+    return { engine: 'whisper', options: { language }, script: 'whisperService.py', args: [audioArg, language] };
+}
+
+// timestamps adds word/segment `timings` to the result (see services/timings.py)
+async function runRecognition(audio, language, mode, timestamps) {
+    const lease = await threadScheduler.acquire('whisper');
+    const command = pythonCommand(audio, language, mode);
+    if (timestamps) {
+        command.options.timestamps = true;
+        command.args.push('--timestamps');
+    }
+
+    if (zygoteClient.isReady()) {
+        try {
+            const result = await zygoteClient.recognize(command.engine, audio, command.options, lease, language === 'en' ? 30000 : 60000);
+            metrics.observeResult('whisper', result, lease);
+            if (result.error) {
+                throw new Error(result.error);
+            }
+            return result;
+        } finally {
+            threadScheduler.release(lease);
+        }
+    }
 
-async function recognizeSpeech(audioPath, language = 'en') {
     return new Promise((resolve, reject) => {
-        const pythonScript = path.join(__dirname, 'whisperService.py');
+        const pythonScript = path.join(__dirname, command.script);
         
         // Spawn Python process with language parameter
-        const pythonProcess = spawn('python', [pythonScript, audioPath, language], {
+        const pythonProcess = spawn('python', [pythonScript, ...command.args], {
             env: {
                 ...process.env,
-                PYTHONIOENCODING: 'utf-8'  // Ensure proper encoding
+                PYTHONIOENCODING: 'utf-8',  // Ensure proper encoding
+                ...lease.env
             }
         });
+
+        // Audio held in memory is piped to the script, which reads it from stdin ('-')
+        pipeAudio(pythonProcess, audio);
         
         let outputData = '';
         let errorData = '';
@@ -27,6 +73,7 @@ async function recognizeSpeech(audioPath, language = 'en') {
         });
 
         pythonProcess.on('close', (code) => {
+            threadScheduler.release(lease);
             console.log('Python process exited with code:', code);
             
             if (code !== 0) {
@@ -37,6 +84,7 @@ async function recognizeSpeech(audioPath, language = 'en') {
             
             try {
                 const result = JSON.parse(outputData);
+                metrics.observeResult('whisper', result, lease);
                 if (result.error) {
                     return reject(new Error(result.error));
                 }
@@ -49,6 +97,7 @@ async function recognizeSpeech(audioPath, language = 'en') {
         });
 
         pythonProcess.on('error', (error) => {
+            threadScheduler.release(lease);
             console.error('Failed to start Python process:', error);
             reject(error);
         });
@@ -71,6 +120,12 @@ async function recognizeSpeech(audioPath, language = 'en') {
     });
 }
 
+// Identical requests in flight (or just answered) share one run; see coalescer.js
+function recognizeSpeech(audio, language = 'en', mode = null, timestamps = false) {
+    return coalescer.coalesce('whisper', audio, { language, mode, timestamps },
+        () => runRecognition(audio, language, mode, timestamps));
+}
+
 module.exports = {
     recognizeSpeech
 };
\ No newline at end of file
@@ -1,19 +1,35 @@
-import whisper
 import time
 import sys
 import json
 import os
 import logging
-import torch
-from pathlib import Path
+from thread_budget import apply_thread_budget
+from audio_input import check_audio, describe, load_audio, read_audio_arg
+from instrumentation import StageTimer
+from confidence import whisper_confidence
+from decode_cache import CachingWhisper
+from hotwords import hotwords_enabled, whisper_trie
+from onnx_whisper import load_onnx_model
+from profiling import profiled
+from lazy_imports import lazy_module
+from model_manifest import whisper_download_root
+from shared_weights import shared_weights_enabled, load_whisper
+from speculative import SpeculativeWhisper
+from timings import pop_timestamps_flag, whisper_timings
+
+# Imported on first use so argument/file errors return without loading torch
+whisper = lazy_module("whisper")
+
+# Per-request detail lives in the result's stageTimes; only warnings are logged
+# by default. Set WHISPER_LOG_LEVEL=DEBUG / WHISPER_LOG_FILE to get more.
+_log_handlers = [logging.StreamHandler(sys.stderr)]
+if os.getenv('WHISPER_LOG_FILE'):
+    _log_handlers.append(logging.FileHandler(os.getenv('WHISPER_LOG_FILE')))
 
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv('WHISPER_LOG_LEVEL', 'WARNING').upper(),
     format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stderr),
-        logging.FileHandler('whisper_service.log')
-    ]
+    handlers=_log_handlers
 )
 
 logger = logging.getLogger(__name__)
@@ -21,11 +37,23 @@ logger = logging.getLogger(__name__)
 # Cache for loaded models
 _models = {}
 
+# "pytorch" (eager) or "onnx" (ONNX Runtime; threads from WHISPER_ONNX_THREADS
+# or the worker's thread budget)
+WHISPER_BACKEND = os.getenv('WHISPER_BACKEND', 'pytorch').lower()
+
 def load_model(model_size, device="cpu"):
     """Load and cache a model"""
     if model_size not in _models:
         logger.info(f"Loading {model_size} model...")
-        _models[model_size] = whisper.load_model(model_size, device=device)
+        # Provisioned by setup_models.py: load from there without checking for a download
+        download_root = whisper_download_root(model_size)
+        if shared_weights_enabled() and device == "cpu":
+            # Weights mapped from a shared file, so N workers hold one copy
+            _models[model_size] = load_whisper(
+                model_size, lambda: whisper.load_model(model_size, device=device, download_root=download_root)
+            )
+        else:
+            _models[model_size] = whisper.load_model(model_size, device=device, download_root=download_root)
         logger.info(f"{model_size} model loaded successfully")
     return _models[model_size]
 
@@ -33,11 +61,22 @@ def get_model(language):
     """Get appropriate model based on language"""
     if language == "en":
         model_size = "tiny.en"  # Use the English-specific model for English
-        logger.info("Using English-specific tiny model")
     else:
         model_size = "medium"  # Use medium model for other languages
-        logger.info(f"Using medium model for {language}")
-    return load_model(model_size)
+    if WHISPER_BACKEND == "onnx":
+        # Exported on first use to model_cache/onnx/<size> (see python/export_onnx.py)
+        return load_onnx_model(model_size, lambda: load_model(model_size))
+
+    model = load_model(model_size)
+
+    # WHISPER_DRAFT_MODEL=tiny: a small multilingual model drafts tokens for
+    # medium to verify (same output as greedy medium, fewer decoder passes)
+    draft_size = os.getenv("WHISPER_DRAFT_MODEL")
+    if draft_size and model_size != "tiny.en" and draft_size != model_size:
+        return SpeculativeWhisper(model, load_model(draft_size))
+    # A fresh wrapper per request: both passes and any temperature fallbacks
+    # share one encoder run and the romanization prompt's prefill
+    return CachingWhisper(model)
 
 def get_romanization_prompt(language):
     prompts = {
@@ -62,34 +101,44 @@ def get_romanization_prompt(language):
     }
     return prompts.get(language, "Transcribe speech using English letters only")
 
-def recognize_speech(audio_file_path, language='en'):
+@profiled
+def recognize_speech(audio, language='en', timestamps=False):
     start_time = time.time()
-    logger = logging.getLogger(__name__)
+    timer = StageTimer("whisper")
+    model_name = "tiny.en" if language == "en" else "medium"
     
     try:
-        logger.info(f"Starting transcription for file: {audio_file_path}")
-        logger.info(f"Selected language: {language}")
+        logger.debug(f"Starting {language} transcription for: {describe(audio)}")
         
-        if not Path(audio_file_path).is_file():
-            raise FileNotFoundError(f"Audio file not found: {audio_file_path}")
+        check_audio(audio)
             
-        model = get_model(language)
-        model_name = "tiny.en" if language == "en" else "medium"
-        logger.info(f"Using {model_name} model")
+        with timer.stage("model_loading"):
+            model = get_model(language)
+        
+        # Decode once; both passes below reuse the samples
+        with timer.stage("decode"):
+            audio = load_audio(audio)
+        
+        # Catalog names are in Latin script, so only passes that write English
+        # letters (English, romanization) are biased toward them
+        hotwords = None
+        if hotwords_enabled():
+            with timer.stage("hotwords"):
+                hotwords = whisper_trie(model)
         
         if language in ['si', 'ta']:
             # First pass: Get native language transcription
-            logger.info(f"Performing {language} transcription")
-            native_result = model.transcribe(
-                audio_file_path,
-                language=language,
-                task="transcribe",
-                fp16=False
-            )
+            with timer.model_stage(model.encoder):
+                native_result = model.transcribe(
+                    audio,
+                    language=language,
+                    task="transcribe",
+                    fp16=False,
+                    word_timestamps=timestamps
+                )
             logger.debug(f"Native transcription result: {native_result['text']}")
             
             # Second pass: Get romanized version
-            logger.info("Performing romanization")
             romanization_options = {
                 'language': 'en',
                 'task': 'transcribe',
@@ -98,10 +147,12 @@ def recognize_speech(audio_file_path, language='en'):
                 'suppress_tokens': []
             }
             
-            romanized_result = model.transcribe(
-                audio_file_path,
-                **romanization_options
-            )
+            with timer.stage("romanization"):
+                romanized_result = model.transcribe(
+                    audio,
+                    hotwords=hotwords,
+                    **romanization_options
+                )
             
             # Clean and validate romanized text
             romanized_text = romanized_result["text"].strip()
@@ -118,28 +169,38 @@ def recognize_speech(audio_file_path, language='en'):
                 "romanized": romanized_text,
                 "error": None,
                 "processingTime": int((time.time() - start_time) * 1000),
+                "stageTimes": timer.finish(),
+                "confidence": whisper_confidence(native_result),
                 "model": model_name
             }
+            if timestamps:
+                result["timings"] = whisper_timings(native_result)
             
         else:
             # Handle English and other languages
-            logger.info(f"Performing transcription for {language}")
-            transcription = model.transcribe(
-                audio_file_path,
-                language=language,
-                task="transcribe",
-                fp16=False
-            )
+            with timer.model_stage(model.encoder):
+                transcription = model.transcribe(
+                    audio,
+                    language=language,
+                    task="transcribe",
+                    fp16=False,
+                    word_timestamps=timestamps,
+                    hotwords=hotwords if language == 'en' else None
+                )
             
             result = {
                 "text": transcription["text"].strip(),
                 "romanized": transcription["text"].strip(),
                 "error": None,
                 "processingTime": int((time.time() - start_time) * 1000),
+                "stageTimes": timer.finish(),
+                "confidence": whisper_confidence(transcription),
                 "model": model_name
             }
+            if timestamps:
+                result["timings"] = whisper_timings(transcription)
         
-        logger.info(f"Transcription completed successfully in {result['processingTime']}ms")
+        logger.debug(f"Transcription completed in {result['processingTime']}ms")
         return result
         
     except Exception as e:
@@ -149,17 +210,21 @@ def recognize_speech(audio_file_path, language='en'):
             "romanized": "",
             "error": str(e),
             "processingTime": int((time.time() - start_time) * 1000),
-            "model": "tiny.en" if language == "en" else "medium"
+            "stageTimes": timer.finish(record=False),
+            "model": model_name
         }
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
+    apply_thread_budget()
+
+    argv, timestamps = pop_timestamps_flag(sys.argv)
+    if len(argv) < 2:
         print(json.dumps({
-            "error": "Invalid arguments. Usage: python whisperService.py <audio_file_path> [language]"
+            "error": "Invalid arguments. Usage: python whisperService.py <audio_file_path|-> [language] [--timestamps]"
         }))
         sys.exit(1)
     
-    audio_file_path = sys.argv[1]
-    language = sys.argv[2] if len(sys.argv) > 2 else 'en'
-    result = recognize_speech(audio_file_path, language)
+    audio = read_audio_arg(argv[1])
+    language = argv[2] if len(argv) > 2 else 'en'
+    result = recognize_speech(audio, language, timestamps=timestamps)
     print(json.dumps(result, ensure_ascii=False))
\ No newline at end of file
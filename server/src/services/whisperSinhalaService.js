@@ -1,16 +1,41 @@
 const { spawn } = require('child_process');
 const path = require('path');
+const threadScheduler = require('./threadScheduler');
+const metrics = require('./metrics');
+const zygoteClient = require('./zygoteClient');
+const coalescer = require('./coalescer');
+const { pipeAudio } = require('./childAudio');
+
+// `audio` is a file path or a Buffer with the encoded upload
+async function runRecognition(audio, timestamps) {
+    const lease = await threadScheduler.acquire('whisper-sinhala');
+
+    if (zygoteClient.isReady()) {
+        try {
+            const result = await zygoteClient.recognize('whisper-sinhala', audio, timestamps ? { timestamps } : {}, lease, 30000);
+            metrics.observeResult('whisper-sinhala', result, lease);
+            if (result.error) {
+                throw new Error(result.error);
+            }
+            return result;
+        } finally {
+            threadScheduler.release(lease);
+        }
+    }
 
-async function recognizeSpeech(audioPath) {
     return new Promise((resolve, reject) => {
         const pythonScript = path.join(__dirname, 'whisperSinhalaService.py');
         
-        const pythonProcess = spawn('python', [pythonScript, audioPath], {
+        const pythonProcess = spawn('python', [pythonScript, Buffer.isBuffer(audio) ? '-' : audio, ...(timestamps ? ['--timestamps'] : [])], {
             env: {
                 ...process.env,
-                PYTHONIOENCODING: 'utf-8'
+                PYTHONIOENCODING: 'utf-8',
+                ...lease.env
             }
         });
+
+        // Audio held in memory is piped to the script, which reads it from stdin ('-')
+        pipeAudio(pythonProcess, audio);
         
         let outputData = '';
         let errorData = '';
@@ -26,6 +51,7 @@ async function recognizeSpeech(audioPath) {
         });
 
         pythonProcess.on('close', (code) => {
+            threadScheduler.release(lease);
             console.log('Sinhala model process exited with code:', code);
             
             if (code !== 0) {
@@ -36,6 +62,7 @@ async function recognizeSpeech(audioPath) {
             
             try {
                 const result = JSON.parse(outputData);
+                metrics.observeResult('whisper-sinhala', result, lease);
                 if (result.error) {
                     return reject(new Error(result.error));
                 }
@@ -48,6 +75,7 @@ async function recognizeSpeech(audioPath) {
         });
 
         pythonProcess.on('error', (error) => {
+            threadScheduler.release(lease);
             console.error('Failed to start Python process:', error);
             reject(error);
         });
@@ -63,6 +91,11 @@ async function recognizeSpeech(audioPath) {
     });
 }
 
+// Identical requests in flight (or just answered) share one run; see coalescer.js
+function recognizeSpeech(audio, timestamps = false) {
+    return coalescer.coalesce('whisper-sinhala', audio, { timestamps }, () => runRecognition(audio, timestamps));
+}
+
 module.exports = {
     recognizeSpeech
 };
@@ -3,15 +3,33 @@ import time
 import sys
 import json
 import os
-from pathlib import Path
-from transformers import WhisperForConditionalGeneration, WhisperProcessor
-import torch
-import librosa
-import numpy as np
+from thread_budget import apply_thread_budget
+from audio_input import check_audio, load_audio, read_audio_arg
+from instrumentation import StageTimer
+from confidence import hf_confidence
+from encoder_context import audio_context_enabled, context_frames, hf_encoder_outputs
+from hotwords import hf_logits_processor, hf_trie, hotwords_enabled
+from profiling import profiled
+from timings import ensure_alignment_heads, hf_timings, pop_timestamps_flag
+from lazy_imports import lazy_module
+from model_manifest import hf_model_source
+from shared_weights import shared_weights_enabled, load_hf_whisper
+
+transformers = lazy_module("transformers")
+torch = lazy_module("torch")
+librosa = lazy_module("librosa")
+np = lazy_module("numpy")
+
+SINHALA_MODEL_ID = os.getenv("SINHALA_MODEL_ID", "Ransaka/whisper-tiny-sinhala-20k")
+# Optional smaller model (same tokenizer) that drafts tokens for SINHALA_MODEL_ID
+# to verify via assisted generation; only worth it when the main model is larger.
+SINHALA_DRAFT_MODEL_ID = os.getenv("SINHALA_DRAFT_MODEL_ID")
+SINHALA_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'model_cache', 'sinhala')
 
 class WhisperSinhalaModel:
     _instance = None
     _model = None
+    _draft_model = None
     _processor = None
     _is_initialized = False
     # _model_path = os.path.join(os.path.dirname(__file__), 'model_cache', 'sinhala')
@@ -34,38 +52,50 @@ class WhisperSinhalaModel:
                 return
                 
             print("Loading Sinhala model...", file=sys.stderr)
-            model_id = "Ransaka/whisper-tiny-sinhala-20k"
-            cache_dir = os.path.join(os.path.dirname(__file__), 'model_cache', 'sinhala')
+            model_id = SINHALA_MODEL_ID
+            cache_dir = SINHALA_CACHE_DIR
             
             os.makedirs(cache_dir, exist_ok=True)
             
-            # Performance optimizations
-            torch.set_num_threads(4)
-            torch.set_num_interop_threads(4)
-            
             # Load processor and model only if not already loaded
             if WhisperSinhalaModel._processor is None:
-                WhisperSinhalaModel._processor = WhisperProcessor.from_pretrained(
-                    model_id,
+                WhisperSinhalaModel._processor = transformers.WhisperProcessor.from_pretrained(
+                    hf_model_source(model_id),
                     cache_dir=cache_dir
                 )
             
             if WhisperSinhalaModel._model is None:
-                WhisperSinhalaModel._model = WhisperForConditionalGeneration.from_pretrained(
-                    model_id,
-                    cache_dir=cache_dir,
-                    torch_dtype=torch.float32,
-                    low_cpu_mem_usage=True
-                ).to('cpu').eval()
+                WhisperSinhalaModel._model = self._load_hf_model(model_id, cache_dir)
+            
+            if SINHALA_DRAFT_MODEL_ID and WhisperSinhalaModel._draft_model is None:
+                WhisperSinhalaModel._draft_model = self._load_hf_model(SINHALA_DRAFT_MODEL_ID, cache_dir)
             
             print("Model loaded successfully", file=sys.stderr)
         except Exception as e:
             print(f"Error loading model: {str(e)}", file=sys.stderr)
             raise
 
+    @staticmethod
+    def _load_hf_model(model_id, cache_dir):
+        def load_private():
+            return transformers.WhisperForConditionalGeneration.from_pretrained(
+                hf_model_source(model_id),
+                cache_dir=cache_dir,
+                torch_dtype=torch.float32,
+                low_cpu_mem_usage=True
+            ).to('cpu').eval()
+        
+        if shared_weights_enabled():
+            # Weights mapped from a shared file, so N workers hold one copy
+            return load_hf_whisper(model_id, load_private)
+        return load_private()
+
     def get_model_and_processor(self):
         return WhisperSinhalaModel._model, WhisperSinhalaModel._processor
 
+    def get_draft_model(self):
+        return WhisperSinhalaModel._draft_model
+
 def romanize_sinhala(text):
     """Improved Sinhala to English romanization"""
     sinhala_to_roman = {
@@ -162,13 +192,16 @@ def romanize_sinhala(text):
     
     return ' '.join(word.capitalize() for word in result.split())
 
-def preprocess_audio(audio_input, sr=16000):
+def preprocess_audio(audio_input, sr=16000, return_intervals=False):
     """
-    Optimize audio for Sinhala speech recognition
+    Optimize audio for Sinhala speech recognition. With return_intervals, also
+    returns the (start, end) sample ranges of audio_input that were kept.
     """
+    kept = [(0, len(audio_input))]
     try:
         # Trim silence
-        audio_trimmed, _ = librosa.effects.trim(audio_input, top_db=20)
+        audio_trimmed, trim_index = librosa.effects.trim(audio_input, top_db=20)
+        kept = [(int(trim_index[0]), int(trim_index[1]))]
         
         # Normalize audio
         audio_normalized = librosa.util.normalize(audio_trimmed)
@@ -182,81 +215,93 @@ def preprocess_audio(audio_input, sr=16000):
         # Concatenate voice segments if any were found
         if audio_parts:
             audio_processed = np.concatenate(audio_parts)
+            kept = [(kept[0][0] + int(start), kept[0][0] + int(end)) for start, end in intervals]
         else:
             audio_processed = audio_normalized
             
-        return audio_processed
+        return (audio_processed, kept) if return_intervals else audio_processed
     except Exception as e:
         print(f"Audio preprocessing warning: {str(e)}", file=sys.stderr)
-        return audio_input  # Return original audio if preprocessing fails
+        # Return original audio if preprocessing fails
+        return (audio_input, [(0, len(audio_input))]) if return_intervals else audio_input
 
-def recognize_speech(audio_file_path):
+@profiled
+def recognize_speech(audio, timestamps=False):
     total_start_time = time.time()
-    stage_times = {}
+    timer = StageTimer("whisper-sinhala")
     
     try:
-        if not Path(audio_file_path).is_file():
-            raise FileNotFoundError(f"Audio file not found: {audio_file_path}")
+        check_audio(audio)
         
-        # Model loading time
-        model_start = time.time()
-        sinhala_model = WhisperSinhalaModel.get_instance()
-        model, processor = sinhala_model.get_model_and_processor()
-        stage_times['model_loading'] = int((time.time() - model_start) * 1000)
-        print(f"Model loading time: {stage_times['model_loading']}ms", file=sys.stderr)
+        with timer.stage("model_loading"):
+            sinhala_model = WhisperSinhalaModel.get_instance()
+            model, processor = sinhala_model.get_model_and_processor()
+            draft_model = sinhala_model.get_draft_model()
         
-        # Audio loading and preprocessing time
-        audio_start = time.time()
-        audio_input, sr = librosa.load(audio_file_path, sr=16000)
-        audio_processed = preprocess_audio(audio_input)
-        stage_times['audio_processing'] = int((time.time() - audio_start) * 1000)
-        print(f"Audio processing time: {stage_times['audio_processing']}ms", file=sys.stderr)
+        with timer.stage("decode"):
+            audio_input = load_audio(audio)
         
-        # Feature extraction time
-        feature_start = time.time()
-        input_features = processor(
-            audio_processed, 
-            sampling_rate=16000, 
-            return_tensors="pt"
-        ).input_features
-        stage_times['feature_extraction'] = int((time.time() - feature_start) * 1000)
-        print(f"Feature extraction time: {stage_times['feature_extraction']}ms", file=sys.stderr)
+        with timer.stage("preprocessing"):
+            audio_processed, kept_intervals = preprocess_audio(audio_input, return_intervals=True)
         
-        # Inference time
-        inference_start = time.time()
-        with torch.no_grad():
-            predicted_ids = model.generate(input_features)
-        stage_times['inference'] = int((time.time() - inference_start) * 1000)
-        print(f"Inference time: {stage_times['inference']}ms", file=sys.stderr)
+        with timer.stage("features"):
+            features = processor(
+                audio_processed, 
+                sampling_rate=16000, 
+                return_tensors="pt",
+                return_attention_mask=timestamps
+            )
+            input_features = features.input_features
         
-        # Decoding time
-        decode_start = time.time()
-        transcription = processor.batch_decode(
-            predicted_ids, 
-            skip_special_tokens=True
-        )[0]
-        stage_times['decoding'] = int((time.time() - decode_start) * 1000)
-        print(f"Decoding time: {stage_times['decoding']}ms", file=sys.stderr)
+        generate_options = {}
+        if draft_model is not None:
+            # Keeps the greedy output and cuts sequential decoder passes. Only
+            # passed when set: Whisper's generate() dereferences it otherwise.
+            generate_options["assistant_model"] = draft_model
+        if hotwords_enabled():
+            # Helps with whatever catalog names are written in the script this model outputs
+            with timer.stage("hotwords"):
+                trie = hf_trie(SINHALA_MODEL_ID, processor.tokenizer)
+                generate_options["logits_processor"] = hf_logits_processor(trie)
+        if timestamps:
+            # Aligned from the cross-attention of this same generate() call
+            ensure_alignment_heads(model)
+            generate_options["return_token_timestamps"] = True
+            # Lets the alignment ignore the padding after the end of the clip
+            generate_options["attention_mask"] = features.attention_mask
         
-        # Romanization time
-        roman_start = time.time()
-        romanized = romanize_sinhala(transcription)
-        stage_times['romanization'] = int((time.time() - roman_start) * 1000)
-        print(f"Romanization time: {stage_times['romanization']}ms", file=sys.stderr)
+        generate_inputs = {"input_features": input_features}
+        # Assisted generation encodes the features again for the draft, so it stays at 30 s
+        if audio_context_enabled() and draft_model is None:
+            with timer.stage("encoder"):
+                n_frames = context_frames(len(audio_processed))
+                generate_inputs = {"encoder_outputs": hf_encoder_outputs(model, input_features, n_frames)}
         
+        with timer.model_stage(model.get_encoder()), torch.no_grad():
+            outputs = model.generate(
+                **generate_inputs,
+                return_dict_in_generate=True,
+                output_scores=True,
+                **generate_options
+            )
+            # A plain dict when token timestamps are returned, so index by key
+            predicted_ids = outputs["sequences"]
+        
+        with timer.stage("decoder"):
+            transcription = processor.batch_decode(
+                predicted_ids, 
+                skip_special_tokens=True
+            )[0]
+        
+        with timer.stage("romanization"):
+            romanized = romanize_sinhala(transcription)
+        
+        stage_times = timer.finish()
         total_time = int((time.time() - total_start_time) * 1000)
-        voice_to_text_time = (
-            stage_times['model_loading'] +
-            stage_times['audio_processing'] +
-            stage_times['feature_extraction'] +
-            stage_times['inference'] +
-            stage_times['decoding']
+        voice_to_text_time = sum(
+            elapsed for stage, elapsed in stage_times.items() if stage != 'romanization'
         )
         
-        print(f"\nTotal processing time: {total_time}ms", file=sys.stderr)
-        print(f"Voice to text time: {voice_to_text_time}ms", file=sys.stderr)
-        print(f"Romanization time: {stage_times['romanization']}ms", file=sys.stderr)
-        
         result = {
             "text": transcription.strip(),
             "romanized": romanized.strip(),
@@ -265,8 +310,16 @@ def recognize_speech(audio_file_path):
             "stageTimes": stage_times,
             "voiceToTextTime": voice_to_text_time,
             "romanizationTime": stage_times['romanization'],
+            "confidence": hf_confidence(model, outputs),
             "model": "whisper-tiny-sinhala-CPU"
         }
+        if timestamps:
+            result["timings"] = hf_timings(
+                processor.tokenizer,
+                predicted_ids[0],
+                outputs["token_timestamps"][0],
+                kept_intervals
+            )
         
         return result
         
@@ -280,17 +333,21 @@ def recognize_speech(audio_file_path):
             "romanized": "",
             "error": error_message,
             "processingTime": total_time,
-            "stageTimes": stage_times,
+            "stageTimes": timer.finish(record=False),
             "model": "whisper-tiny-sinhala-CPU"
         }
 
 if __name__ == "__main__":
+    # Size torch's thread pools from the budget the scheduler gave this worker
+    apply_thread_budget()
+
     try:
-        if len(sys.argv) != 2:
-            raise ValueError("Invalid arguments. Usage: python whisperSinhalaService.py <audio_file_path>")
+        argv, timestamps = pop_timestamps_flag(sys.argv)
+        if len(argv) != 2:
+            raise ValueError("Invalid arguments. Usage: python whisperSinhalaService.py <audio_file_path|-> [--timestamps]")
         
-        audio_file_path = sys.argv[1]
-        result = recognize_speech(audio_file_path)
+        audio = read_audio_arg(argv[1])
+        result = recognize_speech(audio, timestamps=timestamps)
         
         print(json.dumps(result, ensure_ascii=False))
         
@@ -1,9 +1,96 @@
-import whisper
 import time
 import sys
 import json
 import os
-from pathlib import Path
+from thread_budget import apply_thread_budget
+from audio_input import check_audio, load_audio, read_audio_arg
+from instrumentation import StageTimer
+from confidence import hf_confidence, whisper_confidence
+from encoder_context import audio_context_enabled, context_frames, hf_encoder_outputs
+from hotwords import hf_logits_processor, hf_trie, hotwords_enabled, whisper_trie
+from decode_cache import CachingWhisper
+from profiling import profiled
+from timings import ensure_alignment_heads, hf_timings, pop_timestamps_flag, whisper_timings
+from lazy_imports import lazy_module
+from model_manifest import hf_model_source
+from shared_weights import shared_weights_enabled, load_hf_whisper
+
+transformers = lazy_module("transformers")
+torch = lazy_module("torch")
+
+# "base": openai-whisper base, one transcribe pass with the romanization
+# prompt. "hf": the Tamil fine-tuned checkpoint that setup_models.py caches.
+TAMIL_BACKEND = os.getenv("TAMIL_BACKEND", "base").lower()
+TAMIL_MODEL_ID = os.getenv("TAMIL_MODEL_ID", "vasista22/whisper-tamil-medium")
+TAMIL_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'model_cache', 'tamil')
+MODEL_NAMES = {"base": "whisper-base-tamil", "hf": "whisper-tamil-medium"}
+
+ROMANIZATION_PROMPT = (
+    "You must write everything in English letters only. "
+    "IMPORTANT: Do not use Tamil script at all. "
+    "Use only Latin alphabet (a-z) for sounds. "
+    "Examples: "
+    "வணக்கம் = vanakkam, "
+    "நன்றி = nandri"
+)
+
+class WhisperTamilModel:
+    _instance = None
+    _model = None
+    _processor = None
+    _backend = None
+    
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+    
+    def __init__(self):
+        if WhisperTamilModel._model is None:
+            self._load_model()
+    
+    def _load_model(self):
+        backend = TAMIL_BACKEND
+        if backend not in MODEL_NAMES:
+            raise ValueError(f"Unknown TAMIL_BACKEND: {backend} (expected base or hf)")
+        
+        print(f"Loading Tamil model ({backend})...", file=sys.stderr)
+        if backend == "hf":
+            os.makedirs(TAMIL_CACHE_DIR, exist_ok=True)
+            WhisperTamilModel._processor = transformers.WhisperProcessor.from_pretrained(
+                hf_model_source(TAMIL_MODEL_ID),
+                cache_dir=TAMIL_CACHE_DIR
+            )
+            WhisperTamilModel._model = self._load_hf_model(TAMIL_MODEL_ID, TAMIL_CACHE_DIR)
+        else:
+            # Same cache (and shared weights) as the whisper engine's base model
+            from whisperService import load_model
+            WhisperTamilModel._model = load_model("base")
+        WhisperTamilModel._backend = backend
+        print("Model loaded successfully", file=sys.stderr)
+
+    @staticmethod
+    def _load_hf_model(model_id, cache_dir):
+        def load_private():
+            return transformers.WhisperForConditionalGeneration.from_pretrained(
+                hf_model_source(model_id),
+                cache_dir=cache_dir,
+                torch_dtype=torch.float32,
+                low_cpu_mem_usage=True
+            ).to('cpu').eval()
+        
+        if shared_weights_enabled():
+            # Weights mapped from a shared file, so N workers hold one copy
+            return load_hf_whisper(model_id, load_private)
+        return load_private()
+
+    @property
+    def backend(self):
+        return WhisperTamilModel._backend
+
+    def get_model_and_processor(self):
+        return WhisperTamilModel._model, WhisperTamilModel._processor
 
 def romanize_tamil(text):
     """Convert Tamil text to romanized form using custom mapping"""
@@ -51,61 +138,113 @@ def romanize_tamil(text):
     
     return romanized
 
-def recognize_speech(audio_file_path):
+def transcribe_base(model, audio, timer, timestamps):
+    """One pass of openai-whisper base with the romanization prompt"""
+    # Per-request encoder/prefill reuse across temperature fallbacks
+    model = CachingWhisper(model)
+    hotwords = None
+    if hotwords_enabled():
+        with timer.stage("hotwords"):
+            hotwords = whisper_trie(model)
+    with timer.model_stage(model.encoder):
+        transcription = model.transcribe(
+            audio,
+            language="ta",
+            task="transcribe",
+            fp16=False,
+            word_timestamps=timestamps,
+            initial_prompt=ROMANIZATION_PROMPT,
+            hotwords=hotwords
+        )
+    result = {
+        "text": transcription["text"].strip(),
+        "confidence": whisper_confidence(transcription)
+    }
+    if timestamps:
+        result["timings"] = whisper_timings(transcription)
+    return result
+
+def transcribe_hf(model, processor, audio, timer, timestamps):
+    """The Tamil fine-tuned checkpoint, decoding Tamil script"""
+    with timer.stage("features"):
+        features = processor(
+            audio,
+            sampling_rate=16000,
+            return_tensors="pt",
+            return_attention_mask=timestamps
+        )
+    
+    generate_options = {}
+    if hotwords_enabled():
+        with timer.stage("hotwords"):
+            generate_options["logits_processor"] = hf_logits_processor(hf_trie(TAMIL_MODEL_ID, processor.tokenizer))
+    if timestamps:
+        ensure_alignment_heads(model)
+        generate_options["return_token_timestamps"] = True
+        generate_options["attention_mask"] = features.attention_mask
+    
+    generate_inputs = {"input_features": features.input_features}
+    if audio_context_enabled():
+        with timer.stage("encoder"):
+            n_frames = context_frames(len(audio))
+            generate_inputs = {"encoder_outputs": hf_encoder_outputs(model, features.input_features, n_frames)}
+    
+    with timer.model_stage(model.get_encoder()), torch.no_grad():
+        outputs = model.generate(
+            **generate_inputs,
+            language="ta",
+            task="transcribe",
+            return_dict_in_generate=True,
+            output_scores=True,
+            **generate_options
+        )
+    predicted_ids = outputs["sequences"]
+    
+    with timer.stage("decoder"):
+        text = processor.batch_decode(predicted_ids, skip_special_tokens=True)[0]
+    result = {
+        "text": text.strip(),
+        "confidence": hf_confidence(model, outputs)
+    }
+    if timestamps:
+        result["timings"] = hf_timings(processor.tokenizer, predicted_ids[0], outputs["token_timestamps"][0])
+    return result
+
+@profiled
+def recognize_speech(audio, timestamps=False):
     start_time = time.time()
+    timer = StageTimer("whisper-tamil")
+    model_name = MODEL_NAMES.get(TAMIL_BACKEND, "whisper-tamil")
     
     try:
-        if not Path(audio_file_path).is_file():
-            raise FileNotFoundError(f"Audio file not found: {audio_file_path}")
-            
-        # Load the base model
-        print("Loading base Whisper model...", file=sys.stderr)
-        model = whisper.load_model("base")
+        check_audio(audio)
         
-        # Get both English translation and Tamil transcription
-        print("Generating transcription...", file=sys.stderr)
-        translation_result = model.transcribe(
-            audio_file_path,
-            language="ta",
-            task="translate",
-            fp16=False
-        )
+        # Loaded once per process and kept resident
+        with timer.stage("model_loading"):
+            tamil_model = WhisperTamilModel.get_instance()
+            model, processor = tamil_model.get_model_and_processor()
         
-        # Force romanization with English character output
-        romanization_options = {
-            'language': "ta",
-            'task': 'transcribe',
-            'fp16': False,
-            'initial_prompt': (
-                "You must write everything in English letters only. "
-                "IMPORTANT: Do not use Tamil script at all. "
-                "Use only Latin alphabet (a-z) for sounds. "
-                "Examples: "
-                "வணக்கம் = vanakkam, "
-                "நன்றி = nandri"
-            )
-        }
+        with timer.stage("decode"):
+            audio = load_audio(audio)
         
-        transcription_result = model.transcribe(
-            audio_file_path,
-            **romanization_options
-        )
+        if tamil_model.backend == "hf":
+            result = transcribe_hf(model, processor, audio, timer, timestamps)
+        else:
+            result = transcribe_base(model, audio, timer, timestamps)
         
-        # Clean up romanized text
-        tamil_text = transcription_result["text"].strip()
-        romanized = romanize_tamil(tamil_text)
+        with timer.stage("romanization"):
+            romanized = romanize_tamil(result["text"])
         
-        result = {
-            "text": tamil_text,
+        return {
+            "text": result["text"],
             "romanized": romanized,
             "error": None,
             "processingTime": int((time.time() - start_time) * 1000),
-            "model": "whisper-base-tamil"
+            "stageTimes": timer.finish(),
+            "model": model_name,
+            **result
         }
         
-        print("Processing complete", file=sys.stderr)
-        return result
-        
     except Exception as e:
         processing_time = int((time.time() - start_time) * 1000)
         error_message = f"{type(e).__name__}: {str(e)}"
@@ -116,16 +255,20 @@ def recognize_speech(audio_file_path):
             "romanized": "",
             "error": error_message,
             "processingTime": processing_time,
-            "model": "whisper-base-tamil"
+            "stageTimes": timer.finish(record=False),
+            "model": model_name
         }
 
 if __name__ == "__main__":
+    apply_thread_budget()
+
     try:
-        if len(sys.argv) != 2:
-            raise ValueError("Invalid arguments. Usage: python whisperTamilService.py <audio_file_path>")
+        argv, timestamps = pop_timestamps_flag(sys.argv)
+        if len(argv) != 2:
+            raise ValueError("Invalid arguments. Usage: python whisperTamilService.py <audio_file_path|-> [--timestamps]")
         
-        audio_file_path = sys.argv[1]
-        result = recognize_speech(audio_file_path)
+        audio = read_audio_arg(argv[1])
+        result = recognize_speech(audio, timestamps=timestamps)
         
         print(json.dumps(result, ensure_ascii=False))
         
@@ -135,7 +278,7 @@ if __name__ == "__main__":
             "romanized": "",
             "error": f"Failed to process: {str(e)}",
             "processingTime": 0,
-            "model": "whisper-base-tamil"
+            "model": MODEL_NAMES.get(TAMIL_BACKEND, "whisper-tamil")
         }
         print(json.dumps(error_result, ensure_ascii=False))
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
@@ -1,6 +1,7 @@
 const { spawn } = require('child_process');
 const path = require('path');
 const fs = require('fs').promises;
+const threadScheduler = require('./threadScheduler');
 
 class WhisperTrainingService {
     // constructor() {
@@ -67,6 +68,8 @@ class WhisperTrainingService {
                 metadata
             });
 
+            const lease = await threadScheduler.acquire('whisper-training');
+
             return new Promise((resolve, reject) => {
                 console.log('Spawning Python process with:', {
                     pythonPath: this.pythonPath,
@@ -83,7 +86,9 @@ class WhisperTrainingService {
                     whisperText || '',
                     googleText || '',
                     language
-                ]);
+                ], {
+                    env: { ...global.process.env, ...lease.env }
+                });
 
                 let outputData = '';
                 let errorData = '';
@@ -99,6 +104,7 @@ class WhisperTrainingService {
                 });
 
                 process.on('close', (code) => {
+                    threadScheduler.release(lease);
                     console.log('Python process exited with code:', code);
                     if (code !== 0) {
                         console.error('Python process error:', errorData);
@@ -108,6 +114,7 @@ class WhisperTrainingService {
                 });
 
                 process.on('error', (error) => {
+                    threadScheduler.release(lease);
                     console.error('Failed to start Python process:', error);
                     resolve(metadata);
                 });
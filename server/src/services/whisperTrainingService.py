@@ -1,39 +1,102 @@
-import whisper
-import numpy as np
 import json
 import time
 import sys
 import os
 from pathlib import Path
+from thread_budget import apply_thread_budget
+from instrumentation import StageTimer
+from lazy_imports import lazy_module
+from training_store import TrainingStore
+from audio_fingerprint import DEDUP_MAX_DISTANCE, FingerprintIndex, dedup_enabled, fingerprint
+import audio_input
+import audio_shards
+
+whisper = lazy_module("whisper")
+np = lazy_module("numpy")
 
 class WhisperCPUTrainer:
     def __init__(self, model_size="base.en", training_dir="training_data"):
         """Initialize with a smaller model for CPU usage"""
         self.model = whisper.load_model(model_size)
-        self.training_data = []
+        # audio path -> example; mel features are computed on first use
+        self.training_data = {}
         self.audio_features_cache = {}
         self.training_dir = Path(training_dir)
         self.training_dir.mkdir(exist_ok=True)
-        
+        self.store = TrainingStore(self.training_dir)
+        # Highest store row already in training_data, and rows this trainer wrote itself
+        self._loaded_id = 0
+        self._own_rows = set()
+        # Fingerprints of the examples, for near-duplicate lookup
+        self.fingerprints = FingerprintIndex()
+        self._fingerprint_paths = []
+        self._indexed_paths = set()
+
+    def _mel_features(self, audio_path, pcm=None):
+        if audio_path not in self.audio_features_cache:
+            # Clips from a packed dataset come as int16 samples, not files
+            audio = whisper.load_audio(audio_path) if pcm is None else audio_input.load_audio(pcm)
+            self.audio_features_cache[audio_path] = whisper.pad_or_trim(whisper.log_mel_spectrogram(audio))
+        return self.audio_features_cache[audio_path]
+
+    def _index_fingerprint(self, audio_path, clip_fingerprint):
+        if clip_fingerprint and audio_path not in self._indexed_paths:
+            self.fingerprints.add(clip_fingerprint)
+            self._fingerprint_paths.append(audio_path)
+            self._indexed_paths.add(audio_path)
+
+    def find_duplicate(self, clip_fingerprint, actual_text):
+        """(example, distance) of the nearest example with the same text within the distance limit, or None"""
+        text = " ".join(actual_text.lower().split())
+        for number, distance in self.fingerprints.query(clip_fingerprint, DEDUP_MAX_DISTANCE):
+            example = self.training_data.get(self._fingerprint_paths[number])
+            if example and " ".join(example['actual_text'].lower().split()) == text:
+                return example, distance
+        return None
+
     def add_training_example(self, audio_path: str, actual_text: str):
-        """Add a new training example to the system"""
+        """
+        Add a new training example to the system. A near-duplicate of an
+        example with the same text is merged into it: that example's weight
+        in the vote goes up instead of a new example being kept.
+        """
         try:
-            # Load and process audio
+            # Load and process audio (also checks it is readable before it is stored)
             audio = whisper.load_audio(audio_path)
-            mel = whisper.pad_or_trim(whisper.log_mel_spectrogram(audio))
+            mel = whisper.log_mel_spectrogram(audio)
+            clip_fingerprint = fingerprint(mel)
             
-            # Store the example
-            self.training_data.append({
-                'audio_path': audio_path,
-                'mel_features': mel,
-                'actual_text': actual_text
-            })
+            duplicate = None
+            if dedup_enabled():
+                # Each add_example runs in a fresh process, and other workers add
+                # examples too: catch up with the store so every stored
+                # fingerprint is in the index before looking for a duplicate
+                self.load_training_data()
+                duplicate = self.find_duplicate(clip_fingerprint, actual_text)
+            if duplicate:
+                example, distance = duplicate
+                # Kept in the store so the merge survives a reload, but not as an example
+                self._own_rows.add(self.store.append(
+                    audio_path, actual_text, clip_fingerprint, duplicate_of=example['audio_path']
+                ))
+                example['weight'] += 1
+                return {
+                    "success": True,
+                    "duplicateOf": example['audio_path'],
+                    "distance": distance,
+                    "error": None
+                }
             
-            # Save features to avoid recomputation
-            self.audio_features_cache[audio_path] = mel
+            self.audio_features_cache[audio_path] = whisper.pad_or_trim(mel)
+            
+            # Store the example: one append, durable once this returns
+            self._own_rows.add(self.store.append(audio_path, actual_text, clip_fingerprint))
+            self._set_example(audio_path, actual_text)
+            self._index_fingerprint(audio_path, clip_fingerprint)
             
             return {
                 "success": True,
+                "duplicateOf": None,
                 "error": None
             }
         except Exception as e:
@@ -48,35 +111,47 @@ class WhisperCPUTrainer:
             return []
             
         similarities = []
-        for example in self.training_data:
-            similarity = np.sum(mel_features * example['mel_features']) / (
-                np.sqrt(np.sum(mel_features**2)) * np.sqrt(np.sum(example['mel_features']**2))
+        for example in self.training_data.values():
+            try:
+                features = self._mel_features(example['audio_path'], example.get('pcm'))
+            except Exception as e:
+                print(f"Skipping training example {example['audio_path']}: {str(e)}", file=sys.stderr)
+                continue
+            similarity = np.sum(mel_features * features) / (
+                np.sqrt(np.sum(mel_features**2)) * np.sqrt(np.sum(features**2))
             )
             similarities.append((similarity, example))
             
-        return [ex for _, ex in sorted(similarities, reverse=True)[:n]]
+        return [ex for _, ex in sorted(similarities, key=lambda pair: pair[0], reverse=True)[:n]]
 
     def transcribe_with_examples(self, audio_path: str):
         """Transcribe audio using both the base model and similar examples"""
         start_time = time.time()
+        timer = StageTimer("whisper-training")
         
         try:
             # Load and process audio
-            audio = whisper.load_audio(audio_path)
-            mel = whisper.pad_or_trim(whisper.log_mel_spectrogram(audio))
+            with timer.stage("decode"):
+                audio = whisper.load_audio(audio_path)
+            with timer.stage("features"):
+                mel = whisper.pad_or_trim(whisper.log_mel_spectrogram(audio))
             
             # Get base model transcription
-            base_result = self.model.transcribe(audio_path, fp16=False)
+            with timer.model_stage(self.model.encoder):
+                base_result = self.model.transcribe(audio, fp16=False)
             base_text = base_result["text"].strip()
             
             # Find similar examples
-            similar_examples = self.find_similar_examples(mel)
+            with timer.stage("example_lookup"):
+                similar_examples = self.find_similar_examples(mel)
             
             # If we have similar examples, use them to improve the transcription
             if similar_examples:
-                transcriptions = [base_text] + [ex['actual_text'] for ex in similar_examples]
                 from collections import Counter
-                counts = Counter(transcriptions)
+                counts = Counter([base_text])
+                for ex in similar_examples:
+                    # Merged near-duplicates vote with their example
+                    counts[ex['actual_text']] += ex.get('weight', 1)
                 improved_text = counts.most_common(1)[0][0]
             else:
                 improved_text = base_text
@@ -86,7 +161,8 @@ class WhisperCPUTrainer:
                 "base_text": base_text,
                 "similar_examples_count": len(similar_examples),
                 "error": None,
-                "processingTime": int((time.time() - start_time) * 1000)
+                "processingTime": int((time.time() - start_time) * 1000),
+                "stageTimes": timer.finish()
             }
             
         except Exception as e:
@@ -97,65 +173,93 @@ class WhisperCPUTrainer:
             }
 
     def save_training_data(self):
-        """Save the training data for future use"""
-        save_path = self.training_dir / "training_data.json"
-        save_data = []
-        for example in self.training_data:
-            save_data.append({
-                'audio_path': example['audio_path'],
-                'actual_text': example['actual_text']
-            })
-            
-        with open(save_path, 'w', encoding='utf-8') as f:
-            json.dump(save_data, f, ensure_ascii=False, indent=2)
+        """Examples are stored as they are added; this only checkpoints the store's WAL"""
+        self.store.checkpoint()
 
     def load_training_data(self):
-        """Load previously saved training data"""
+        """Load the examples stored since the last load (all of them the first time)"""
         try:
-            save_path = self.training_dir / "training_data.json"
-            if not save_path.exists():
-                return False
-                
-            with open(save_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-            self.training_data = []
-            for example in data:
-                self.add_training_example(example['audio_path'], example['actual_text'])
-                
-            return True
+            rows = self.store.examples(after_id=self._loaded_id)
+            for row_id, audio_path, actual_text, clip_fingerprint, duplicate_of in rows:
+                self._loaded_id = max(self._loaded_id, row_id)
+                if row_id in self._own_rows:
+                    continue
+                if duplicate_of is not None:
+                    if duplicate_of in self.training_data:
+                        self.training_data[duplicate_of]['weight'] += 1
+                    continue
+                self._set_example(audio_path, actual_text)
+                self._index_fingerprint(audio_path, clip_fingerprint)
+            return bool(self.training_data)
         except Exception as e:
             print(f"Error loading training data: {str(e)}", file=sys.stderr)
             return False
 
+    def _set_example(self, audio_path, actual_text):
+        # A later row for the same clip replaces the text but keeps the merged weight
+        previous = self.training_data.get(audio_path)
+        self.training_data[audio_path] = {
+            'audio_path': audio_path,
+            'actual_text': actual_text,
+            'weight': previous['weight'] if previous else 1
+        }
+
+    def load_shard_examples(self, dataset_dir):
+        """Add the labelled clips of a packed dataset (pack_dataset.py), read from its shards"""
+        count = 0
+        for clip_id, pcm, text in audio_shards.ShardedDataset(dataset_dir):
+            if not text:
+                continue
+            key = f"{dataset_dir}#{clip_id}"
+            self.training_data[key] = {
+                'audio_path': key,
+                'actual_text': text,
+                'pcm': pcm,
+                'weight': 1
+            }
+            count += 1
+        return count
+
+    def compact_training_data(self):
+        """Drop superseded rows from the store"""
+        return self.store.compact()
+
 if __name__ == "__main__":
+    apply_thread_budget()
+
     if len(sys.argv) < 2:
         print(json.dumps({"error": "No command provided"}))
         sys.exit(1)
 
     command = sys.argv[1]
-    trainer = WhisperCPUTrainer()
+    expected_args = {"add_example": 4, "transcribe": 3, "compact": 2}
+    if command not in expected_args:
+        print(json.dumps({"error": f"Unknown command: {command}"}))
+        sys.exit(1)
+    
+    # Validate before loading the model so bad invocations fail fast
+    if len(sys.argv) != expected_args[command]:
+        print(json.dumps({"error": f"Invalid arguments for {command}"}))
+        sys.exit(1)
     
     try:
+        if command == "compact":
+            # Needs only the store, not the model
+            result = {"removed": TrainingStore(Path("training_data")).compact(), "error": None}
+            print(json.dumps(result))
+            sys.exit(0)
+
+        trainer = WhisperCPUTrainer()
+        
         if command == "add_example":
-            if len(sys.argv) != 4:
-                print(json.dumps({"error": "Invalid arguments for add_example"}))
-                sys.exit(1)
-                
             result = trainer.add_training_example(sys.argv[2], sys.argv[3])
-            print(json.dumps(result))
-            
-        elif command == "transcribe":
-            if len(sys.argv) != 3:
-                print(json.dumps({"error": "Invalid arguments for transcribe"}))
-                sys.exit(1)
-                
-            result = trainer.transcribe_with_examples(sys.argv[2])
-            print(json.dumps(result))
-            
         else:
-            print(json.dumps({"error": f"Unknown command: {command}"}))
-            sys.exit(1)
+            trainer.load_training_data()
+            shards_dir = trainer.training_dir / "shards"
+            if audio_shards.is_dataset(shards_dir):
+                trainer.load_shard_examples(shards_dir)
+            result = trainer.transcribe_with_examples(sys.argv[2])
+        print(json.dumps(result))
             
     except Exception as e:
         print(json.dumps({"error": str(e)}))
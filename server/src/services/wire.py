@@ -0,0 +1,103 @@
+"""
+Framed, versioned messages between the Node server and the Python engines.
+
+Each message is one frame: an 8-byte header followed by the body.
+
+    "VS" | version (uint8) | codec (uint8) | body length (uint32, big endian)
+
+Codec 1 is msgpack. It is compact for timings and other per-word data, and
+it carries raw bytes, so a request can hold the audio itself rather than a
+path. Codec 0 is JSON, for clients without a msgpack library. A reply uses
+the codec of its request.
+
+Schema, version 1:
+    request  {"engine": "whisper", "audio": "/path/to.wav" | <encoded audio bytes>,
+              "audioEncoding": "base64" (JSON bodies only),
+              "options": {...}, "threads": 4, "cores": [0, 1]}
+             {"command": "ping"}
+    response the engine's result ({"text": ..., "error": ..., ...})
+
+Connections that start with "{" use the original line protocol instead:
+one JSON object per line in each direction.
+"""
+import json
+import struct
+from collections import namedtuple
+
+from lazy_imports import lazy_module
+
+msgpack = lazy_module("msgpack")
+
+MAGIC = b"VS"
+PROTOCOL_VERSION = 1
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+CODECS = (CODEC_JSON, CODEC_MSGPACK)
+HEADER = struct.Struct(">2sBBI")
+MAX_FRAME_BYTES = 256 * 1024 * 1024
+
+Header = namedtuple("Header", ["version", "codec", "length"])
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def dumps(message, codec=CODEC_MSGPACK):
+    if codec == CODEC_MSGPACK:
+        return msgpack.packb(message, use_bin_type=True)
+    if codec == CODEC_JSON:
+        return json.dumps(message, ensure_ascii=False).encode("utf-8")
+    raise ProtocolError(f"Unknown codec: {codec}")
+
+
+def loads(body, codec=CODEC_MSGPACK):
+    if codec == CODEC_MSGPACK:
+        return msgpack.unpackb(body, raw=False)
+    if codec == CODEC_JSON:
+        return json.loads(body.decode("utf-8"))
+    raise ProtocolError(f"Unknown codec: {codec}")
+
+
+def encode_frame(message, codec=CODEC_MSGPACK):
+    body = dumps(message, codec)
+    return HEADER.pack(MAGIC, PROTOCOL_VERSION, codec, len(body)) + body
+
+
+def _read_exactly(reader, size):
+    data = reader.read(size)
+    if len(data) != size:
+        raise ProtocolError(f"Connection closed after {len(data)} of {size} bytes")
+    return data
+
+
+def read_header(reader):
+    """Read one frame header; only the magic is checked, so a reply can use its codec"""
+    magic, version, codec, length = HEADER.unpack(_read_exactly(reader, HEADER.size))
+    if magic != MAGIC:
+        raise ProtocolError(f"Not a frame (magic {magic!r})")
+    return Header(version, codec, length)
+
+
+def read_body(reader, header):
+    """Check `header` and read and decode the body that follows it"""
+    if header.version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported protocol version {header.version} (this side speaks {PROTOCOL_VERSION})")
+    if header.length > MAX_FRAME_BYTES:
+        raise ProtocolError(f"Frame of {header.length} bytes exceeds the {MAX_FRAME_BYTES} byte limit")
+    return loads(_read_exactly(reader, header.length), header.codec)
+
+
+def reply_codec(header):
+    """Codec for the reply to a frame: the request's own, if this side speaks it"""
+    return header.codec if header.codec in CODECS else CODEC_MSGPACK
+
+
+def read_frame(reader):
+    """Read one frame from a binary file-like object; returns (message, codec)"""
+    header = read_header(reader)
+    return read_body(reader, header), header.codec
+
+
+def is_line_protocol(first_byte):
+    return first_byte == b"{"
@@ -0,0 +1,154 @@
+"""
+Preforking "zygote" for the recognition engines.
+
+The zygote imports torch/whisper/transformers and loads the configured models
+once, then listens on a Unix socket. Every request is served by a child
+forked from it, so a new worker starts in milliseconds and shares the model
+weights with the zygote copy-on-write instead of loading its own copy.
+
+Protocol: one request and one response per connection, as length-prefixed
+msgpack (or JSON) frames; see wire.py for the framing and schema. Clients
+that send a line of JSON get a line of JSON back.
+    -> {"engine": "whisper", "audio": "/path/to.wav" or <encoded audio bytes>,
+        "options": {"language": "si"}, "threads": 4, "cores": [0, 1, 2, 3]}
+    <- {"text": ..., "error": ..., ...}            (the engine's normal result)
+    -> {"command": "ping"}
+    <- {"ok": true, "pid": 1234, "engines": [...], "protocol": 1}
+
+Configuration (environment):
+    ZYGOTE_SOCKET       socket path (default: <tmp>/voice-search-zygote.sock)
+    ZYGOTE_PRELOAD      engines to preload, e.g. "whisper:tiny.en+medium,whisper-sinhala"
+    ZYGOTE_MAX_WORKERS  concurrent children (default: number of cores)
+
+POSIX only: it relies on fork() and Unix sockets.
+"""
+import base64
+import json
+import os
+import socketserver
+import sys
+import tempfile
+import time
+
+from engines import ENGINES, get_recognizer, preload
+from thread_budget import apply_thread_budget, available_cores
+from wire import (
+    CODEC_MSGPACK, PROTOCOL_VERSION, encode_frame, is_line_protocol, read_body, read_frame, read_header, reply_codec,
+)
+
+DEFAULT_PRELOAD = "whisper:tiny.en,whisper-sinhala"
+
+
+def default_socket_path():
+    return os.getenv("ZYGOTE_SOCKET") or os.path.join(tempfile.gettempdir(), "voice-search-zygote.sock")
+
+
+def parse_preload(spec):
+    """"whisper:tiny.en+medium,vosk" -> [("whisper", ["tiny.en", "medium"]), ("vosk", [])]"""
+    engines = []
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        engine, _, models = item.partition(":")
+        engines.append((engine, [m for m in models.split("+") if m]))
+    return engines
+
+
+def request_audio(request):
+    """A request's audio: a path, or the bytes sent inline (decoded in memory by the engine)"""
+    audio = request["audio"]
+    if request.get("audioEncoding") == "base64":
+        audio = base64.b64decode(audio)
+    return audio
+
+
+def handle_request(request):
+    """Serve one request inside a forked child"""
+    if request.get("command") == "ping":
+        return {"ok": True, "pid": os.getpid(), "engines": sorted(ENGINES), "protocol": PROTOCOL_VERSION}
+
+    apply_thread_budget(request.get("threads"), request.get("cores"))
+    recognizer = get_recognizer(request.get("engine"))
+    return recognizer(request_audio(request), **(request.get("options") or {}))
+
+
+class ZygoteHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line_protocol = is_line_protocol(self.rfile.peek(1)[:1])
+        codec = CODEC_MSGPACK
+        try:
+            if line_protocol:
+                request = json.loads(self.rfile.readline().decode("utf-8"))
+            else:
+                # Known before the body is decoded, so even a bad request gets its reply in its codec
+                header = read_header(self.rfile)
+                codec = reply_codec(header)
+                request = read_body(self.rfile, header)
+            result = handle_request(request)
+        except Exception as e:
+            result = {"text": "", "error": f"{type(e).__name__}: {str(e)}", "processingTime": 0}
+
+        if line_protocol:
+            self.wfile.write((json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8"))
+        else:
+            self.wfile.write(encode_frame(result, codec))
+        self.wfile.flush()
+
+
+class ZygoteServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    # Don't wait for in-flight children when the zygote shuts down
+    block_on_close = False
+
+
+def warm_up(preload_spec):
+    """Import heavy libraries and load models before accepting connections"""
+    timings = {}
+    # With a single intra-op thread torch never starts its OpenMP pool in the
+    # zygote, which keeps fork() safe; children size their own pools.
+    apply_thread_budget(threads=1)
+    for engine, models in parse_preload(preload_spec):
+        start = time.perf_counter_ns()
+        preload(engine, models)
+        timings[engine] = (time.perf_counter_ns() - start) // 1_000_000
+    return timings
+
+
+def serve(socket_path=None, preload_spec=None, max_workers=None):
+    socket_path = socket_path or default_socket_path()
+    preload_spec = preload_spec if preload_spec is not None else os.getenv("ZYGOTE_PRELOAD", DEFAULT_PRELOAD)
+
+    timings = warm_up(preload_spec)
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = ZygoteServer(socket_path, ZygoteHandler)
+    server.max_children = max_workers or int(os.getenv("ZYGOTE_MAX_WORKERS", "0")) or len(available_cores())
+
+    # Node waits for this line before routing requests here
+    print(json.dumps({"ready": True, "socket": socket_path, "pid": os.getpid(), "preloadMs": timings}), flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def request(payload, socket_path=None, timeout=None, codec=CODEC_MSGPACK):
+    """Client helper: send one request to a running zygote and return the result"""
+    import socket
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path or default_socket_path())
+        sock.sendall(encode_frame(payload, codec))
+        with sock.makefile("rb") as reader:
+            return read_frame(reader)[0]
+
+
+if __name__ == "__main__":
+    if not hasattr(os, "fork") or not hasattr(socketserver, "UnixStreamServer"):
+        print(json.dumps({"ready": False, "error": "The zygote requires fork() and Unix sockets"}))
+        sys.exit(1)
+    serve(sys.argv[1] if len(sys.argv) > 1 else None)
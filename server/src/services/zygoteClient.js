@@ -0,0 +1,164 @@
+const net = require('net');
+const path = require('path');
+const { spawn } = require('child_process');
+const msgpack = require('@msgpack/msgpack');
+
+// Client for the preforking zygote (zygote.py). When ZYGOTE_SOCKET is set the
+// server starts the zygote at boot and the engine services send requests to
+// it instead of spawning a fresh Python process (and re-importing torch and
+// reloading the model) for every request.
+let ready = false;
+let zygoteProcess = null;
+const socketPath = process.env.ZYGOTE_SOCKET;
+
+// Frames as in wire.py: "VS" | version | codec | uint32 BE body length | body.
+// ZYGOTE_PROTOCOL=json sends JSON bodies instead of msgpack.
+const MAGIC = 'VS';
+const PROTOCOL_VERSION = 1;
+const CODEC_JSON = 0;
+const CODEC_MSGPACK = 1;
+const HEADER_BYTES = 8;
+const codec = process.env.ZYGOTE_PROTOCOL === 'json' ? CODEC_JSON : CODEC_MSGPACK;
+
+function encodeFrame(message) {
+    const body = codec === CODEC_MSGPACK
+        ? Buffer.from(msgpack.encode(message, { ignoreUndefined: true }))
+        : Buffer.from(JSON.stringify(message), 'utf-8');
+    const header = Buffer.alloc(HEADER_BYTES);
+    header.write(MAGIC, 0, 'ascii');
+    header.writeUInt8(PROTOCOL_VERSION, 2);
+    header.writeUInt8(codec, 3);
+    header.writeUInt32BE(body.length, 4);
+    return Buffer.concat([header, body]);
+}
+
+// Returns the decoded message, or null while the frame is incomplete
+function decodeFrame(buffer) {
+    if (buffer.length < HEADER_BYTES) {
+        return null;
+    }
+    if (buffer.toString('ascii', 0, 2) !== MAGIC) {
+        throw new Error('Invalid zygote response frame');
+    }
+    const version = buffer.readUInt8(2);
+    if (version !== PROTOCOL_VERSION) {
+        throw new Error(`Unsupported zygote protocol version ${version}`);
+    }
+    const length = buffer.readUInt32BE(4);
+    if (buffer.length < HEADER_BYTES + length) {
+        return null;
+    }
+    const body = buffer.subarray(HEADER_BYTES, HEADER_BYTES + length);
+    return buffer.readUInt8(3) === CODEC_MSGPACK ? msgpack.decode(body) : JSON.parse(body.toString('utf-8'));
+}
+
+function isEnabled() {
+    return Boolean(socketPath);
+}
+
+function isReady() {
+    return ready;
+}
+
+function start() {
+    return new Promise((resolve, reject) => {
+        zygoteProcess = spawn('python', [path.join(__dirname, 'zygote.py'), socketPath], {
+            env: { ...process.env, PYTHONIOENCODING: 'utf-8' }
+        });
+
+        let stdout = '';
+        zygoteProcess.stdout.on('data', (data) => {
+            stdout += data.toString('utf-8');
+            const newline = stdout.indexOf('\n');
+            if (newline === -1 || ready) {
+                return;
+            }
+            try {
+                const status = JSON.parse(stdout.slice(0, newline));
+                if (!status.ready) {
+                    return reject(new Error(status.error || 'Zygote failed to start'));
+                }
+                ready = true;
+                console.log('Zygote ready:', status);
+                resolve(status);
+            } catch (error) {
+                reject(error);
+            }
+        });
+
+        zygoteProcess.stderr.on('data', (data) => {
+            console.log('Zygote:', data.toString('utf-8'));
+        });
+
+        zygoteProcess.on('close', (code) => {
+            // Fall back to spawning per request if the zygote goes away
+            ready = false;
+            reject(new Error(`Zygote exited with code ${code}`));
+        });
+
+        zygoteProcess.on('error', reject);
+    });
+}
+
+function request(payload, timeoutMs) {
+    return new Promise((resolve, reject) => {
+        const socket = net.createConnection(socketPath);
+        const chunks = [];
+
+        const timeout = setTimeout(() => {
+            socket.destroy();
+            reject(new Error(`Speech recognition timed out after ${timeoutMs / 1000} seconds`));
+        }, timeoutMs);
+
+        socket.on('connect', () => {
+            socket.write(encodeFrame(payload));
+        });
+
+        socket.on('data', (data) => {
+            chunks.push(data);
+        });
+
+        socket.on('end', () => {
+            clearTimeout(timeout);
+            try {
+                const result = decodeFrame(Buffer.concat(chunks));
+                if (result === null) {
+                    throw new Error('Truncated frame');
+                }
+                resolve(result);
+            } catch (error) {
+                console.error('Failed to parse zygote output:', error.message);
+                reject(new Error('Failed to process speech recognition'));
+            }
+        });
+
+        socket.on('error', (error) => {
+            clearTimeout(timeout);
+            reject(error);
+        });
+    });
+}
+
+// Run one recognition in a worker forked from the zygote, within the
+// thread budget of the scheduler lease. `audio` is a file path or a Buffer
+// holding the encoded audio (sent inline; no upload file needed).
+function recognize(engine, audio, options, lease, timeoutMs = 60000) {
+    const inline = Buffer.isBuffer(audio);
+    // JSON has no bytes type, so inline audio goes as base64 there
+    const base64 = inline && codec === CODEC_JSON;
+    return request({
+        engine,
+        audio: base64 ? audio.toString('base64') : audio,
+        audioEncoding: base64 ? 'base64' : undefined,
+        options,
+        threads: lease ? lease.threads : undefined,
+        cores: lease ? lease.cores : undefined
+    }, timeoutMs);
+}
+
+module.exports = {
+    isEnabled,
+    isReady,
+    start,
+    recognize
+};
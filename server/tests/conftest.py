@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The services import each other as top-level modules, as python/*.py do
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+SERVICES_DIR = os.path.join(SRC, "services")
+sys.path[:0] = [SERVICES_DIR, os.path.join(SRC, "python")]
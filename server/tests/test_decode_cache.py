@@ -0,0 +1,80 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+whisper = pytest.importorskip("whisper")
+from decode_cache import CachingWhisper, DecodeCache
+from tiny_whisper import fixed_clip, tiny_whisper
+
+
+@pytest.fixture(scope="module")
+def model():
+    return tiny_whisper()
+
+
+@pytest.fixture(scope="module")
+def mel():
+    return whisper.log_mel_spectrogram(whisper.pad_or_trim(fixed_clip()))
+
+
+def options(**kwargs):
+    return whisper.DecodingOptions(language="en", fp16=False, sample_len=32, **kwargs)
+
+
+def assert_same(actual, expected):
+    assert actual.tokens == expected.tokens
+    assert actual.avg_logprob == pytest.approx(expected.avg_logprob, abs=1e-5)
+    assert actual.no_speech_prob == pytest.approx(expected.no_speech_prob, abs=1e-6)
+    assert actual.temperature == expected.temperature
+
+
+@pytest.mark.parametrize("prompt", [None, " Transcribe speech using English letters only"])
+def test_prefix_miss_matches_decode(model, mel, prompt):
+    cached = CachingWhisper(model)
+    result = cached.decode(mel, options(prompt=prompt))
+    assert cached.cache.hits == 0
+    assert len(set(result.tokens)) > 1
+    assert_same(result, model.decode(mel, options(prompt=prompt)))
+
+
+@pytest.mark.parametrize("prompt", [None, " Transcribe speech using English letters only"])
+def test_prefix_hit_matches_decode(model, mel, prompt):
+    cached = CachingWhisper(model)
+    cached.decode(mel, options(prompt=prompt))
+    hits = cached.cache.hits
+    result = cached.decode(mel, options(prompt=prompt))
+    # Encoder output and the prompt prefill both came from the cache
+    assert cached.cache.hits == hits + 2
+    assert_same(result, model.decode(mel, options(prompt=prompt)))
+
+
+def test_sampled_batch_from_the_cached_prefix(model, mel):
+    # The temperature-fallback re-decode: best_of rows sampled from one shared prefill
+    cached = CachingWhisper(model)
+    cached.decode(mel, options())
+    sampled = options(temperature=0.7, best_of=3)
+    torch.manual_seed(1)
+    result = cached.decode(mel, sampled)
+    torch.manual_seed(1)
+    assert_same(result, model.decode(mel, sampled))
+
+
+def test_transcribe_with_temperature_fallback_matches(model):
+    audio = fixed_clip()
+    kwargs = dict(
+        language="en", fp16=False, initial_prompt=" Play a song", condition_on_previous_text=False,
+        temperature=(0.0, 0.5, 1.0),
+        # Every decode "fails", so each temperature is tried in turn
+        logprob_threshold=0.0, compression_ratio_threshold=None, no_speech_threshold=None,
+    )
+    cached = CachingWhisper(model, DecodeCache())
+    torch.manual_seed(2)
+    actual = cached.transcribe(audio, **kwargs)
+    torch.manual_seed(2)
+    expected = whisper.transcribe(model, audio, **kwargs)
+
+    assert cached.cache.hits > 0
+    assert [s["tokens"] for s in actual["segments"]] == [s["tokens"] for s in expected["segments"]]
+    for got, want in zip(actual["segments"], expected["segments"]):
+        assert got["temperature"] == want["temperature"] == 1.0
+        assert got["avg_logprob"] == pytest.approx(want["avg_logprob"], abs=1e-5)
+        assert got["no_speech_prob"] == pytest.approx(want["no_speech_prob"], abs=1e-6)
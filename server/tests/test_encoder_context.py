@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+whisper = pytest.importorskip("whisper")
+import encoder_context
+from decode_cache import CachingWhisper, DecodeCache
+from encoder_context import FULL_FRAMES, context_frames, short_encoder
+from tiny_whisper import SAMPLE_RATE, fixed_clip, tiny_whisper
+
+
+@pytest.fixture(scope="module")
+def model():
+    return tiny_whisper()
+
+
+@pytest.fixture(scope="module")
+def mel():
+    return whisper.log_mel_spectrogram(whisper.pad_or_trim(fixed_clip())).unsqueeze(0)
+
+
+@pytest.mark.parametrize("seconds, pad_seconds, frames", [
+    (2, 1, 300),
+    (2.01, 1, 400),    # rounded up to whole seconds
+    (2, 0, 200),
+    (0, 0, 100),       # never less than a second
+    (29.5, 1, FULL_FRAMES),
+    (45, 1, FULL_FRAMES),  # longer than a window: the full 30 s
+])
+def test_context_frames(seconds, pad_seconds, frames):
+    assert context_frames(int(seconds * SAMPLE_RATE), pad_seconds=pad_seconds) == frames
+
+
+def test_context_frames_default_padding(monkeypatch):
+    monkeypatch.setattr(encoder_context, "ENCODER_PAD_SECONDS", 3)
+    assert context_frames(2 * SAMPLE_RATE) == 500
+
+
+@pytest.mark.parametrize("frames", [100, 300, 1000])
+def test_short_encoder_output_shape(model, mel, frames):
+    with torch.no_grad():
+        features = short_encoder(model.encoder)(mel, frames)
+    assert features.shape == (1, frames // 2, model.dims.n_audio_state)
+
+
+@pytest.mark.parametrize("frames", [None, FULL_FRAMES, FULL_FRAMES + 100])
+def test_short_encoder_falls_back_to_the_full_window(model, mel, frames):
+    with torch.no_grad():
+        features = short_encoder(model.encoder)(mel, frames)
+        assert torch.equal(features, model.encoder(mel))
+    assert features.shape == (1, model.dims.n_audio_ctx, model.dims.n_audio_state)
+
+
+def test_short_encoder_is_one_module_per_encoder(model):
+    # StageTimer hooks registered on it must still be there on the next request
+    assert short_encoder(model.encoder) is short_encoder(model.encoder)
+    assert short_encoder(model.encoder) is not short_encoder(tiny_whisper(seed=1).encoder)
+
+
+@pytest.fixture
+def audio_context(monkeypatch):
+    """WHISPER_ENCODER_CONTEXT=audio, with transcribe() itself stubbed out"""
+    monkeypatch.setattr(encoder_context, "WHISPER_ENCODER_CONTEXT", "audio")
+    monkeypatch.setattr(whisper, "transcribe", lambda model, audio, **kwargs: {"text": "", "segments": []})
+
+
+def test_transcribe_sizes_the_encoder_to_the_clip(model, audio_context):
+    caching = CachingWhisper(model)
+    caching.transcribe(np.zeros(2 * SAMPLE_RATE, dtype=np.float32))
+    assert caching.cache.encoder_frames == 300
+
+    caching.transcribe(np.zeros(45 * SAMPLE_RATE, dtype=np.float32))
+    assert caching.cache.encoder_frames == FULL_FRAMES
+
+
+def test_transcribe_keeps_the_full_window_for_a_path(model, audio_context):
+    # A path's length isn't known before whisper loads it
+    caching = CachingWhisper(model)
+    caching.transcribe("clip.wav")
+    assert caching.cache.encoder_frames is None
+
+
+def test_transcribe_keeps_the_full_window_when_disabled(model, monkeypatch):
+    monkeypatch.setattr(encoder_context, "WHISPER_ENCODER_CONTEXT", "full")
+    monkeypatch.setattr(whisper, "transcribe", lambda model, audio, **kwargs: {"text": "", "segments": []})
+    caching = CachingWhisper(model)
+    caching.transcribe(np.zeros(2 * SAMPLE_RATE, dtype=np.float32))
+    assert caching.cache.encoder_frames is None
+
+
+def test_decode_uses_the_short_encoder_output(model, mel):
+    cache = DecodeCache(encoder_frames=300)
+    options = whisper.DecodingOptions(language="en", fp16=False, sample_len=8)
+    CachingWhisper(model, cache).decode(mel, options)
+    (features,) = [value for key, value in cache.entries.items() if key[0] == "features"]
+    assert features.shape == (1, 150, model.dims.n_audio_state)
@@ -0,0 +1,69 @@
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+import hotwords
+from hotwords import HotwordTrie, ends_word
+
+# Toy vocabulary: 1 " Yellow", 2 " Sub", 3 "marine", 4 " play", 5 "ing", 6 ".", 7 "<|en|>"
+SEQUENCES = [[1, 2, 3]]
+WORD_ENDS = frozenset({6, 7})
+
+
+def boosted(trie, tokens):
+    logits = torch.zeros(8)
+    trie.bias(logits, tokens, boost=3, start_boost=1)
+    return {i: float(v) for i, v in enumerate(logits) if v}
+
+
+def test_ends_word():
+    assert ends_word(".") and ends_word(" ") and ends_word("<|en|>")
+    assert not ends_word(" play") and not ends_word("'") and not ends_word("")
+
+
+def test_start_boost_only_at_word_boundaries():
+    trie = HotwordTrie(SEQUENCES, WORD_ENDS)
+    assert boosted(trie, []) == {1: 1.0}          # start of the output
+    assert boosted(trie, [4, 6]) == {1: 1.0}      # after punctuation
+    assert boosted(trie, [7]) == {1: 1.0}         # after a special token
+    assert boosted(trie, [4]) == {}               # " play" may go on ("ing")
+    assert boosted(trie, [4, 5]) == {}
+
+
+def test_continuations_boosted_inside_a_name():
+    trie = HotwordTrie(SEQUENCES, WORD_ENDS)
+    assert boosted(trie, [4, 1]) == {2: 3.0}
+    assert boosted(trie, [6, 1, 2]) == {3: 3.0}
+
+
+def test_whisper_filter_with_the_real_tokenizer(tmp_path, monkeypatch):
+    whisper = pytest.importorskip("whisper")
+    import catalog_grammar
+
+    db_path = tmp_path / "search.db"
+    with sqlite3.connect(db_path) as db:
+        db.execute("CREATE TABLE search_content (id INTEGER PRIMARY KEY, title TEXT, artist TEXT)")
+        db.execute("INSERT INTO search_content (title, artist) VALUES ('Yellow Submarine', 'The Beatles')")
+    monkeypatch.setattr(catalog_grammar, "SEARCH_DB_PATH", str(db_path))
+    monkeypatch.setattr(hotwords, "_tries", {})
+
+    # Only the tokenizer settings of the model are used
+    trie = hotwords.whisper_trie(SimpleNamespace(is_multilingual=False, num_languages=99))
+    tokenizer = whisper.tokenizer.get_tokenizer(False)
+    prompt = list(tokenizer.sot_sequence_including_notimestamps)
+    biasing = hotwords.whisper_filter(trie, len(prompt))
+    yellow = tokenizer.encode(" Yellow")[0]
+
+    def logits_after(text):
+        logits = torch.zeros(1, tokenizer.encoding.n_vocab)
+        biasing.apply(logits, torch.tensor([prompt + (tokenizer.encode(text) if text else [])]))
+        return logits[0]
+
+    assert logits_after("")[yellow] == hotwords.HOTWORD_START_BOOST
+    assert logits_after(" Play it.")[yellow] == hotwords.HOTWORD_START_BOOST
+    assert logits_after(" Play")[yellow] == 0
+    # Inside a name the continuation is boosted wherever it is
+    submarine = tokenizer.encode(" Yellow Submarine")
+    assert logits_after(" Play Yellow")[submarine[1]] == hotwords.HOTWORD_BOOST
@@ -0,0 +1,154 @@
+import hashlib
+import os
+
+import pytest
+
+import model_manifest
+import model_provisioning
+from model_provisioning import fetch_artifacts, fetch_file, resolve, update_manifest, verify_manifest
+
+WEIGHTS = os.urandom(3 * model_provisioning.CHUNK_BYTES + 123)
+CONFIG = b'{"d_model": 384}'
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    """A local-directory mirror holding one Hugging Face model"""
+    root = tmp_path / "mirror"
+    model_dir = root / "hf" / "org" / "model"
+    model_dir.mkdir(parents=True)
+    (model_dir / "model.safetensors").write_bytes(WEIGHTS)
+    (model_dir / "config.json").write_bytes(CONFIG)
+    return str(root)
+
+
+@pytest.fixture(autouse=True)
+def model_cache(tmp_path, monkeypatch):
+    manifest = str(tmp_path / "model_cache" / "manifest.json")
+    monkeypatch.setattr(model_provisioning, "PROVISIONED_DIR", str(tmp_path / "model_cache" / "provisioned"))
+    monkeypatch.setattr(model_provisioning, "MANIFEST_PATH", manifest)
+    monkeypatch.setattr(model_manifest, "MANIFEST_PATH", manifest)
+    model_manifest.load_manifest.cache_clear()
+    yield manifest
+    model_manifest.load_manifest.cache_clear()
+
+
+def weights_entry(mirror):
+    entry = resolve("hf:org/model", mirror)
+    return next(file for file in entry["files"] if file["path"] == "model.safetensors")
+
+
+def test_resolve_pins_hashes_from_the_mirror(mirror):
+    entry = resolve("hf:org/model", mirror)
+    assert {file["path"]: (file["sha256"], file["size"]) for file in entry["files"]} == {
+        "config.json": (hashlib.sha256(CONFIG).hexdigest(), len(CONFIG)),
+        "model.safetensors": (hashlib.sha256(WEIGHTS).hexdigest(), len(WEIGHTS)),
+    }
+
+
+def test_resumes_from_a_partial_download(mirror, tmp_path, monkeypatch):
+    file = weights_entry(mirror)
+    directory = tmp_path / "install"
+    directory.mkdir()
+    half = len(WEIGHTS) // 2
+    (directory / "model.safetensors.part").write_bytes(WEIGHTS[:half])
+
+    offsets = []
+    real_open = model_provisioning._open
+
+    def recording_open(url, offset):
+        offsets.append(offset)
+        return real_open(url, offset)
+
+    monkeypatch.setattr(model_provisioning, "_open", recording_open)
+    result = fetch_file(file, str(directory), mirror)
+
+    assert offsets == [half]
+    assert result["fetched"] and result["sha256"] == file["sha256"]
+    assert (directory / "model.safetensors").read_bytes() == WEIGHTS
+    assert not (directory / "model.safetensors.part").exists()
+
+
+def test_hash_mismatch_installs_nothing(mirror, tmp_path):
+    file = {**weights_entry(mirror), "sha256": "0" * 64}
+    directory = tmp_path / "install"
+
+    with pytest.raises(ValueError, match="does not match the lock"):
+        fetch_file(file, str(directory), mirror)
+    assert os.listdir(directory) == []
+
+    # Within an artifact: the bad file is not installed and the artifact stays out of the manifest
+    entry = resolve("hf:org/model", mirror)
+    bad = next(file for file in entry["files"] if file["path"] == "config.json")
+    bad["sha256"] = "0" * 64
+    installed, errors = fetch_artifacts({"hf:org/model": entry}, mirror, progress=lambda message: None)
+    assert installed == {} and "does not match the lock" in errors["hf:org/model"]
+    remaining = os.listdir(model_provisioning.install_dir("hf:org/model"))
+    assert "config.json" not in remaining and "config.json.part" not in remaining
+
+
+def test_manifest_written_and_verified(mirror, model_cache):
+    installed, errors = fetch_artifacts({"hf:org/model": resolve("hf:org/model", mirror)}, mirror,
+                                        progress=lambda message: None)
+    assert errors == {}
+    update_manifest(artifacts=installed)
+
+    path = model_manifest.artifact_path("hf:org/model")
+    assert path == model_provisioning.install_dir("hf:org/model")
+    assert model_manifest.hf_model_source("org/model") == path
+    assert verify_manifest() == {}
+
+    # Same size, different bytes: only verify (which re-hashes) notices
+    with open(os.path.join(path, "config.json"), "r+b") as f:
+        f.write(b"[")
+    assert verify_manifest() == {"hf:org/model": ["config.json: sha256 mismatch"]}
+
+    os.remove(os.path.join(path, "model.safetensors"))
+    model_manifest.load_manifest.cache_clear()
+    assert model_manifest.artifact_path("hf:org/model") is None
+    assert model_manifest.hf_model_source("org/model") == "org/model"
+
+
+def test_refetch_downloads_only_what_is_missing(mirror):
+    entry = resolve("hf:org/model", mirror)
+    fetch_artifacts({"hf:org/model": entry}, mirror, progress=lambda message: None)
+    os.remove(os.path.join(model_provisioning.install_dir("hf:org/model"), "config.json"))
+
+    messages = []
+    installed, errors = fetch_artifacts({"hf:org/model": entry}, mirror, progress=messages.append)
+    assert errors == {}
+    assert sorted(messages) == ["hf:org/model: config.json downloaded", "hf:org/model: model.safetensors already present"]
+
+
+def test_lock_pins_every_provisioned_artifact(tmp_path):
+    # Everything setup_models.py provisions, including PocketSphinx for
+    # scripts/setup_models.py, gets a sha256 and size in one `lock` run
+    pytest.importorskip("whisper")
+    import setup_models
+
+    root = tmp_path / "mirror"
+    for name in setup_models.LOCKED_ARTIFACTS:
+        kind, _, spec = name.partition(":")
+        if kind == "hf":
+            paths = [f"hf/{spec}/config.json", f"hf/{spec}/model.safetensors"]
+        elif kind == "pocketsphinx":
+            paths = [f"pocketsphinx/{spec}/{filename}" for filename in model_provisioning.POCKETSPHINX_FILES]
+        elif kind == "vosk":
+            paths = [f"vosk/{spec}.zip"]
+        else:
+            paths = [f"whisper/{spec}.pt"]
+        for path in paths:
+            (root / path).parent.mkdir(parents=True, exist_ok=True)
+            (root / path).write_bytes(path.encode())  # Each file holds its own mirror path
+
+    lock_path = str(tmp_path / "models.lock.json")
+    assert setup_models.lock_models(mirror=str(root), lock_path=lock_path)
+
+    artifacts = model_provisioning.read_lock(lock_path)["artifacts"]
+    assert sorted(artifacts) == sorted(setup_models.LOCKED_ARTIFACTS)
+    for name, artifact in artifacts.items():
+        for file in artifact["files"]:
+            assert file["sha256"] and file["size"] == len(file["mirrorPath"]), (name, file)
+    # Whisper hashes stay the ones in openai-whisper's URLs
+    tiny = artifacts["whisper:tiny.en"]["files"][0]
+    assert tiny["sha256"] == tiny["url"].split("/")[-2]
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+torch = pytest.importorskip("torch")
+whisper = pytest.importorskip("whisper")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("onnx")
+import onnx_whisper
+from model_provisioning import whisper_root
+from tiny_whisper import fixed_clip, tiny_whisper
+
+
+@pytest.fixture(autouse=True)
+def onnx_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(onnx_whisper, "ONNX_DIR", tmp_path / "onnx")
+    monkeypatch.setattr(onnx_whisper, "_sessions", {})
+
+
+def decoded_tokens(model, mel):
+    options = whisper.DecodingOptions(language="en", temperature=0.0, sample_len=24, fp16=False, without_timestamps=True)
+    return model.decode(mel, options).tokens
+
+
+def test_graphs_match_pytorch():
+    model = tiny_whisper()
+    onnx_model = onnx_whisper.load_onnx_model("tiny-random", lambda: model)
+    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(fixed_clip())).unsqueeze(0)
+    tokens = torch.tensor([list(whisper.tokenizer.get_tokenizer(False).sot_sequence)])
+
+    with torch.no_grad():
+        features = model.encoder(mel)
+        torch.testing.assert_close(onnx_model.encoder(mel), features, rtol=1e-4, atol=1e-4)
+        torch.testing.assert_close(onnx_model.logits(tokens, features), model.logits(tokens, features), rtol=1e-4, atol=1e-4)
+        expected = decoded_tokens(model, mel[0])
+        assert len(set(expected)) > 1
+        assert decoded_tokens(onnx_model, mel[0]) == expected
+
+
+def test_reuses_the_export():
+    model = tiny_whisper()
+    onnx_whisper.load_onnx_model("tiny-random", lambda: model)
+    onnx_whisper._sessions.clear()
+
+    def loader():
+        raise AssertionError("the exported graphs should have been reused")
+
+    assert onnx_whisper.load_onnx_model("tiny-random", loader).dims == model.dims
+
+
+def test_transcript_matches_pytorch_tiny_en():
+    if not os.path.exists(os.path.join(whisper_root(), "tiny.en.pt")):
+        pytest.skip("whisper tiny.en is not downloaded (python setup_models.py)")
+    model = whisper.load_model("tiny.en", device="cpu")
+    onnx_model = onnx_whisper.load_onnx_model("tiny.en", lambda: model)
+    audio = fixed_clip()
+
+    expected = model.transcribe(audio, language="en", temperature=0.0, fp16=False)
+    actual = onnx_model.transcribe(audio, language="en", temperature=0.0, fp16=False)
+    assert [s["tokens"] for s in actual["segments"]] == [s["tokens"] for s in expected["segments"]]
+    assert actual["text"] == expected["text"]
@@ -0,0 +1,68 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from conftest import SERVICES_DIR
+from profiling import profiled
+
+
+@profiled
+def recognize_stub(audio):
+    return {"text": audio, "error": None}
+
+
+def test_unprofiled_request_is_unchanged(tmp_path, monkeypatch):
+    monkeypatch.setenv("VOICE_SEARCH_PROFILE_DIR", str(tmp_path))
+    assert recognize_stub("hello", profile=False) == {"text": "hello", "error": None}
+    assert not list(tmp_path.iterdir())
+
+
+def test_explicit_profile_writes_folded_stacks(tmp_path, monkeypatch):
+    monkeypatch.setenv("VOICE_SEARCH_PROFILE_DIR", str(tmp_path))
+    monkeypatch.setenv("VOICE_SEARCH_PROFILE_TORCH", "0")
+    result = recognize_stub("hello", profile=True, request_id="req-1")
+    assert result["text"] == "hello"
+    assert result["profile"]["files"] == [str(tmp_path / "req-1.folded")]
+
+
+def test_explicit_profile_imports_torch_for_its_trace(tmp_path):
+    # A spawned CLI request starts without torch loaded (the engines import it lazily)
+    pytest.importorskip("torch")
+    script = textwrap.dedent(f"""
+        import json, sys
+        sys.path.insert(0, {SERVICES_DIR!r})
+        from profiling import profiled
+
+        @profiled
+        def recognize_stub(audio):
+            return {{"text": audio, "error": None}}
+
+        assert "torch" not in sys.modules
+        print(json.dumps(recognize_stub("hello", profile=True, request_id="req-2")))
+    """)
+    env = {**os.environ, "VOICE_SEARCH_PROFILE_DIR": str(tmp_path)}
+    env.pop("VOICE_SEARCH_PROFILE_TORCH", None)
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, env=env, timeout=120)
+    assert output.returncode == 0, output.stderr
+    files = json.loads(output.stdout)["profile"]["files"]
+    assert str(tmp_path / "req-2.torch.json") in files
+    assert (tmp_path / "req-2.torch.json").stat().st_size > 0
+
+
+def test_nested_recognizer_is_covered_by_the_outer_profile(tmp_path, monkeypatch):
+    monkeypatch.setenv("VOICE_SEARCH_PROFILE_DIR", str(tmp_path))
+    monkeypatch.setenv("VOICE_SEARCH_PROFILE", "1")
+    monkeypatch.setenv("VOICE_SEARCH_PROFILE_TORCH", "0")
+
+    @profiled
+    def route(audio):
+        return {"engine": recognize_stub(audio), "error": None}
+
+    result = route("hello", request_id="outer")
+    assert "profile" not in result["engine"]
+    assert result["profile"]["files"] == [str(tmp_path / "outer.folded")]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["outer.folded"]
@@ -0,0 +1,41 @@
+import pytest
+
+import shared_weights
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+
+def tiny_whisper():
+    config = transformers.WhisperConfig(
+        vocab_size=64, num_mel_bins=8, d_model=16, encoder_layers=1, decoder_layers=1,
+        encoder_attention_heads=2, decoder_attention_heads=2, encoder_ffn_dim=32, decoder_ffn_dim=32,
+        max_source_positions=16, max_target_positions=16,
+        pad_token_id=0, bos_token_id=1, eos_token_id=2, decoder_start_token_id=1,
+    )
+    return transformers.WhisperForConditionalGeneration(config).eval()
+
+
+def test_first_load_on_a_fresh_tree(tmp_path, monkeypatch):
+    shared_dir = tmp_path / "model_cache" / "shared"
+    monkeypatch.setattr(shared_weights, "SHARED_DIR", shared_dir)
+    original = tiny_whisper()
+
+    model = shared_weights.load_hf_whisper("org/tiny", lambda: original)
+
+    assert sorted(p.name for p in shared_dir.iterdir()) == [
+        "hf-org--tiny.config.json", "hf-org--tiny.generation.json", "hf-org--tiny.pt",
+    ]
+    for name, tensor in original.state_dict().items():
+        assert torch.equal(model.state_dict()[name], tensor), name
+
+
+def test_later_loads_use_the_shared_copy(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_weights, "SHARED_DIR", tmp_path / "shared")
+    shared_weights.load_hf_whisper("org/tiny", tiny_whisper)
+
+    def loader():
+        raise AssertionError("the shared copy should have been used")
+
+    model = shared_weights.load_hf_whisper("org/tiny", loader)
+    assert model.config.d_model == 16
@@ -0,0 +1,85 @@
+import copy
+
+import pytest
+
+torch = pytest.importorskip("torch")
+whisper = pytest.importorskip("whisper")
+import speculative
+from speculative import SpeculativeWhisper
+from tiny_whisper import fixed_clip, tiny_whisper
+
+
+@pytest.fixture(scope="module")
+def target():
+    return tiny_whisper(seed=0)
+
+
+@pytest.fixture(scope="module")
+def mel():
+    return whisper.log_mel_spectrogram(whisper.pad_or_trim(fixed_clip()))
+
+
+@pytest.fixture
+def target_passes(target, monkeypatch):
+    """Counts the target's decoder forward passes"""
+    passes = []
+    forward = speculative.decoder_forward
+
+    def counting_forward(model, tokens, audio_features, kv_cache):
+        if model is target:
+            passes.append(tokens.shape[-1])
+        return forward(model, tokens, audio_features, kv_cache)
+
+    monkeypatch.setattr(speculative, "decoder_forward", counting_forward)
+    return passes
+
+
+def options(**kwargs):
+    return whisper.DecodingOptions(language="en", fp16=False, temperature=0.0, **kwargs)
+
+
+def assert_greedy(result, expected):
+    assert result.tokens == expected.tokens
+    assert result.avg_logprob == pytest.approx(expected.avg_logprob, abs=1e-5)
+    assert result.no_speech_prob == pytest.approx(expected.no_speech_prob, abs=1e-6)
+
+
+@pytest.mark.parametrize("prompt", [None, " Play a song"])
+@pytest.mark.parametrize("sample_len", [7, 40])
+def test_disagreeing_draft_gives_the_greedy_output(target, mel, target_passes, prompt, sample_len):
+    draft = tiny_whisper(seed=1, n_text_layer=1)
+    result = SpeculativeWhisper(target, draft, draft_tokens=4).decode(mel, options(prompt=prompt, sample_len=sample_len))
+    expected = target.decode(mel, options(prompt=prompt, sample_len=sample_len))
+
+    assert len(set(expected.tokens)) > 1
+    assert_greedy(result, expected)
+    # An unrelated draft is mostly rejected: about one target pass per token
+    assert len(target_passes) >= len(expected.tokens) // 2
+
+
+@pytest.mark.parametrize("prompt", [None, " Play a song"])
+def test_agreeing_draft_gives_the_greedy_output_in_fewer_passes(target, mel, target_passes, prompt):
+    draft = copy.deepcopy(target)
+    result = SpeculativeWhisper(target, draft, draft_tokens=4).decode(mel, options(prompt=prompt, sample_len=40))
+    expected = target.decode(mel, options(prompt=prompt, sample_len=40))
+
+    assert_greedy(result, expected)
+    # Every proposal accepted: one pass per draft_tokens + 1 tokens, plus the
+    # prompt's prefill (English-only models otherwise start from SOT alone)
+    prefill = 1 if prompt else 0
+    assert len(target_passes) == prefill + -(-len(expected.tokens) // 5)
+
+
+def test_sampling_is_left_to_the_target(target, mel, target_passes):
+    speculative_model = SpeculativeWhisper(target, copy.deepcopy(target))
+    sampled = whisper.DecodingOptions(language="en", fp16=False, temperature=0.7, sample_len=16)
+    torch.manual_seed(3)
+    result = speculative_model.decode(mel, sampled)
+    torch.manual_seed(3)
+    assert result.tokens == target.decode(mel, sampled).tokens
+    assert target_passes == []
+
+
+def test_rejects_an_incompatible_draft(target):
+    with pytest.raises(ValueError):
+        SpeculativeWhisper(target, target)
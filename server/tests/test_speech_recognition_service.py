@@ -0,0 +1,101 @@
+import subprocess
+import sys
+import textwrap
+import time
+
+import numpy as np
+
+from conftest import SERVICES_DIR
+from speech_recognition_service import recognize_hybrid
+
+CLIP = np.zeros(16000, np.float32)
+
+
+def stub_backend(name, latency_s, error=None, raises=None):
+    def recognize_stub(audio, language="en-US"):
+        time.sleep(latency_s)
+        if raises:
+            raise raises
+        return {"text": "" if error else f"{name} transcript", "error": error,
+                "processingTime": int(latency_s * 1000), "backend": name}
+    return recognize_stub
+
+
+def test_faster_backend_wins():
+    start = time.perf_counter()
+    result = recognize_hybrid(CLIP, deadline=5, backends={
+        "google": stub_backend("google", 1.0),
+        "local": stub_backend("local", 0.05),
+    })
+    assert time.perf_counter() - start < 0.5
+    assert result["backend"] == "local"
+    assert result["error"] is None
+    assert result["race"]["google"] == {"processingTime": None, "error": None}
+
+
+def test_failed_backend_falls_back_to_the_other():
+    result = recognize_hybrid(CLIP, deadline=5, backends={
+        "google": stub_backend("google", 0.3),
+        "local": stub_backend("local", 0.01, error="model missing"),
+    })
+    assert result["backend"] == "google"
+    assert result["text"] == "google transcript"
+    assert result["race"]["local"]["error"] == "model missing"
+
+
+def test_exception_counts_as_a_failure():
+    result = recognize_hybrid(CLIP, deadline=5, backends={
+        "google": stub_backend("google", 0.01, raises=ConnectionError("offline")),
+        "local": stub_backend("local", 0.1),
+    })
+    assert result["backend"] == "local"
+    assert result["race"]["google"]["error"] == "ConnectionError: offline"
+
+
+def test_all_failing_reports_every_error():
+    result = recognize_hybrid(CLIP, deadline=5, backends={
+        "google": stub_backend("google", 0.01, error="quota"),
+        "local": stub_backend("local", 0.02, error="model missing"),
+    })
+    assert result["text"] == ""
+    assert "google: quota" in result["error"]
+    assert "local: model missing" in result["error"]
+
+
+def test_deadline_stops_waiting():
+    start = time.perf_counter()
+    result = recognize_hybrid(CLIP, deadline=0.2, backends={
+        "google": stub_backend("google", 2.0),
+        "local": stub_backend("local", 0.01, error="model missing"),
+    })
+    assert time.perf_counter() - start < 1.0
+    assert "google: no answer within 0.2s" in result["error"]
+    assert result["race"]["google"]["error"] == "Did not finish before the deadline"
+
+
+def test_process_exits_without_waiting_for_the_loser():
+    # The CLI (recognize_speech.py) is a process Node waits on; the slow
+    # backend must not hold it open after the winner has answered
+    script = textwrap.dedent(f"""
+        import json, sys, time
+        sys.path.insert(0, {SERVICES_DIR!r})
+        import numpy as np
+        from speech_recognition_service import recognize_hybrid
+
+        def backend(name, latency_s):
+            def recognize_stub(audio, language="en-US"):
+                time.sleep(latency_s)
+                return {{"text": name, "error": None, "backend": name}}
+            return recognize_stub
+
+        result = recognize_hybrid(np.zeros(16000, np.float32), deadline=30, backends={{
+            "google": backend("google", 20), "local": backend("local", 0.2),
+        }})
+        print(json.dumps(result))
+    """)
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=30)
+    elapsed = time.perf_counter() - start
+    assert output.returncode == 0, output.stderr
+    assert '"backend": "local"' in output.stdout
+    assert elapsed < 5, f"process took {elapsed:.1f}s: it waited for the slow backend"
@@ -0,0 +1,115 @@
+import json
+import sqlite3
+import threading
+
+import pytest
+
+from training_store import LEGACY_NAME, STORE_NAME, TrainingStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TrainingStore(tmp_path)
+    yield store
+    store.close()
+
+
+def current(store):
+    return {audio_path: text for _, audio_path, text, _, _ in store.examples()}
+
+
+def test_newest_row_for_a_clip_wins(store):
+    store.append("a.wav", "old")
+    store.append("b.wav", "bee")
+    store.append("a.wav", "new")
+
+    assert current(store) == {"a.wav": "new", "b.wav": "bee"}
+    assert store.latest("a.wav") == "new"
+    assert store.with_text("old") == []
+    assert len(store) == 2
+
+
+def test_examples_after_an_id_are_only_the_new_ones(store):
+    first = store.append("a.wav", "one")
+    store.append("b.wav", "two")
+    assert [row[1] for row in store.examples(after_id=first)] == ["b.wav"]
+
+
+def test_compact_removes_superseded_rows(store, tmp_path):
+    for i in range(50):
+        store.append("a.wav", f"take {i}")
+    store.append("b.wav", "bee")
+    store.append("c.wav", "sea", fingerprint=b"\x01\x02", duplicate_of="b.wav")
+    before = current(store)
+
+    assert store.compact() == 49
+    assert current(store) == before
+    assert store.examples()[-1][3:] == (b"\x01\x02", "b.wav")
+
+    with sqlite3.connect(tmp_path / STORE_NAME) as db:
+        assert db.execute("SELECT COUNT(*) FROM examples").fetchone()[0] == 3
+    # Nothing left to remove; ids keep growing after a compaction
+    assert store.compact() == 0
+    assert store.append("d.wav", "dee") > store.examples()[-2][0]
+
+
+def test_imports_and_renames_the_legacy_json(tmp_path):
+    legacy = [{"audio_path": "a.wav", "actual_text": "ආයුබෝවන්"}, {"audio_path": "b.wav", "actual_text": "bee"}]
+    (tmp_path / LEGACY_NAME).write_text(json.dumps(legacy, ensure_ascii=False), encoding="utf-8")
+
+    store = TrainingStore(tmp_path)
+    assert current(store) == {"a.wav": "ආයුබෝවන්", "b.wav": "bee"}
+    store.close()
+    assert not (tmp_path / LEGACY_NAME).exists()
+    assert json.loads((tmp_path / f"{LEGACY_NAME}.imported").read_text(encoding="utf-8")) == legacy
+
+    # Reopening doesn't import it again
+    reopened = TrainingStore(tmp_path)
+    assert len(reopened.examples()) == 2
+    reopened.close()
+
+
+def test_interleaved_appends_from_two_stores(tmp_path):
+    # Two connections to one database, as two worker processes would hold
+    first, second = TrainingStore(tmp_path), TrainingStore(tmp_path)
+    seen = 0
+    for i in range(20):
+        store = first if i % 2 == 0 else second
+        row_id = store.append(f"{i}.wav", f"text {i}")
+        # The other store reads it right away, as the only new row
+        other = second if store is first else first
+        assert [row[:3] for row in other.examples(after_id=seen)] == [(row_id, f"{i}.wav", f"text {i}")]
+        seen = row_id
+    # A correction through either store supersedes the other's row
+    second.append("0.wav", "fixed")
+    assert first.latest("0.wav") == "fixed"
+    assert len(first) == len(second) == 20
+    first.close()
+    second.close()
+
+
+def test_concurrent_appends_from_two_stores(tmp_path):
+    stores = [TrainingStore(tmp_path), TrainingStore(tmp_path)]
+    per_store = 200
+    start = threading.Barrier(len(stores))
+    ids = [[] for _ in stores]
+
+    def add(index):
+        start.wait()
+        for i in range(per_store):
+            ids[index].append(stores[index].append(f"{index}-{i}.wav", f"text {index} {i}"))
+
+    threads = [threading.Thread(target=add, args=(index,)) for index in range(len(stores))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    all_ids = ids[0] + ids[1]
+    assert len(set(all_ids)) == len(all_ids) == 2 * per_store
+    expected = {f"{index}-{i}.wav": f"text {index} {i}" for index in range(len(stores)) for i in range(per_store)}
+    for store in stores:
+        rows = store.examples()
+        assert [row[0] for row in rows] == sorted(all_ids)
+        assert {row[1]: row[2] for row in rows} == expected
+        store.close()
@@ -0,0 +1,123 @@
+import json
+import multiprocessing
+
+import numpy as np
+import pytest
+
+import transcribe_batch
+from transcribe_batch import SAMPLE_RATE, completed_ids, worker_layouts
+
+pytestmark = pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="the stub engine reaches the workers by fork"
+)
+
+CLIPS = ["a.wav", "b.wav", "c.wav", "d.wav", "e.wav"]
+
+
+def stub_recognizer(samples, **options):
+    return {"text": f"{len(samples)} samples", "error": None, "processingTime": 1, "options": options}
+
+
+@pytest.fixture
+def failing(monkeypatch):
+    """Clip names the stub engine can't load; patched before the workers fork, so they see it"""
+    failing = set()
+
+    def load_audio(path):
+        if path.rsplit("/", 1)[-1] in failing:
+            raise ValueError(f"Cannot decode {path}")
+        return np.zeros(SAMPLE_RATE, dtype=np.float32)
+
+    monkeypatch.setitem(transcribe_batch.ENGINES, "stub", ("stub_engine", "recognize_speech"))
+    monkeypatch.setattr(transcribe_batch, "preload", lambda engine, models=(): None)
+    monkeypatch.setattr(transcribe_batch, "get_recognizer", lambda engine: stub_recognizer)
+    monkeypatch.setattr(transcribe_batch, "load_audio", load_audio)
+    return failing
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    path = tmp_path / "manifest.txt"
+    path.write_text("\n".join(CLIPS) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def run(manifest, output, **kwargs):
+    return transcribe_batch.transcribe_batch(manifest, str(output), "stub", {"language": "en"}, report_every=60, **kwargs)
+
+
+def results(output):
+    return [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+
+
+def test_transcribes_every_clip(failing, manifest, tmp_path):
+    output = tmp_path / "results.jsonl"
+    summary = run(manifest, output, workers=2)
+
+    assert summary["files"] == len(CLIPS) and summary["skipped"] == 0
+    lines = results(output)
+    assert sorted(line["id"] for line in lines) == CLIPS
+    assert all(line["text"] == f"{SAMPLE_RATE} samples" and line["audioSeconds"] == 1.0 for line in lines)
+    assert all(line["options"] == {"language": "en"} for line in lines)
+
+
+def test_resumes_from_the_output(failing, manifest, tmp_path):
+    output = tmp_path / "results.jsonl"
+    output.write_text(
+        "".join(json.dumps({"id": clip, "text": "earlier", "error": None}) + "\n" for clip in CLIPS[:2]),
+        encoding="utf-8",
+    )
+    summary = run(manifest, output)
+
+    assert summary["skipped"] == 2 and summary["files"] == 3
+    lines = results(output)
+    assert [line["text"] for line in lines[:2]] == ["earlier", "earlier"]
+    assert sorted(line["id"] for line in lines[2:]) == CLIPS[2:]
+
+    # Nothing left to do
+    assert run(manifest, output)["files"] == 0
+    assert len(results(output)) == len(CLIPS)
+
+
+def test_torn_last_line_is_redone(failing, manifest, tmp_path):
+    output = tmp_path / "results.jsonl"
+    complete = json.dumps({"id": "a.wav", "text": "earlier", "error": None}) + "\n"
+    torn = json.dumps({"id": "b.wav", "text": "cut off"})[:15]
+    output.write_text(complete + torn, encoding="utf-8")
+    assert completed_ids(str(output)) == {"a.wav"}
+
+    summary = run(manifest, output)
+    assert summary["skipped"] == 1 and summary["files"] == 4
+
+    # New results start on a line of their own; only the torn fragment doesn't parse
+    lines = output.read_text(encoding="utf-8").splitlines()
+    assert lines[:2] == [complete.strip(), torn]
+    assert sorted(json.loads(line)["id"] for line in lines[2:]) == CLIPS[1:]
+
+
+def test_retry_errors_reruns_only_failures(failing, manifest, tmp_path):
+    output = tmp_path / "results.jsonl"
+    failing.add("c.wav")
+    summary = run(manifest, output)
+    assert summary["errors"] == 1
+    assert completed_ids(str(output)) == set(CLIPS)
+
+    # Fixed, but without --retry-errors the failure counts as done
+    failing.clear()
+    assert run(manifest, output)["files"] == 0
+
+    summary = run(manifest, output, retry_errors=True)
+    assert summary["files"] == 1 and summary["errors"] == 0 and summary["skipped"] == len(CLIPS) - 1
+    retried = [line for line in results(output) if line["id"] == "c.wav"]
+    assert [bool(line["error"]) for line in retried] == [True, False]
+    assert completed_ids(str(output), retry_errors=True) == set(CLIPS)
+
+
+def test_explicit_worker_count_is_honoured(capsys):
+    # More workers than cores: each single-threaded, the cores handed out in turn
+    assert worker_layouts(5, 100, cores=[0, 1]) == [(0,), (1,), (0,), (1,), (0,)]
+    assert "5 workers on 2 cores" in capsys.readouterr().err
+
+    assert worker_layouts(2, 100, cores=[0, 1, 2, 3]) == [(0, 1), (2, 3)]
+    assert worker_layouts(None, 100, cores=[0, 1, 2, 3]) == [(0,), (1,), (2,), (3,)]
+    assert capsys.readouterr().err == ""
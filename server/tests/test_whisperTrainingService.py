@@ -0,0 +1,61 @@
+import wave
+
+import numpy as np
+import pytest
+
+pytest.importorskip("whisper")
+import audio_input
+import whisperTrainingService
+from whisperTrainingService import WhisperCPUTrainer
+
+
+@pytest.fixture(autouse=True)
+def no_model(monkeypatch):
+    # Deduplication needs only the mel spectrogram, not the model; WAV files
+    # are read in-process instead of through ffmpeg
+    monkeypatch.setattr("whisper.load_model", lambda *args, **kwargs: None)
+    monkeypatch.setattr("whisper.load_audio", audio_input.load_audio)
+    monkeypatch.setattr(whisperTrainingService, "dedup_enabled", lambda: True)
+
+
+def write_clip(path, seed, gain=1.0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(16000 * 2) / 16000
+    tones = sum(np.sin(2 * np.pi * f * t) * (t > start) * (t < start + 0.6)
+                for f, start in zip(rng.uniform(200, 3000, 5), rng.uniform(0, 1.4, 5)))
+    pcm = np.clip(gain * 0.2 * tones + 0.002 * rng.standard_normal(len(t)), -1, 1)
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes((pcm * 32767).astype("<i2").tobytes())
+    return str(path)
+
+
+def test_same_clip_added_twice_is_merged(tmp_path):
+    training_dir = tmp_path / "training_data"
+    first = write_clip(tmp_path / "first.wav", seed=1)
+    again = write_clip(tmp_path / "again.wav", seed=1, gain=0.7)
+
+    # Like the add_example command: a new trainer per request, no explicit load
+    added = WhisperCPUTrainer(training_dir=training_dir).add_training_example(first, "Yellow Submarine")
+    merged = WhisperCPUTrainer(training_dir=training_dir).add_training_example(again, "yellow  submarine")
+
+    assert added == {"success": True, "duplicateOf": None, "error": None}
+    assert merged["success"] and merged["duplicateOf"] == first
+
+    trainer = WhisperCPUTrainer(training_dir=training_dir)
+    trainer.load_training_data()
+    assert list(trainer.training_data) == [first]
+    assert trainer.training_data[first]["weight"] == 2
+
+
+def test_different_clip_or_text_is_kept(tmp_path):
+    training_dir = tmp_path / "training_data"
+    first = write_clip(tmp_path / "first.wav", seed=1)
+    other = write_clip(tmp_path / "other.wav", seed=2)
+    same_audio = write_clip(tmp_path / "same_audio.wav", seed=1)
+
+    WhisperCPUTrainer(training_dir=training_dir).add_training_example(first, "Yellow Submarine")
+    assert WhisperCPUTrainer(training_dir=training_dir).add_training_example(other, "Yellow Submarine")["duplicateOf"] is None
+    assert WhisperCPUTrainer(training_dir=training_dir).add_training_example(same_audio, "Let It Be")["duplicateOf"] is None
@@ -0,0 +1,84 @@
+import io
+import json
+
+import pytest
+
+pytest.importorskip("msgpack")
+import wire
+from wire import CODEC_JSON, CODEC_MSGPACK, HEADER, MAGIC, PROTOCOL_VERSION, ProtocolError, encode_frame, read_frame
+
+MESSAGE = {"engine": "whisper", "audio": "/tmp/clip.wav", "options": {"language": "si"}, "threads": 4, "cores": [0, 1]}
+
+
+def frame(body, version=PROTOCOL_VERSION, codec=CODEC_MSGPACK, length=None):
+    return HEADER.pack(MAGIC, version, codec, len(body) if length is None else length) + body
+
+
+@pytest.mark.parametrize("codec", [CODEC_MSGPACK, CODEC_JSON])
+def test_header_layout(codec):
+    data = encode_frame(MESSAGE, codec)
+    assert data[:2] == b"VS"
+    assert data[2] == PROTOCOL_VERSION
+    assert data[3] == codec
+    assert int.from_bytes(data[4:8], "big") == len(data) - 8
+
+
+@pytest.mark.parametrize("codec", [CODEC_MSGPACK, CODEC_JSON])
+def test_round_trip(codec):
+    assert read_frame(io.BytesIO(encode_frame(MESSAGE, codec))) == (MESSAGE, codec)
+
+
+def test_json_mode_is_plain_utf8_json():
+    message = {"text": "ආයුබෝවන්", "error": None}
+    data = encode_frame(message, CODEC_JSON)
+    assert json.loads(data[8:].decode("utf-8")) == message
+    assert "ආයුබෝවන්".encode("utf-8") in data
+
+
+def test_msgpack_carries_raw_bytes():
+    message = {**MESSAGE, "audio": b"RIFF\x00\xff"}
+    assert read_frame(io.BytesIO(encode_frame(message)))[0]["audio"] == b"RIFF\x00\xff"
+
+
+def test_reads_consecutive_frames():
+    stream = io.BytesIO(encode_frame({"n": 1}) + encode_frame({"n": 2}, CODEC_JSON))
+    assert read_frame(stream) == ({"n": 1}, CODEC_MSGPACK)
+    assert read_frame(stream) == ({"n": 2}, CODEC_JSON)
+
+
+def test_rejects_bad_magic():
+    with pytest.raises(ProtocolError, match="Not a frame"):
+        read_frame(io.BytesIO(b'{"command": "ping"}\n'))
+
+
+def test_rejects_other_protocol_versions():
+    body = json.dumps({"command": "ping"}).encode()
+    with pytest.raises(ProtocolError, match="Unsupported protocol version 2"):
+        read_frame(io.BytesIO(frame(body, version=2, codec=CODEC_JSON)))
+
+
+def test_rejects_frames_over_the_size_limit(monkeypatch):
+    monkeypatch.setattr(wire, "MAX_FRAME_BYTES", 16)
+    body = wire.dumps(MESSAGE)
+    with pytest.raises(ProtocolError, match="exceeds the 16 byte limit"):
+        read_frame(io.BytesIO(frame(body)))
+    # The limit is checked before the body is read, from the announced length
+    with pytest.raises(ProtocolError, match="exceeds"):
+        read_frame(io.BytesIO(frame(b"", length=2**32 - 1)))
+
+
+def test_rejects_unknown_codecs():
+    with pytest.raises(ProtocolError, match="Unknown codec: 7"):
+        read_frame(io.BytesIO(frame(b"{}", codec=7)))
+
+
+@pytest.mark.parametrize("data", [b"VS\x01", encode_frame(MESSAGE)[:-1]])
+def test_rejects_truncated_frames(data):
+    with pytest.raises(ProtocolError, match="Connection closed"):
+        read_frame(io.BytesIO(data))
+
+
+@pytest.mark.parametrize("codec, expected", [(CODEC_JSON, CODEC_JSON), (CODEC_MSGPACK, CODEC_MSGPACK), (7, CODEC_MSGPACK)])
+def test_reply_codec_follows_the_header(codec, expected):
+    header = wire.read_header(io.BytesIO(frame(b"not decodable", version=9, codec=codec)))
+    assert wire.reply_codec(header) == expected
@@ -0,0 +1,78 @@
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+import wire
+from conftest import SERVICES_DIR
+
+
+def serve_one(data):
+    """Run the zygote's handler on one connection carrying `data`; returns the raw reply"""
+    import zygote
+
+    server_side, client_side = socket.socketpair()
+    with server_side, client_side:
+        client_side.sendall(data)
+        client_side.shutdown(socket.SHUT_WR)
+        zygote.ZygoteHandler(server_side, None, None)
+        server_side.shutdown(socket.SHUT_WR)
+        return client_side.makefile("rb").read()
+
+
+@pytest.mark.parametrize("codec", [wire.CODEC_JSON, wire.CODEC_MSGPACK])
+def test_ping_is_answered_in_the_request_codec(codec):
+    if codec == wire.CODEC_MSGPACK:
+        pytest.importorskip("msgpack")
+    reply, reply_codec = wire.read_frame(io.BytesIO(serve_one(wire.encode_frame({"command": "ping"}, codec))))
+    assert reply_codec == codec
+    assert reply["ok"] and reply["protocol"] == wire.PROTOCOL_VERSION
+
+
+@pytest.mark.parametrize("version", [wire.PROTOCOL_VERSION, wire.PROTOCOL_VERSION + 1])
+def test_undecodable_request_is_answered_in_the_header_codec(version):
+    # A client without msgpack must be able to read the error
+    body = b"{not json"
+    data = wire.HEADER.pack(wire.MAGIC, version, wire.CODEC_JSON, len(body)) + body
+    reply = serve_one(data)
+    assert reply[3] == wire.CODEC_JSON
+    message = json.loads(reply[8:].decode("utf-8"))
+    assert message["text"] == ""
+    assert message["error"].startswith(("JSONDecodeError", "ProtocolError"))
+
+
+def test_line_protocol_gets_a_json_line():
+    reply = serve_one(b'{"command": "ping"}\n')
+    assert reply.endswith(b"\n")
+    assert json.loads(reply)["ok"]
+
+
+def test_warm_up_keeps_the_zygote_single_threaded():
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    # Children inherit the zygote's thread pools, so loading a model must not
+    # resize them to the worker budget (VOICE_SEARCH_THREADS here)
+    script = textwrap.dedent(f"""
+        import os, sys
+        sys.path.insert(0, {SERVICES_DIR!r})
+        import transformers
+        import whisperSinhalaService
+        import zygote
+
+        # Model loads stubbed out: only the thread setup is under test
+        transformers.WhisperProcessor.from_pretrained = lambda *args, **kwargs: object()
+        whisperSinhalaService.WhisperSinhalaModel._load_hf_model = staticmethod(lambda *args: object())
+
+        zygote.warm_up("whisper-sinhala")
+        import torch
+        print(torch.get_num_threads(), os.environ["OMP_NUM_THREADS"])
+    """)
+    env = {**os.environ, "VOICE_SEARCH_THREADS": "4"}
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, env=env, timeout=120)
+    assert output.returncode == 0, output.stderr
+    assert output.stdout.split() == ["1", "1"]
@@ -0,0 +1,32 @@
+"""A randomly initialised Whisper small enough to decode in milliseconds, and a fixed clip"""
+import numpy as np
+import torch
+import whisper
+
+SAMPLE_RATE = 16000
+
+
+def fixed_clip(seconds=2, seed=0):
+    """Deterministic clip: a few tones over low noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    tones = sum(np.sin(2 * np.pi * f * t) for f in (220, 440, 1250))
+    return (0.1 * tones + 0.01 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+def tiny_whisper(seed=0, n_text_layer=2, n_text_state=64):
+    """English-only Whisper with random weights (the real tokenizer and mel settings)"""
+    torch.manual_seed(seed)
+    dims = whisper.model.ModelDimensions(
+        n_mels=80, n_audio_ctx=1500, n_audio_state=64, n_audio_head=2, n_audio_layer=2,
+        n_vocab=51864, n_text_ctx=448, n_text_state=n_text_state, n_text_head=2, n_text_layer=n_text_layer,
+    )
+    model = whisper.model.Whisper(dims).eval()
+    with torch.no_grad():
+        # Whisper leaves this uninitialised (checkpoints always set it)
+        model.decoder.positional_embedding.normal_(std=0.01)
+        # Unit-norm token embeddings, so greedy decoding follows the context
+        # instead of repeating the largest-norm token
+        embedding = model.decoder.token_embedding.weight
+        embedding /= embedding.norm(dim=1, keepdim=True)
+    return model